@@ -2,33 +2,31 @@
 import streamlit as st
 from dotenv import load_dotenv
 
-from helpers.chunker import chunk_documents
-from helpers.loader import load_documents
-from helpers.vectorstore import create_or_load_vectorstore
-from helpers.retriever import create_retriever
-from helpers.chain import create_rag_chain
+import os
+
+from helpers.answer_cache import answer_cache_from_env
+from helpers.embeddings import get_embeddings
+from helpers.filters import get_filter_index, make_filter
+from helpers.registry import get_registry
+from helpers.watcher import start_data_watcher
 from helpers.memory import get_memory_from_session, add_to_memory, clear_memory, get_conversation_history, get_memory_summary
 
 
-def format_llm_response(response_text):
+def stream_llm_response(token_stream, parts):
     """
-    Format LLM response text to preserve formatting in Streamlit frontend.
-    Handles line breaks, bullet points, and spacing issues.
+    Yields streamed LLM tokens with formatting preserved for st.write_stream.
+    Newlines become Markdown hard line breaks so bullet lists and spacing survive,
+    and the raw tokens are collected into `parts` for conversation memory.
     """
-    if not response_text:
-        return response_text
-    
-    # Replace double line breaks with HTML breaks for better separation
-    formatted = response_text.replace('\n\n', '<br><br>')
-    
-    # Replace single line breaks with HTML breaks
-    formatted = formatted.replace('\n', '<br>')
-    
-    # Ensure bullet points are properly spaced
-    # formatted = formatted.replace('• ', '<br>• ')
-    
-    # Return formatted text without background styling
-    return formatted
+    for token in token_stream:
+        parts.append(token)
+        yield token.replace('\n', '  \n')
+
+
+@st.cache_resource
+def get_answer_cache():
+    """Semantic answer cache shared by every session in this process."""
+    return answer_cache_from_env(get_embeddings())
 
 
 # Configure Streamlit page
@@ -48,23 +46,20 @@ st.markdown("""
 # Load environment variables (for GROQ API key, etc.)
 load_dotenv()
 
-# Session state - Initialize FIRST before using
-if "retriever" not in st.session_state:
-    st.session_state.retriever = None
-if "rag_chain" not in st.session_state:
-    st.session_state.rag_chain = None
-if "vector_store" not in st.session_state:
-    st.session_state.vector_store = None
-if "docs_processed" not in st.session_state:
-    st.session_state.docs_processed = False
+# The index, models and RAG chain are shared by every session in this process
+registry = get_registry("./startup_db")
+
+# Reindex automatically when PDFs in ./data are added, changed or removed
+if os.getenv("DATA_WATCH", "1") == "1":
+    start_data_watcher(registry, "./data")
 
 # Initialize memory early to avoid None errors
 from helpers.memory import create_conversation_memory
 if "conversation_memory" not in st.session_state:
     st.session_state.conversation_memory = create_conversation_memory()
 
-# Auto-load existing processed documents on startup
-if not st.session_state.docs_processed:
+# Auto-load existing processed documents once per process; later sessions reuse them
+if registry.get() is None:
     # Show loading state at the top of the app
     st.info("**Initializing Application...** Please wait while we set up your knowledge base.")
     
@@ -73,26 +68,11 @@ if not st.session_state.docs_processed:
     status_text = st.empty()
     
     try:
-        # Step 1: Load vector store
-        status_text.text("Step 1: Loading vector database...")
+        # Load vector store, retriever and RAG chain (only the first session pays for this)
+        status_text.text("Loading vector database and AI chat system...")
         progress_bar.progress(25)
-        from helpers.vectorstore import load_vectorstore
-        
-        existing_vectorstore = load_vectorstore("./startup_db")
         
-        if existing_vectorstore:
-            # Step 2: Create retriever
-            status_text.text("Step 2: Setting up document retriever...")
-            progress_bar.progress(50)
-            st.session_state.vector_store = existing_vectorstore
-            st.session_state.retriever = create_retriever(existing_vectorstore)
-            
-            # Step 3: Create RAG chain
-            status_text.text("Step 3: Initializing AI chat system...")
-            progress_bar.progress(75)
-            st.session_state.rag_chain = create_rag_chain(st.session_state.retriever)
-            st.session_state.docs_processed = True
-            
+        if registry.load():
             # Complete
             progress_bar.progress(100)
             status_text.text("Ready!")
@@ -111,12 +91,16 @@ if not st.session_state.docs_processed:
         progress_bar.empty()
         status_text.empty()
 
+# Read the shared pipeline once per run so a concurrent rebuild can't mix versions
+pipeline = registry.get()
+search_filter = None
+
 # --- Sidebar Setup ---
 with st.sidebar:
     st.header("Ethio Startup Advisor")
     
     # Show current status
-    if st.session_state.docs_processed:
+    if pipeline:
         st.success("Legal Advisor Ready")
         st.info("Ask questions about Ethiopian business law!")
         
@@ -130,6 +114,35 @@ with st.sidebar:
         • Tax Proclamations
         """)
         
+        # Optional scope: search only some documents, years or articles
+        st.subheader("Search Scope")
+        documents = get_filter_index(pipeline.vector_store).documents()
+        labels = {
+            (f"Proclamation {doc['proclamation']}" if doc["proclamation"] else os.path.basename(doc["source"])): doc
+            for doc in documents
+        }
+        selected = st.multiselect("Documents", list(labels), placeholder="All documents")
+        years = sorted({doc["year"] for doc in documents if doc["year"]})
+        year_from = year_to = None
+        if len(years) > 1:
+            low, high = st.slider("Years", years[0], years[-1], (years[0], years[-1]))
+            year_from = low if low > years[0] else None
+            year_to = high if high < years[-1] else None
+        max_article = max([doc["articles"] for doc in documents] or [0])
+        article_range = (None, None)
+        if max_article and st.checkbox("Limit to articles"):
+            col_from, col_to = st.columns(2)
+            article_range = (
+                col_from.number_input("From article", 1, max_article, 1),
+                col_to.number_input("To article", 1, max_article, max_article),
+            )
+        search_filter = make_filter(
+            [os.path.basename(labels[label]["source"]) for label in selected],
+            year_from,
+            year_to,
+            *article_range,
+        )
+        
         # Memory management section
         st.subheader("Conversation Memory")
         memory_summary = get_memory_summary()
@@ -157,16 +170,9 @@ with st.sidebar:
         if st.button("Reprocess Documents"):
             with st.spinner("Reloading and reindexing documents..."):
                 try:
-                    # Load startup/business docs from ./data folder
-                    docs = load_documents("./data")  
-                    chunks = chunk_documents(docs)
-                    vector_store = create_or_load_vectorstore(chunks)
-
-                    # Build retriever + RAG chain
-                    st.session_state.vector_store = vector_store
-                    st.session_state.retriever = create_retriever(vector_store)
-                    st.session_state.rag_chain = create_rag_chain(st.session_state.retriever)
-                    st.session_state.docs_processed = True
+                    # Index only the PDFs in ./data that changed since the last run,
+                    # then swap the new retriever + RAG chain in for every session
+                    registry.rebuild("./data")
 
                     st.success("Documents reprocessed successfully")
                     st.rerun()
@@ -178,16 +184,9 @@ with st.sidebar:
         if st.button("Process Documents"):
             with st.spinner("Loading and indexing documents..."):
                 try:
-                    # Load startup/business docs from ./data folder
-                    docs = load_documents("./data")  
-                    chunks = chunk_documents(docs)
-                    vector_store = create_or_load_vectorstore(chunks)
-
-                    # Build retriever + RAG chain
-                    st.session_state.vector_store = vector_store
-                    st.session_state.retriever = create_retriever(vector_store)
-                    st.session_state.rag_chain = create_rag_chain(st.session_state.retriever)
-                    st.session_state.docs_processed = True
+                    # Index only the PDFs in ./data that changed since the last run,
+                    # then swap the new retriever + RAG chain in for every session
+                    registry.rebuild("./data")
 
                     st.success("Documents processed successfully")
                     st.rerun()
@@ -197,7 +196,7 @@ with st.sidebar:
 # --- Main Q&A Area ---
 st.header("Ask Your Startup Questions")
 
-if st.session_state.rag_chain:
+if pipeline:
     st.success("**Ready to Advise!**")
     st.info("Ask me anything about Ethiopian startups, business registration, or entrepreneurship.")
     
@@ -233,17 +232,25 @@ if st.session_state.rag_chain:
     if question:
         with st.spinner("Searching through official Ethiopian legal documents..."):
             try:
-                answer = st.session_state.rag_chain.invoke(question)
-                
-                # Add to conversation memory
-                add_to_memory(question, answer)
-                
                 st.markdown("---")
                 st.markdown("### **Answer:**")
                 
-                # Use the formatting function for better display
-                formatted_answer = format_llm_response(answer)
-                st.markdown(formatted_answer, unsafe_allow_html=True)
+                # Repeated questions are served from the semantic cache (unscoped ones only)
+                answer_cache = get_answer_cache()
+                answer = answer_cache.lookup(question, pipeline.index_version) if search_filter is None else None
+                if answer is not None:
+                    st.markdown(answer.replace('\n', '  \n'))
+                else:
+                    # Render tokens as they arrive instead of waiting for the full answer
+                    parts = []
+                    chain_input = question if search_filter is None else {"question": question, "filter": search_filter}
+                    st.write_stream(stream_llm_response(pipeline.rag_chain.stream(chain_input), parts))
+                    answer = "".join(parts)
+                    if search_filter is None:
+                        answer_cache.store(question, answer, pipeline.index_version)
+                
+                # Add to conversation memory
+                add_to_memory(question, answer)
                 
                 # Add a helpful tip
                 st.info(" **Tip:** Ask follow-up questions about your startup journey in Ethiopia!")
@@ -257,7 +264,6 @@ else:
     st.info("Please load your Ethiopian legal documents first using the sidebar. Once loaded, I'll be ready to advise you on business registration and compliance.")
     
     # Show what documents are available
-    import os
     if os.path.exists("./data") and os.listdir("./data"):
         st.success(f"Found {len(os.listdir('./data'))} legal document(s) in the data folder")
         st.info("Click 'Process Documents' in the sidebar to get started!")
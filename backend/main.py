@@ -1,12 +1,17 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import os
 import sys
+import time
 from pathlib import Path
+from typing import List, Optional
 from dotenv import load_dotenv
-from datetime import datetime
 
 # Load environment variables first
 load_dotenv("../.env")
@@ -14,17 +19,35 @@ load_dotenv("../.env")
 # Add parent directory to path to import helpers
 sys.path.append(str(Path(__file__).parent.parent))
 
-from helpers.chunker import chunk_documents
-from helpers.loader import load_documents
-from helpers.vectorstore import create_or_load_vectorstore, load_vectorstore
-from helpers.retriever import create_retriever
-from helpers.chain import create_rag_chain
-from helpers.memory import create_conversation_memory, add_to_memory
+from helpers.loader import list_pdfs
+from helpers.registry import get_registry
+from helpers.index_versions import list_versions
+from helpers.conversations import DEFAULT_SESSION, conversation_store_from_env
+from helpers.workers import PoolSaturated, pool_from_env
+from helpers.answer_cache import answer_cache_from_env
+from helpers.embeddings import get_embeddings
+from helpers.filters import get_filter_index, make_filter
+from helpers.warmup import load_models, warm_up
+from helpers.watcher import start_data_watcher
+from helpers.batch import answer_batch
+from helpers import metrics
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the persisted index and heavy models in the background so the server
+    # accepts connections immediately; /health reports ready once warm-up is done
+    startup_task = asyncio.create_task(_startup())
+    yield
+    startup_task.cancel()
+    if data_watcher is not None:
+        data_watcher.stop()
+    inference_pool.shutdown(wait=False)
 
 app = FastAPI(
     title="Ethio Startup Advisor API",
     description="AI-powered Ethiopian business law advisor",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware for frontend communication
@@ -36,73 +59,249 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global state (in production, use proper state management)
-vector_store = None
-retriever = None
-rag_chain = None
-memory = None
-docs_processed = False
-chat_history = []  # Add chat history storage
+DATA_PATH = Path("../data")
+
+# The live index, retriever and chain. Reindexing runs as a background job that
+# builds a new index version and swaps it in; requests keep using the old one.
+registry = get_registry("./startup_db")
+conversations = None  # Chat history per session ID; created on first use, see _get_conversations
+data_watcher = None  # Reindexes when PDFs in the data folder change (DATA_WATCH)
+startup_state = {"phase": "starting", "started_at": time.time(), "ready_at": None, "error": None}
+answer_cache = None  # Created on first use so importing the app stays cheap
+
+# Blocking RAG work runs on a bounded pool so the event loop stays responsive.
+# Questions beyond workers + queue get a 429.
+inference_pool = pool_from_env("rag-inference", "RAG_WORKERS", "RAG_QUEUE", 4, 16)
+
+def _current_pipeline():
+    """The live pipeline, switching to a version another worker process published."""
+    registry.refresh()
+    return registry.get()
+
+def _get_conversations():
+    """Returns the chat history store, creating it on first use (after any fork)."""
+    global conversations
+    if conversations is None:
+        conversations = conversation_store_from_env()
+    return conversations
+
+def _get_answer_cache():
+    """Returns the semantic answer cache, creating it on first use."""
+    global answer_cache
+    if answer_cache is None:
+        answer_cache = answer_cache_from_env(get_embeddings())
+    return answer_cache
+
+def _purge_stale_answers(pipeline):
+    """Drops cached answers of earlier index versions once this process made a new one live."""
+    _get_answer_cache().purge_other_versions(pipeline.index_version)
+
+registry.on_activate = _purge_stale_answers
+
+def _answer_and_cache(chain, question: str, version, search_filter=None):
+    """
+    Runs the RAG chain and caches the answer against the index version it used.
+    Answers scoped by a filter are not cached: the cache is keyed by question only.
+    """
+    if search_filter is not None:
+        return chain.invoke({"question": question, "filter": search_filter})
+    answer = chain.invoke(question)
+    _get_answer_cache().store(question, answer, version)
+    return answer
+
+def _cached_answer(question: str, version, search_filter=None):
+    """Looks a question up in the answer cache; filtered questions always miss."""
+    if search_filter is not None:
+        return None
+    return _get_answer_cache().lookup(question, version)
+
+# Prometheus-style metrics; gauges are read from live state at scrape time
+HTTP_SECONDS = metrics.REGISTRY.histogram("rag_http_request_seconds", "HTTP request latency.", labels=("path", "status"))
+HTTP_IN_FLIGHT = metrics.REGISTRY.gauge("rag_http_requests_in_flight", "HTTP requests currently being served.")
+INFERENCE_IN_FLIGHT = metrics.REGISTRY.gauge("rag_inference_in_flight", "Questions running or queued on the inference pool.")
+INFERENCE_IN_FLIGHT.set_function(lambda: inference_pool.in_flight)
+INDEX_VECTORS = metrics.REGISTRY.gauge("rag_index_vectors", "Vectors in the loaded FAISS index.")
+def _index_vectors():
+    # Read without refresh(): a scrape must not start loading another index version
+    pipeline = registry.get()
+    return pipeline.vector_store.index.ntotal if pipeline is not None else 0
+
+INDEX_VECTORS.set_function(_index_vectors)
+CACHE_HITS = metrics.REGISTRY.gauge("rag_cache_hits", "Cache hits since start.", labels=("cache",))
+CACHE_MISSES = metrics.REGISTRY.gauge("rag_cache_misses", "Cache misses since start.", labels=("cache",))
+CACHE_HIT_RATIO = metrics.REGISTRY.gauge("rag_cache_hit_ratio", "Cache hit ratio since start.", labels=("cache",))
+
+def _cache_stats():
+    """Returns {cache: (hits, misses)} for the answer and embedding caches."""
+    stats = {}
+    if answer_cache is not None:
+        stats["answer"] = (answer_cache.stats["hits"], answer_cache.stats["misses"])
+    embeddings = getattr(registry.get(), "vector_store", None)
+    embeddings = getattr(embeddings, "embedding_function", None)
+    embedding_stats = getattr(embeddings, "stats", None)
+    if embedding_stats:
+        stats["query_embedding"] = (embedding_stats["query_hits"], embedding_stats["query_misses"])
+        stats["chunk_embedding"] = (embedding_stats["doc_hits"], embedding_stats["doc_misses"])
+    return stats
+
+def _hit_ratio(hits, misses):
+    return hits / (hits + misses) if hits + misses else None
+
+for _cache in ("answer", "query_embedding", "chunk_embedding"):
+    CACHE_HITS.set_function(lambda c=_cache: _cache_stats().get(c, (None, None))[0], cache=_cache)
+    CACHE_MISSES.set_function(lambda c=_cache: _cache_stats().get(c, (None, None))[1], cache=_cache)
+    CACHE_HIT_RATIO.set_function(lambda c=_cache: _hit_ratio(*_cache_stats().get(c, (0, 0))), cache=_cache)
+
+@app.middleware("http")
+async def track_requests(request, call_next):
+    """Records latency and in-flight count for every HTTP request."""
+    HTTP_IN_FLIGHT.inc()
+    status = "500"
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - start, path=path, status=status)
+
+class SearchFilters(BaseModel):
+    """Narrows retrieval; omitted fields do not filter. Bounds are inclusive."""
+    sources: List[str] = []  # file names or proclamation numbers, e.g. "1180/2020"
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    article_from: Optional[int] = None
+    article_to: Optional[int] = None
+
+    def to_filter(self):
+        return make_filter(self.sources, self.year_from, self.year_to, self.article_from, self.article_to)
 
 class QuestionRequest(BaseModel):
     question: str
+    filters: Optional[SearchFilters] = None
+    session_id: str = DEFAULT_SESSION  # chat history is kept per session
+
+# Upper bound on the LLM calls one batch may run at once, whatever the client asks for
+BATCH_MAX_CONCURRENCY = max(1, int(os.getenv("BATCH_MAX_CONCURRENCY", "8")))
+
+class BatchRequest(BaseModel):
+    questions: List[str]
+    max_concurrency: int = Field(default=min(4, BATCH_MAX_CONCURRENCY), ge=1, le=BATCH_MAX_CONCURRENCY)
+    filters: Optional[SearchFilters] = None
+
+class BatchAnswer(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    sources: List[str] = []
+    cached: bool = False
+
+class BatchResponse(BaseModel):
+    answers: List[BatchAnswer]
+    success: bool
 
 class ProcessResponse(BaseModel):
     message: str
     success: bool
     document_count: int = None
+    job_id: Optional[str] = None  # poll GET /jobs/{job_id} for progress
+    status: Optional[str] = None
+    version: Optional[str] = None
+
+class RollbackRequest(BaseModel):
+    version: str
 
 class AnswerResponse(BaseModel):
     answer: str
     success: bool
+    cached: bool = False
 
 @app.get("/")
 async def root():
     return {"message": "Ethio Startup Advisor API is running!"}
 
+def _load_and_warm():
+    """Blocking startup work: load the live index version, models, and warm everything up."""
+    pipeline = registry.load()
+    if pipeline is None:
+        warm_up()
+        return
+    # An LLM warm-up costs a real API call, so it is opt-in
+    warm_up(pipeline.retriever, pipeline.rag_chain if os.getenv("WARMUP_LLM", "0") == "1" else None)
+
+async def _startup():
+    """Runs _load_and_warm in a worker thread, marks the backend ready and starts watching the data folder."""
+    global data_watcher
+    startup_state["phase"] = "warming"
+    try:
+        await run_in_threadpool(_load_and_warm)
+        startup_state.update(phase="ready", ready_at=time.time())
+        if os.getenv("DATA_WATCH", "1") == "1":
+            data_watcher = start_data_watcher(registry, str(DATA_PATH))
+        print(f"Backend ready in {startup_state['ready_at'] - startup_state['started_at']:.1f}s")
+    except Exception as e:
+        import traceback
+        print(f"Error during startup: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        startup_state.update(phase="failed", error=str(e))
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "docs_processed": docs_processed}
+    """Readiness: 200 only once the index is loaded and models are warm, 503 before"""
+    ready = startup_state["phase"] == "ready"
+    body = {
+        "status": "healthy" if ready else startup_state["phase"],
+        "ready": ready,
+        "docs_processed": registry.get() is not None,
+        "startup_seconds": round(startup_state["ready_at"] - startup_state["started_at"], 2) if ready else None,
+    }
+    if startup_state["error"]:
+        body["error"] = startup_state["error"]
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+def _job_response(job) -> ProcessResponse:
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail="Failed to process documents. Please try again.")
+    if job.status == "succeeded":
+        return ProcessResponse(
+            message="Documents processed successfully!",
+            success=True,
+            document_count=job.result["document_count"],
+            job_id=job.id,
+            status=job.status,
+            version=job.result["version"],
+        )
+    return ProcessResponse(
+        message="Document processing started. Questions are answered from the current index until it finishes.",
+        success=True,
+        job_id=job.id,
+        status=job.status,
+    )
 
 @app.post("/process-documents", response_model=ProcessResponse)
-async def process_documents():
-    """Process documents from the data folder"""
-    global vector_store, retriever, rag_chain, memory, docs_processed
-    
+async def process_documents(wait: bool = False):
+    """Process documents from the data folder in a background job (wait=true blocks until it is done)"""
     try:
         # Check if data folder exists
-        data_path = Path("../data")
+        data_path = DATA_PATH
         if not data_path.exists():
             raise HTTPException(status_code=400, detail="Data folder not found")
         
-        # Load and process documents
-        docs = load_documents(str(data_path))
-        if not docs:
+        if not list_pdfs(str(data_path)):
             raise HTTPException(status_code=400, detail="No documents found in data folder")
         
-        # Chunk documents
-        chunks = chunk_documents(docs)
-        
-        # Create or load vector store
-        vector_store = create_or_load_vectorstore(chunks)
-        
-        # Create retriever
-        retriever = create_retriever(vector_store)
-        
-        # Create memory
-        memory = create_conversation_memory()
-        
-        # Create RAG chain
-        rag_chain = create_rag_chain(retriever)
-        
-        docs_processed = True
-        
-        return ProcessResponse(
-            message="Documents processed successfully!",
-            success=True,
-            document_count=len(chunks)
-        )
+        # Only the PDFs that changed since the last run are loaded, chunked and embedded.
+        # A request while a job is still queued joins that job.
+        job = registry.submit_rebuild(str(data_path))
+        if wait:
+            await run_in_threadpool(job.done.wait)
+        return _job_response(job)
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"Error processing documents: {str(e)}")
@@ -112,86 +311,289 @@ async def process_documents():
 @app.post("/ask-question", response_model=AnswerResponse)
 async def ask_question(request: QuestionRequest):
     """Ask a question and get an answer"""
-    global rag_chain, memory, docs_processed, chat_history
-    
-    if not docs_processed or not rag_chain:
+    pipeline = _current_pipeline()
+    if pipeline is None:
         raise HTTPException(status_code=400, detail="Please process documents first.")
     
     try:
-        # Get answer from RAG chain
-        answer = rag_chain.invoke(request.question)
+        search_filter = request.filters.to_filter() if request.filters else None
         
-        # Add to chat history
-        chat_history.append({
-            "question": request.question,
-            "answer": answer,
-            "timestamp": str(datetime.now())
-        })
+        # Near-identical questions are answered from the semantic cache
+        cached = await run_in_threadpool(_cached_answer, request.question, pipeline.index_version, search_filter)
+        if cached is not None:
+            _record_answer(request.session_id, request.question, cached)
+            return AnswerResponse(answer=cached, success=True, cached=True)
         
-        # Keep only last 10 conversations
-        if len(chat_history) > 10:
-            chat_history.pop(0)
+        # Get answer from RAG chain on the inference pool
+        answer = await inference_pool.run(
+            _answer_and_cache, pipeline.rag_chain, request.question, pipeline.index_version, search_filter
+        )
         
-        # Add to memory
-        if memory:
-            add_to_memory(request.question, answer)
+        _record_answer(request.session_id, request.question, answer)
         
         return AnswerResponse(
             answer=answer,
             success=True
         )
         
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=429,
+            detail="The advisor is busy. Please try again in a moment.",
+            headers={"Retry-After": "2"},
+        )
     except Exception as e:
         import traceback
         print(f"Error processing question: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail="Failed to process question. Please try again.")
 
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "100"))
+
+def _answer_batch_and_cache(store, lexical, questions: List[str], max_concurrency: int, version, search_filter=None):
+    """Answers a batch, serving cache hits directly and caching fresh answers (unfiltered batches only)."""
+    cache = _get_answer_cache()
+    results = [None] * len(questions)
+    pending = []
+    for i, question in enumerate(questions):
+        cached = _cached_answer(question, version, search_filter)
+        if cached is None:
+            pending.append(i)
+        else:
+            results[i] = {"question": question, "answer": cached, "cached": True}
+    
+    answered = answer_batch(
+        store,
+        [questions[i] for i in pending],
+        max_concurrency=max_concurrency,
+        lexical_index=lexical,
+        search_filter=search_filter,
+    )
+    for i, result in zip(pending, answered):
+        if "answer" in result and search_filter is None:
+            cache.store(result["question"], result["answer"], version)
+        results[i] = result
+    return results
+
+@app.post("/ask-batch", response_model=BatchResponse)
+async def ask_batch(request: BatchRequest):
+    """Answer many questions at once with batched retrieval and reranking"""
+    pipeline = _current_pipeline()
+    if pipeline is None:
+        raise HTTPException(status_code=400, detail="Please process documents first.")
+    if len(request.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch.")
+    
+    try:
+        # The whole batch takes one inference slot; LLM fan-out is bounded inside it
+        results = await inference_pool.run(
+            _answer_batch_and_cache,
+            pipeline.vector_store,
+            pipeline.lexical_index,
+            request.questions,
+            min(request.max_concurrency, BATCH_MAX_CONCURRENCY),
+            pipeline.index_version,
+            request.filters.to_filter() if request.filters else None,
+        )
+        return BatchResponse(answers=[BatchAnswer(**result) for result in results], success=True)
+        
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=429,
+            detail="The advisor is busy. Please try again in a moment.",
+            headers={"Retry-After": "2"},
+        )
+    except Exception as e:
+        import traceback
+        print(f"Error processing batch: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail="Failed to process questions. Please try again.")
+
+def _record_answer(session_id: str, question: str, answer: str):
+    """Adds a finished question/answer pair to the session's chat history."""
+    _get_conversations().add(session_id, question, answer)
+
+def _sse(data: dict, event: str = None) -> str:
+    """Formats one Server-Sent Event; payloads are JSON so newlines survive."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/ask-question/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """Ask a question and stream the answer tokens as Server-Sent Events"""
+    pipeline = _current_pipeline()
+    if pipeline is None:
+        raise HTTPException(status_code=400, detail="Please process documents first.")
+    
+    # Admission is checked up front so an overloaded server answers 429, not a broken stream
+    if inference_pool.saturated:
+        raise HTTPException(
+            status_code=429,
+            detail="The advisor is busy. Please try again in a moment.",
+            headers={"Retry-After": "2"},
+        )
+    
+    chain = pipeline.rag_chain
+    version = pipeline.index_version
+    search_filter = request.filters.to_filter() if request.filters else None
+    chain_input = request.question if search_filter is None else {"question": request.question, "filter": search_filter}
+    
+    async def event_stream():
+        parts = []
+        try:
+            cache = _get_answer_cache()
+            cached = await run_in_threadpool(_cached_answer, request.question, version, search_filter)
+            if cached is not None:
+                await run_in_threadpool(_record_answer, request.session_id, request.question, cached)
+                yield _sse({"token": cached})
+                yield _sse({"success": True, "cached": True}, event="done")
+                return
+            
+            async with inference_pool.slot():
+                async for token in chain.astream(chain_input):
+                    parts.append(token)
+                    yield _sse({"token": token})
+            answer = "".join(parts)
+            if search_filter is None:
+                await run_in_threadpool(cache.store, request.question, answer, version)
+            await run_in_threadpool(_record_answer, request.session_id, request.question, answer)
+            yield _sse({"success": True}, event="done")
+        except PoolSaturated:
+            yield _sse({"detail": "The advisor is busy. Please try again in a moment."}, event="error")
+        except Exception as e:
+            import traceback
+            print(f"Error streaming answer: {str(e)}")
+            print(f"Traceback: {traceback.format_exc()}")
+            yield _sse({"detail": "Failed to process question. Please try again."}, event="error")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/documents")
+async def list_documents():
+    """Documents in the index and the values they can be filtered by"""
+    pipeline = _current_pipeline()
+    if pipeline is None:
+        raise HTTPException(status_code=400, detail="Please process documents first.")
+    documents = await run_in_threadpool(get_filter_index(pipeline.vector_store).documents)
+    return {
+        "documents": [
+            dict(doc, source=os.path.basename(doc["source"])) for doc in documents
+        ]
+    }
+
 @app.get("/chat-history")
-async def get_chat_history():
-    """Get chat history"""
-    return {"chat_history": chat_history}
+async def get_chat_history(
+    session_id: str = DEFAULT_SESSION,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Get one page of a session's chat history, oldest first"""
+    turns, total = await run_in_threadpool(_get_conversations().history, session_id, offset, limit)
+    return {
+        "session_id": session_id,
+        "chat_history": turns,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if offset + limit < total else None,
+    }
 
 @app.delete("/chat-history")
-async def clear_chat_history():
-    """Clear chat history"""
-    global chat_history
-    chat_history = []
+async def clear_chat_history(session_id: str = DEFAULT_SESSION):
+    """Clear a session's chat history"""
+    await run_in_threadpool(_get_conversations().clear, session_id)
     return {"message": "Chat history cleared"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: stage latencies, cache hit rates, index size, load and tokens"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/status")
 async def get_status():
     """Get current system status"""
+    pipeline = _current_pipeline()
     return {
-        "docs_processed": docs_processed,
-        "vector_store_ready": vector_store is not None,
-        "retriever_ready": retriever is not None,
-        "rag_chain_ready": rag_chain is not None,
-        "memory_ready": memory is not None
+        "docs_processed": pipeline is not None,
+        "vector_store_ready": pipeline is not None,
+        "retriever_ready": pipeline is not None,
+        "rag_chain_ready": pipeline is not None,
+        "memory_ready": True,
+        "active_sessions": len(conversations) if conversations is not None else 0,
+        "worker_pid": os.getpid(),
+        "inference_in_flight": inference_pool.in_flight,
+        "inference_capacity": inference_pool.capacity,
+        "indexing_in_progress": registry.jobs.busy,
+        "index_version": pipeline.index_version if pipeline else None,
+        "index_directory_version": pipeline.version if pipeline else None,
+        "answer_cache": dict(answer_cache.stats, entries=len(answer_cache)) if answer_cache else None
     }
 
 @app.post("/reprocess-documents", response_model=ProcessResponse)
-async def reprocess_documents():
+async def reprocess_documents(wait: bool = False):
     """Reprocess documents (useful for updates)"""
-    global vector_store, retriever, rag_chain, memory, docs_processed
-    
     try:
-        # Reset state
-        vector_store = None
-        retriever = None
-        rag_chain = None
-        memory = None
-        docs_processed = False
-        
-        # Process documents again
-        return await process_documents()
+        # Apply the delta for added, changed and removed PDFs to the current index
+        return await process_documents(wait)
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"Error reprocessing documents: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Error reprocessing documents: {str(e)}")
 
+@app.get("/jobs")
+async def list_jobs():
+    """Recent background jobs, newest first"""
+    return {"jobs": [job.to_dict() for job in registry.jobs.list()]}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and progress of a background job"""
+    job = registry.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/index/versions")
+async def get_index_versions():
+    """Kept index versions, newest first; the live one has current=true"""
+    return {"versions": await run_in_threadpool(list_versions, registry.persist_directory)}
+
+@app.post("/index/rollback")
+async def rollback_index(request: RollbackRequest):
+    """Make an earlier index version live again"""
+    if registry.jobs.busy:
+        raise HTTPException(status_code=409, detail="Documents are being processed. Please try again when the job is done.")
+    try:
+        pipeline = await run_in_threadpool(registry.rollback, request.version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        import traceback
+        print(f"Error rolling back index: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail="Failed to roll back the index.")
+    return {"message": f"Index version {request.version} is live", "index_version": pipeline.index_version}
+
+def _preload():
+    """Loads the models and the live index before workers are forked, so they share them."""
+    load_models(run_inference=False)
+    registry.load()
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "8000"))
+    workers = int(os.getenv("BACKEND_WORKERS", "1"))
+    if workers > 1:
+        from helpers.prefork import serve
+        serve(app, host, port, workers, preload=_preload if os.getenv("PRELOAD", "1") == "1" else None)
+    else:
+        import uvicorn
+        uvicorn.run(app, host=host, port=port)
@@ -0,0 +1,161 @@
+"""
+Recall-vs-latency report for the approximate FAISS index types (IVF-Flat, HNSW,
+IVF-PQ) against the exact flat index, on the chunk embeddings of data/.
+
+--scale N grows the corpus N-fold with jittered copies of the real vectors, to
+see how each index type behaves once many more regulations are loaded:
+
+    python benchmarks/bench_ann.py --scale 10 --output ann_results.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from benchmarks.bench_rag import summarize
+from helpers.chunker import chunk_documents
+from helpers.embeddings import CachedEmbeddings
+from helpers.loader import load_documents
+from helpers.vectorstore import build_faiss_index, set_search_params
+
+
+def corpus_vectors(data_path, workdir, workers, scale, seed):
+    """Embeds the chunks of data_path and optionally grows the set synthetically."""
+    docs = load_documents(data_path, workers=workers, cache_dir=os.path.join(workdir, "ingest"))
+    chunks = chunk_documents(docs)
+    embeddings = CachedEmbeddings(cache_dir=os.path.join(workdir, "embedding_cache"), query_cache_size=0)
+    vectors = np.asarray(embeddings.embed_documents([c.page_content for c in chunks]), dtype=np.float32)
+    if scale > 1:
+        rng = np.random.default_rng(seed)
+        noise = vectors.std(axis=0) * 0.25
+        copies = [vectors + rng.normal(0, noise, vectors.shape).astype(np.float32) for _ in range(scale - 1)]
+        vectors = np.vstack([vectors] + copies)
+    return embeddings, vectors
+
+
+def query_vectors(embeddings, questions, corpus, extra, seed):
+    """The benchmark questions plus `extra` jittered corpus vectors as queries."""
+    queries = [np.asarray(embeddings.embed_queries(questions), dtype=np.float32)]
+    if extra:
+        rng = np.random.default_rng(seed + 1)
+        picks = corpus[rng.choice(len(corpus), size=extra, replace=False)]
+        queries.append(picks + rng.normal(0, corpus.std(axis=0) * 0.1, picks.shape).astype(np.float32))
+    return np.vstack(queries)
+
+
+def search_one_by_one(index, queries, k):
+    """Searches queries individually, as the API does, returning (ids, per-query ms)."""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(found[0])
+    return np.vstack(ids), latencies
+
+
+def recall_at_k(found, truth):
+    """Mean fraction of the exact top-k neighbours that the approximate search returned."""
+    hits = [len(set(f[f != -1]) & set(t)) / len(t) for f, t in zip(found, truth)]
+    return round(float(np.mean(hits)), 4)
+
+
+def index_size_mb(index):
+    import faiss
+
+    return round(len(faiss.serialize_index(index)) / 2**20, 2)
+
+
+def bench_index(index_type, vectors, queries, truth, k, sweep_name, sweep_values, build_params):
+    """Builds one index type and measures recall and latency for each search setting."""
+    start = time.perf_counter()
+    index = build_faiss_index(vectors, index_type=index_type, **build_params)
+    index.add(vectors)
+    report = {
+        "index": type(index).__name__,
+        "build_s": round(time.perf_counter() - start, 3),
+        "size_mb": index_size_mb(index),
+        "settings": {},
+    }
+    for value in sweep_values:
+        set_search_params(index, **{sweep_name: value})
+        found, latencies = search_one_by_one(index, queries, k)
+        report["settings"][str(value)] = {"recall": recall_at_k(found, truth), "latency": summarize(latencies)}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall vs latency of approximate FAISS index types.")
+    parser.add_argument("--data-path", default=str(ROOT / "data"))
+    parser.add_argument("--questions", default=str(Path(__file__).parent / "questions.json"))
+    parser.add_argument("--workers", type=int, default=None, help="PDF parser processes")
+    parser.add_argument("--scale", type=int, default=1, help="Grow the corpus N-fold with jittered copies")
+    parser.add_argument("--extra-queries", type=int, default=200, help="Jittered corpus vectors added as queries")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query (the retriever's search_k)")
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32", help="IVF nprobe values to sweep")
+    parser.add_argument("--ef-search", default="16,32,64,128", help="HNSW efSearch values to sweep")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = 4 * sqrt(n))")
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--pq-m", type=int, default=0, help="PQ sub-quantizers (0 = dim / 8)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="ann_results.json")
+    args = parser.parse_args(argv)
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix="ann-bench-")
+    try:
+        print("Embedding corpus...")
+        embeddings, vectors = corpus_vectors(args.data_path, workdir, args.workers, args.scale, args.seed)
+        queries = query_vectors(embeddings, questions, vectors, min(args.extra_queries, len(vectors)), args.seed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}")
+
+    build_params = {"nlist": args.nlist, "hnsw_m": args.hnsw_m, "pq_m": args.pq_m}
+    nprobes = [int(v) for v in args.nprobe.split(",") if v]
+    efs = [int(v) for v in args.ef_search.split(",") if v]
+
+    # Exact search is the ground truth and the latency baseline
+    flat = build_faiss_index(vectors, index_type="flat")
+    flat.add(vectors)
+    truth, _ = search_one_by_one(flat, queries, args.k)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "vectors": int(len(vectors)),
+        "dim": int(vectors.shape[1]),
+        "indexes": {
+            "flat": bench_index("flat", vectors, queries, truth, args.k, "nprobe", [0], {}),
+            "ivf": bench_index("ivf", vectors, queries, truth, args.k, "nprobe", nprobes, build_params),
+            "hnsw": bench_index("hnsw", vectors, queries, truth, args.k, "ef_search", efs, build_params),
+            "ivfpq": bench_index("ivfpq", vectors, queries, truth, args.k, "nprobe", nprobes, build_params),
+        },
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n{'type':<6} {'index':<14} {'setting':>8} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'size MB':>8}")
+    for name, report in results["indexes"].items():
+        for setting, stats in report["settings"].items():
+            latency = stats["latency"]
+            print(
+                f"{name:<6} {report['index']:<14} {setting:>8} {stats['recall']:>7.3f} "
+                f"{latency['p50_ms']:>8.3f} {latency['p95_ms']:>8.3f} {report['size_mb']:>8.2f}"
+            )
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
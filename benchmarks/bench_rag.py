@@ -0,0 +1,324 @@
+"""
+Latency benchmark for the RAG pipeline, run against the PDFs in data/.
+
+ChatGroq is replaced by the deterministic FakeLegalLLM, so the benchmark needs no
+network access beyond the (locally cached) HuggingFace models. Results are
+written as JSON so two runs can be diffed:
+
+    python benchmarks/bench_rag.py --output bench_results.json
+    python benchmarks/bench_rag.py --output new.json --compare bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from benchmarks.fake_llm import FakeLegalLLM
+from helpers.chain import _format_docs, create_rag_chain
+from helpers.chunker import chunk_documents
+from helpers.context import get_token_counter
+from helpers.embeddings import CachedEmbeddings
+from helpers.extraction import throughput
+from helpers.lexical import LexicalIndex
+from helpers.loader import load_documents
+from helpers.filters import get_filter_index, make_filter
+from helpers.retriever import create_retriever, dense_search, resolve_filter
+from langchain_community.vectorstores import FAISS
+
+
+def summarize(samples_ms):
+    """Returns count, mean and p50/p95/p99 (milliseconds) of a list of samples."""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    if not len(samples):
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "n": int(len(samples)),
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """Runs fn and returns (result, elapsed milliseconds)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its children, in MiB."""
+    scale = 1 if platform.system() == "Darwin" else 1024  # bytes on macOS, KiB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return {"self": round(own / 2**20, 1), "children": round(children / 2**20, 1)}
+
+
+def bench_ingestion(data_path, workdir, workers, embed_limit):
+    """Times parsing (cold and cached), chunking, embedding and the FAISS and BM25 builds."""
+    stages = {}
+    cache_dir = os.path.join(workdir, "ingest")
+
+    extraction = {}
+    docs, stages["parse_cold"] = timed(load_documents, data_path, workers=workers, cache_dir=cache_dir, stats=extraction)
+    _, stages["parse_cached"] = timed(load_documents, data_path, workers=workers, cache_dir=cache_dir)
+    chunks, stages["chunk"] = timed(chunk_documents, docs)
+    if embed_limit:
+        chunks = chunks[:embed_limit]
+
+    # No disk cache, no query cache: every vector is computed
+    embeddings = CachedEmbeddings(cache_dir=None, query_cache_size=0)
+    texts = [chunk.page_content for chunk in chunks]
+    vectors, stages["embed_chunks"] = timed(embeddings.embed_documents, texts)
+    vectorstore, stages["index_build"] = timed(
+        FAISS.from_embeddings,
+        list(zip(texts, vectors)),
+        embeddings,
+        metadatas=[chunk.metadata for chunk in chunks],
+    )
+    lexical_index, stages["lexical_build"] = timed(LexicalIndex.from_vectorstore, vectorstore)
+
+    report = {name: {"ms": round(ms, 3)} for name, ms in stages.items()}
+    report["counts"] = {"pages": len(docs), "chunks": len(chunks)}
+    # Pages per wall-clock second of the parser pool, and pages and worker seconds per backend
+    report["parse_cold"]["extraction"] = throughput(extraction)
+    report["embed_chunks"]["chunks_per_s"] = round(len(chunks) / (stages["embed_chunks"] / 1000), 1)
+    return vectorstore, lexical_index, report
+
+
+def bench_queries(vectorstore, lexical_index, retriever, rag_chain, questions, iterations, search_k):
+    """
+    Times each query stage separately, then the end-to-end chain.
+
+    Returns:
+        tuple: (latency summary per stage, mean context tokens before and after packing)
+    """
+    reranker = retriever.base_compressor
+    embeddings = vectorstore.embedding_function
+    samples = {
+        "embed_query": [], "faiss_search": [], "faiss_search_filtered": [], "lexical_search": [],
+        "first_stage": [], "rerank": [], "format_docs": [], "end_to_end": [],
+    }
+    # A search scoped to the first document, as the API's "filters" would do
+    documents = get_filter_index(vectorstore).documents()
+    subset = resolve_filter(vectorstore, make_filter([documents[0]["source"]])) if documents else None
+    counter = get_token_counter()
+    tokens = {"retrieved": [], "packed": []}
+
+    for _ in range(iterations):
+        for question in questions:
+            vector, ms = timed(embeddings.embed_query, question)
+            samples["embed_query"].append(ms)
+            _, ms = timed(vectorstore.similarity_search_by_vector, vector, k=search_k)
+            samples["faiss_search"].append(ms)
+            if subset is not None:
+                _, ms = timed(dense_search, vectorstore, [vector], search_k, subset)
+                samples["faiss_search_filtered"].append(ms)
+            if lexical_index is not None:
+                _, ms = timed(lexical_index.search, question, search_k)
+                samples["lexical_search"].append(ms)
+            # Candidates that actually reach the cross-encoder (fused in hybrid mode)
+            candidates, ms = timed(retriever.base_retriever.invoke, question)
+            samples["first_stage"].append(ms)
+            reranked, ms = timed(reranker.compress_documents, candidates, question)
+            samples["rerank"].append(ms)
+            context, ms = timed(_format_docs, reranked, question)
+            samples["format_docs"].append(ms)
+            tokens["retrieved"].append(counter.count("\n\n".join(doc.page_content for doc in reranked)))
+            tokens["packed"].append(counter.count(context))
+            _, ms = timed(rag_chain.invoke, question)
+            samples["end_to_end"].append(ms)
+
+    context_tokens = {kind: round(float(np.mean(values)), 1) if values else 0 for kind, values in tokens.items()}
+    context_tokens["exact"] = counter.exact
+    return {stage: summarize(values) for stage, values in samples.items()}, context_tokens
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _post(url, payload):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, (time.perf_counter() - start) * 1000
+
+
+def bench_api(vectorstore, lexical_index, retriever, rag_chain, questions, client_counts, requests_per_client):
+    """Measures /ask-question throughput and latency under N concurrent clients."""
+    # The answer cache would turn repeated questions into hits; keep it out of the measurement
+    os.environ["ANSWER_CACHE_PATH"] = ""
+    os.environ["ANSWER_CACHE_THRESHOLD"] = "2"
+    os.environ["DATA_WATCH"] = "0"
+    sys.path.append(str(ROOT / "backend"))
+    import uvicorn
+    import main as backend
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(backend.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    # Let the backend's own startup finish before swapping in the benchmark pipeline
+    while not server.started or backend.startup_state["phase"] not in ("ready", "failed"):
+        time.sleep(0.05)
+
+    backend.registry.publish(vectorstore, retriever, rag_chain, lexical_index=lexical_index)
+
+    url = f"http://127.0.0.1:{port}/ask-question"
+    results = {}
+    try:
+        for clients in client_counts:
+            def client(offset):
+                return [
+                    _post(url, {"question": questions[(offset + i) % len(questions)]})
+                    for i in range(requests_per_client)
+                ]
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                responses = [r for batch in pool.map(client, range(clients)) for r in batch]
+            elapsed = time.perf_counter() - start
+
+            ok = [ms for status, ms in responses if status == 200]
+            results[str(clients)] = {
+                "requests": len(responses),
+                "ok": len(ok),
+                "rejected": sum(status in (429, 503) for status, _ in responses),
+                "throughput_rps": round(len(ok) / elapsed, 2),
+                "latency": summarize(ok),
+            }
+            print(f"  {clients:>3} clients: {results[str(clients)]['throughput_rps']} req/s")
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+    return results
+
+
+def compare(current, previous_path):
+    """Prints p50/p95 changes per stage against a previous results file."""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\nComparison against {previous_path}:")
+    for stage, stats in current["query_stages"].items():
+        old = previous.get("query_stages", {}).get(stage)
+        if not old or not old.get("n") or not stats["n"]:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            delta = (stats[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            print(f"  {stage:<14} {key}: {old[key]:>9.2f} -> {stats[key]:>9.2f} ms ({delta:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the RAG pipeline with a local fake LLM.")
+    parser.add_argument("--data-path", default=str(ROOT / "data"))
+    parser.add_argument("--questions", default=str(Path(__file__).parent / "questions.json"))
+    parser.add_argument("--iterations", type=int, default=3, help="Passes over the question set")
+    parser.add_argument("--workers", type=int, default=None, help="PDF parser processes")
+    parser.add_argument("--embed-limit", type=int, default=0, help="Only embed the first N chunks (0 = all)")
+    parser.add_argument("--search-k", type=int, default=10)
+    parser.add_argument("--rerank-candidates", type=int, default=6, help="Fused candidates reranked (hybrid)")
+    parser.add_argument("--dense-only", action="store_true", help="Disable BM25 fusion (FAISS candidates only)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per LLM call")
+    parser.add_argument("--clients", default="1,4,16", help="Comma-separated concurrent client counts")
+    parser.add_argument("--requests-per-client", type=int, default=5)
+    parser.add_argument("--skip-api", action="store_true", help="Skip the FastAPI concurrency benchmark")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="Previous results JSON to diff against")
+    args = parser.parse_args(argv)
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    try:
+        print("Ingestion...")
+        vectorstore, lexical_index, ingestion = bench_ingestion(
+            args.data_path, workdir, args.workers, args.embed_limit
+        )
+        if args.dense_only:
+            lexical_index = None
+
+        llm = FakeLegalLLM(latency=args.llm_latency)
+        retriever = create_retriever(
+            vectorstore,
+            search_k=args.search_k,
+            lexical_index=lexical_index,
+            rerank_candidates=args.rerank_candidates,
+        )
+        rag_chain = create_rag_chain(retriever, llm=llm)
+
+        print("Query stages...")
+        query_stages, context_tokens = bench_queries(
+            vectorstore, lexical_index, retriever, rag_chain, questions, args.iterations, args.search_k
+        )
+
+        api = {}
+        if not args.skip_api:
+            print("API concurrency...")
+            client_counts = [int(n) for n in args.clients.split(",") if n]
+            api = bench_api(
+                vectorstore, lexical_index, retriever, rag_chain, questions, client_counts, args.requests_per_client
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": vars(args),
+        "ingestion": ingestion,
+        "query_stages": query_stages,
+        "context_tokens": context_tokens,
+        "api": api,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\nStage latencies over {len(questions) * args.iterations} queries:")
+    for stage, stats in query_stages.items():
+        if not stats["n"]:
+            continue
+        print(f"  {stage:<14} p50 {stats['p50_ms']:>9.2f}  p95 {stats['p95_ms']:>9.2f}  p99 {stats['p99_ms']:>9.2f} ms")
+    print(
+        f"Context tokens per question: {context_tokens['retrieved']} retrieved, {context_tokens['packed']} packed"
+        + ("" if context_tokens["exact"] else " (estimated)")
+    )
+    print(f"Peak RSS: {results['peak_rss_mb']} MiB")
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
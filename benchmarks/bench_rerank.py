@@ -0,0 +1,164 @@
+"""
+Accuracy parity and latency of the reranker variants on the fixed question set
+in benchmarks/questions.json:
+
+  * the quantized ONNX cross-encoder (RERANKER_BACKEND=onnx) against PyTorch,
+  * adaptive reranking (RERANK_SKIP_GAP / RERANK_SCORE_WINDOW) against full reranking.
+
+The PyTorch model reranking every candidate is the reference. Each variant is
+reported with top-1 agreement, overlap of the top-n documents, cross-encoder
+pairs scored and rerank latency. Run it against a processed index:
+
+    python benchmarks/bench_rerank.py --persist-directory ./startup_db
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from benchmarks.bench_rag import summarize, timed
+from helpers.lexical import load_lexical_index
+from helpers.retriever import (
+    DEFAULT_RERANKER_MODEL,
+    RETRIEVAL_SCORE_KEY,
+    create_retriever,
+    get_cross_encoder,
+    plan_rerank,
+    rerank,
+)
+from helpers.index_versions import index_dir
+from helpers.vectorstore import load_vectorstore
+
+
+def _floats(values):
+    return [float(value) for value in values.split(",") if value]
+
+
+def rank_correlation(a, b):
+    """Spearman correlation of two score lists (1.0 = identical ordering)."""
+    if len(a) < 2:
+        return 1.0
+    ranks_a = np.argsort(np.argsort(a))
+    ranks_b = np.argsort(np.argsort(b))
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+
+def run_variant(model, questions, candidates, top_n, iterations, skip_gap=0.0, score_window=0.0):
+    """Reranks every question's candidates; returns the chosen chunk IDs and stats."""
+    chosen, latencies, pairs, skipped = [], [], 0, 0
+    for _ in range(iterations):
+        chosen = []
+        for question, docs in zip(questions, candidates):
+            plan = plan_rerank([doc.metadata.get(RETRIEVAL_SCORE_KEY) for doc in docs], skip_gap, score_window)
+            result, ms = timed(rerank, model, question, docs, top_n, skip_gap, score_window)
+            latencies.append(ms)
+            pairs += len(plan) if plan is not None else 0
+            skipped += plan is None
+            chosen.append([doc.id for doc in result])
+    runs = len(questions) * iterations
+    return chosen, {
+        "pairs_per_query": round(pairs / runs, 2),
+        "skipped_fraction": round(skipped / runs, 3),
+        "latency": summarize(latencies),
+    }
+
+
+def parity(chosen, reference, top_n):
+    """Top-1 agreement and mean top-n overlap of chosen against the reference."""
+    top1 = np.mean([bool(c) and bool(r) and c[0] == r[0] for c, r in zip(chosen, reference)])
+    overlap = np.mean([len(set(c) & set(r)) / max(1, min(top_n, len(r))) for c, r in zip(chosen, reference)])
+    return {"top1_agreement": round(float(top1), 3), "overlap_at_n": round(float(overlap), 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reranker parity: ONNX vs PyTorch, adaptive vs full.")
+    parser.add_argument("--persist-directory", default="./startup_db")
+    parser.add_argument("--questions", default=str(Path(__file__).parent / "questions.json"))
+    parser.add_argument("--model", default=DEFAULT_RERANKER_MODEL)
+    parser.add_argument("--search-k", type=int, default=10)
+    parser.add_argument("--rerank-candidates", type=int, default=6)
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument("--dense-only", action="store_true", help="FAISS candidates only (no BM25 fusion)")
+    parser.add_argument("--skip-gaps", default="0.02,0.05,0.1", help="RERANK_SKIP_GAP values to evaluate")
+    parser.add_argument("--score-windows", default="0.05,0.1,0.2", help="RERANK_SCORE_WINDOW values to evaluate")
+    parser.add_argument("--iterations", type=int, default=3, help="Timed passes over the question set")
+    parser.add_argument("--output", default="rerank_results.json")
+    args = parser.parse_args(argv)
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    directory = index_dir(args.persist_directory)
+    vectorstore = load_vectorstore(directory)
+    if vectorstore is None:
+        sys.exit(f"No vectorstore found in {args.persist_directory}; process documents first.")
+    lexical_index = None if args.dense_only else load_lexical_index(directory, vectorstore)
+    retriever = create_retriever(
+        vectorstore,
+        search_k=args.search_k,
+        lexical_index=lexical_index,
+        rerank_candidates=args.rerank_candidates,
+    )
+    # The same first-stage candidates go to every variant
+    candidates = [retriever.base_retriever.invoke(question) for question in questions]
+
+    torch_model = get_cross_encoder(args.model, "torch")
+    onnx_model = get_cross_encoder(args.model, "onnx")
+    models = {"torch": torch_model}
+    if onnx_model is not torch_model:
+        models["onnx"] = onnx_model
+    else:
+        print("ONNX backend unavailable; install sentence-transformers[onnx] to include it")
+
+    reference, _ = run_variant(torch_model, questions, candidates, args.top_n, 1)
+    variants = {}
+    for backend, model in models.items():
+        settings = [("full", 0.0, 0.0)]
+        settings += [(f"skip_gap={gap}", gap, 0.0) for gap in _floats(args.skip_gaps)]
+        settings += [(f"window={window}", 0.0, window) for window in _floats(args.score_windows)]
+        for label, gap, window in settings:
+            chosen, stats = run_variant(model, questions, candidates, args.top_n, args.iterations, gap, window)
+            variants[f"{backend} {label}"] = {**parity(chosen, reference, args.top_n), **stats}
+
+    # Raw score agreement of the two runtimes over every (question, candidate) pair
+    score_parity = None
+    if "onnx" in models:
+        pairs = [(q, doc.page_content) for q, docs in zip(questions, candidates) for doc in docs]
+        torch_scores = np.asarray(torch_model.score(pairs))
+        onnx_scores = np.asarray(onnx_model.score(pairs))
+        score_parity = {
+            "max_abs_diff": round(float(np.max(np.abs(torch_scores - onnx_scores))), 4),
+            "spearman": round(rank_correlation(torch_scores, onnx_scores), 4),
+        }
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "questions": len(questions),
+        "candidates_per_query": round(float(np.mean([len(docs) for docs in candidates])), 2),
+        "onnx_score_parity": score_parity,
+        "variants": variants,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n{'variant':<24} {'top1':>6} {'overlap':>8} {'pairs':>6} {'skipped':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, stats in variants.items():
+        print(
+            f"{name:<24} {stats['top1_agreement']:>6.3f} {stats['overlap_at_n']:>8.3f} "
+            f"{stats['pairs_per_query']:>6.2f} {stats['skipped_fraction']:>8.3f} "
+            f"{stats['latency']['p50_ms']:>8.2f} {stats['latency']['p95_ms']:>8.2f}"
+        )
+    if score_parity:
+        print(f"ONNX vs PyTorch scores: max |diff| {score_parity['max_abs_diff']}, Spearman {score_parity['spearman']}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Deterministic local stand-in for ChatGroq so benchmarks run offline.
+"""
+import hashlib
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+
+class FakeLegalLLM(SimpleChatModel):
+    """
+    Answers with a fixed-length reply derived from a hash of the prompt, after
+    an optional per-call latency plus per-token delay, so timings are repeatable.
+    """
+
+    latency: float = 0.0
+    """Seconds slept before the first token (simulated network + prefill)."""
+    token_delay: float = 0.0
+    """Seconds slept between streamed tokens (simulated decoding)."""
+    answer_words: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-legal-llm"
+
+    def _answer(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "".join(str(m.content) for m in messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = [f"word{digest[i % len(digest)]}" for i in range(self.answer_words)]
+        return [f"{word} " for word in words]
+
+    def _call(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        tokens = self._answer(messages)
+        time.sleep(self.latency + self.token_delay * len(tokens))
+        return "".join(tokens)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for token in self._answer(messages):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -16,6 +16,16 @@ interface ProcessResponse {
   message: string
   success: boolean
   document_count?: number
+  job_id?: string
+  status?: string
+}
+
+interface Job {
+  job_id: string
+  status: 'queued' | 'running' | 'succeeded' | 'failed'
+  progress: { phase?: string; [key: string]: any }
+  result?: { document_count: number }
+  error?: string
 }
 
 interface AnswerResponse {
@@ -29,6 +39,16 @@ interface ChatMessage {
   timestamp: string
 }
 
+// Chat history is kept per browser; the ID survives reloads
+const getSessionId = () => {
+  let sessionId = localStorage.getItem('session_id')
+  if (!sessionId) {
+    sessionId = crypto.randomUUID()
+    localStorage.setItem('session_id', sessionId)
+  }
+  return sessionId
+}
+
 export default function Home() {
   const [status, setStatus] = useState<SystemStatus | null>(null)
   const [loading, setLoading] = useState(false)
@@ -85,7 +105,9 @@ export default function Home() {
 
   const loadChatHistory = async () => {
     try {
-      const response = await axios.get('/api/chat-history')
+      const response = await axios.get('/api/chat-history', {
+        params: { session_id: getSessionId(), limit: 100 }
+      })
       setChatHistory(response.data.chat_history || [])
     } catch (error) {
       console.error('Error loading chat history:', error)
@@ -94,7 +116,7 @@ export default function Home() {
 
   const clearChatHistory = async () => {
     try {
-      await axios.delete('/api/chat-history')
+      await axios.delete('/api/chat-history', { params: { session_id: getSessionId() } })
       setChatHistory([])
       setMessage('✅ Chat history cleared')
     } catch (error) {
@@ -111,6 +133,23 @@ export default function Home() {
     }
   }
 
+  // Processing runs as a background job on the backend; poll it until it finishes
+  const waitForJob = async (jobId: string) => {
+    while (true) {
+      const response = await axios.get<Job>(`/api/jobs/${jobId}`)
+      const job = response.data
+      if (job.status === 'succeeded') {
+        setMessage(`✅ Documents processed successfully! (${job.result?.document_count ?? 0} chunks)`)
+        return
+      }
+      if (job.status === 'failed') {
+        throw { response: { data: { detail: 'Processing failed. Please try again.' } } }
+      }
+      setMessage(`⏳ Processing documents${job.progress.phase ? ` (${job.progress.phase})` : ''}...`)
+      await new Promise((resolve) => setTimeout(resolve, 1000))
+    }
+  }
+
   const processDocuments = async () => {
     setProcessing(true)
     setMessage('')
@@ -118,6 +157,7 @@ export default function Home() {
       const response = await axios.post<ProcessResponse>('/api/process-documents')
       if (response.data.success) {
         setMessage(`✅ ${response.data.message}`)
+        if (response.data.job_id) await waitForJob(response.data.job_id)
         await checkStatus() // Refresh status
       }
     } catch (error: any) {
@@ -134,6 +174,7 @@ export default function Home() {
       const response = await axios.post<ProcessResponse>('/api/reprocess-documents')
       if (response.data.success) {
         setMessage(`✅ ${response.data.message}`)
+        if (response.data.job_id) await waitForJob(response.data.job_id)
         await checkStatus() // Refresh status
       }
     } catch (error: any) {
@@ -150,7 +191,8 @@ export default function Home() {
     setAnswer('')
     try {
       const response = await axios.post<AnswerResponse>('/api/ask-question', {
-        question: question.trim()
+        question: question.trim(),
+        session_id: getSessionId()
       })
       if (response.data.success) {
         setAnswer(response.data.answer)
@@ -0,0 +1,203 @@
+"""
+Semantic answer cache: near-identical questions are answered from earlier
+responses instead of re-running retrieval, reranking and the LLM.
+
+Entries are matched by cosine similarity of query embeddings, expire after a
+TTL and are evicted least-recently-used beyond a size limit. An answer is only
+returned for the index version it was answered against; workers still serving
+the previous version during a switch keep their own answers, and
+purge_other_versions() drops the old ones once a new version is live. An optional SQLite file
+keeps the cache across restarts and shares it between worker processes: each
+process picks up answers the others stored before it looks a question up.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = "./startup_db/answer_cache.sqlite"
+
+
+class SemanticAnswerCache:
+    """
+    Args:
+        embeddings: LangChain Embeddings used to embed questions.
+        threshold (float): Minimum cosine similarity for a hit.
+        ttl_seconds (float): Entry lifetime; 0 disables expiry.
+        max_entries (int): LRU size limit.
+        path (str): SQLite file for persistence, or None for memory only.
+    """
+
+    def __init__(self, embeddings, threshold=0.92, ttl_seconds=86400, max_entries=1000, path=DEFAULT_CACHE_PATH):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+        # entry_id -> (question, unit vector, answer, created_at, index_version), in LRU order
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._matrix = None
+        self._matrix_ids = []
+        self._matrix_versions = None
+        self._db = None
+        self._data_version = None  # SQLite data_version when entries were last synced
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "id TEXT PRIMARY KEY, question TEXT, vector BLOB, answer TEXT, "
+                "created_at REAL, last_used REAL, index_version TEXT)"
+            )
+            self._db.commit()
+            self._load()
+
+    def _load(self):
+        rows = self._db.execute(
+            "SELECT id, question, vector, answer, created_at, index_version FROM answers ORDER BY last_used"
+        ).fetchall()
+        for id_, question, vector, answer, created_at, version in rows:
+            self._entries[id_] = (question, np.frombuffer(vector, dtype=np.float32), answer, created_at, version)
+        self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        self._purge_expired(time.time())
+        self._matrix = None
+
+    def _sync(self):
+        """Applies answers stored or removed by other processes since the last call."""
+        if self._db is None:
+            return
+        # data_version only changes when another connection commits
+        data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+        ids = {id_ for id_, in self._db.execute("SELECT id FROM answers")}
+        gone = [id_ for id_ in self._entries if id_ not in ids]
+        for id_ in gone:
+            del self._entries[id_]
+        new = [id_ for id_ in ids if id_ not in self._entries]
+        for start in range(0, len(new), 500):
+            batch = new[start:start + 500]
+            rows = self._db.execute(
+                "SELECT id, question, vector, answer, created_at, index_version FROM answers "
+                f"WHERE id IN ({','.join('?' * len(batch))}) ORDER BY last_used",
+                batch,
+            ).fetchall()
+            for id_, question, vector, answer, created_at, version in rows:
+                self._entries[id_] = (question, np.frombuffer(vector, dtype=np.float32), answer, created_at, version)
+        if gone or new:
+            self._matrix = None
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _delete(self, ids):
+        for id_ in ids:
+            self._entries.pop(id_, None)
+        if self._db is not None and ids:
+            self._db.executemany("DELETE FROM answers WHERE id = ?", [(id_,) for id_ in ids])
+            self._db.commit()
+        self._matrix = None
+
+    def _purge_expired(self, now: float):
+        if not self.ttl_seconds:
+            return
+        expired = [id_ for id_, entry in self._entries.items() if now - entry[3] > self.ttl_seconds]
+        self._delete(expired)
+
+    def _similarity_matrix(self):
+        if self._matrix is None:
+            self._matrix_ids = list(self._entries)
+            self._matrix = (
+                np.stack([self._entries[id_][1] for id_ in self._matrix_ids])
+                if self._matrix_ids else None
+            )
+            self._matrix_versions = np.array([self._entries[id_][4] for id_ in self._matrix_ids], dtype=object)
+        return self._matrix
+
+    def lookup(self, question: str, index_version: str, vector: Optional[np.ndarray] = None) -> Optional[str]:
+        """
+        Returns a cached answer for a semantically equivalent question, or None.
+
+        Args:
+            question (str): Incoming question.
+            index_version (str): Version of the index answers must come from.
+            vector (np.ndarray): Precomputed unit query vector, if available.
+        """
+        vector = self._embed(question) if vector is None else vector
+        now = time.time()
+        with self._lock:
+            self._sync()
+            self._purge_expired(now)
+            matrix = self._similarity_matrix()
+            if matrix is None:
+                self.stats["misses"] += 1
+                return None
+            # Answers from other index versions never match
+            scores = np.where(self._matrix_versions == index_version, matrix @ vector, -np.inf)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.stats["misses"] += 1
+                return None
+            id_ = self._matrix_ids[best]
+            self._entries.move_to_end(id_)
+            if self._db is not None:
+                self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, id_))
+                self._db.commit()
+            self.stats["hits"] += 1
+            return self._entries[id_][2]
+
+    def store(self, question: str, answer: str, index_version: str, vector: Optional[np.ndarray] = None):
+        """Caches an answer produced against the given index version."""
+        vector = self._embed(question) if vector is None else vector
+        now = time.time()
+        id_ = uuid.uuid4().hex
+        with self._lock:
+            self._sync()
+            self._entries[id_] = (question, vector, answer, now, index_version)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (id_, question, vector.astype(np.float32).tobytes(), answer, now, now, index_version),
+                )
+                self._db.commit()
+            overflow = list(self._entries)[:max(0, len(self._entries) - self.max_entries)]
+            self.stats["evictions"] += len(overflow)
+            self._delete(overflow)
+            self._matrix = None
+
+    def purge_other_versions(self, index_version: str):
+        """Drops every answer not produced against index_version, e.g. after a new version went live."""
+        with self._lock:
+            self._sync()
+            stale = [id_ for id_, entry in self._entries.items() if entry[4] != index_version]
+            self.stats["invalidations"] += len(stale)
+            self._delete(stale)
+
+    def clear(self):
+        """Drops every cached answer."""
+        with self._lock:
+            self._delete(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def answer_cache_from_env(embeddings, path=DEFAULT_CACHE_PATH) -> SemanticAnswerCache:
+    """Creates a SemanticAnswerCache tuned by ANSWER_CACHE_* environment variables."""
+    return SemanticAnswerCache(
+        embeddings,
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+        max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+        path=os.getenv("ANSWER_CACHE_PATH", path) or None,
+    )
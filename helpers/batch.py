@@ -0,0 +1,240 @@
+"""
+Batch question answering: many questions share one embedding call, one FAISS
+search, batched cross-encoder scoring and concurrency-bounded LLM calls.
+
+Also usable offline:
+
+    python -m helpers.batch questions.jsonl answers.jsonl --concurrency 4
+
+Each input line is a JSON object with a "question" field; every other field is
+copied to the output line next to "answer" (or "error") and "sources".
+"""
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+
+from helpers.chain import _format_docs, create_llm, create_prompt
+from helpers.context import record_prompt_tokens
+from helpers.docstore import get_documents
+from helpers.metrics import LLMMetricsCallback, time_stage
+from helpers.retriever import (
+    DEFAULT_RERANKER_MODEL,
+    DEFAULT_SCORE_WINDOW,
+    DEFAULT_SKIP_GAP,
+    RERANK_DECISIONS,
+    RERANK_PAIRS,
+    RETRIEVAL_SCORE_KEY,
+    dense_search,
+    get_cross_encoder,
+    plan_rerank,
+    reciprocal_rank_fusion,
+    resolve_filter,
+    with_retrieval_scores,
+)
+
+
+def retrieve_batch(
+    vectorstore,
+    questions: List[str],
+    search_k: int = 10,
+    reranker_top_n: int = 3,
+    reranker_model: str = DEFAULT_RERANKER_MODEL,
+    lexical_index=None,
+    rerank_candidates: int = 6,
+    skip_gap: float = DEFAULT_SKIP_GAP,
+    score_window: float = DEFAULT_SCORE_WINDOW,
+    search_filter=None,
+) -> List[List[Document]]:
+    """
+    Retrieves and reranks context for many questions at once.
+
+    Args:
+        vectorstore (FAISS): The FAISS vectorstore instance.
+        questions (list): Questions to retrieve for.
+        search_k (int): Candidates fetched per question.
+        reranker_top_n (int): Documents kept per question after reranking.
+        reranker_model (str): HuggingFace cross-encoder model for reranking.
+        lexical_index (BM25Index): Enables hybrid FAISS + BM25 retrieval when given.
+        rerank_candidates (int): Fused candidates reranked per question in hybrid mode.
+        skip_gap (float): Adaptive reranking; see helpers.retriever.plan_rerank.
+        score_window (float): Adaptive reranking; see helpers.retriever.plan_rerank.
+        search_filter (SearchFilter): Restricts every question to part of the index.
+
+    Returns:
+        list[list[Document]]: Reranked documents per question.
+    """
+    if not questions:
+        return []
+    subset = resolve_filter(vectorstore, search_filter)
+    if subset is not None and not len(subset):
+        return [[] for _ in questions]
+
+    # 1. One embedding batch for every question
+    embeddings = vectorstore.embedding_function
+    with time_stage("batch_embed"):
+        if hasattr(embeddings, "embed_queries"):
+            vectors = embeddings.embed_queries(questions)
+        else:
+            vectors = embeddings.embed_documents(questions)
+
+    # 2. One vectorized FAISS search for every question, fused with BM25 if available
+    with time_stage("batch_retrieve"):
+        dense_hits = [dict(hits) for hits in dense_search(vectorstore, vectors, search_k, subset)]
+        rankings = [list(hits) for hits in dense_hits]
+        if lexical_index is not None and len(lexical_index):
+            allowed = subset.ids if subset is not None else None
+            rankings = [
+                reciprocal_rank_fusion(
+                    [ids, [id_ for id_, _ in lexical_index.search(question, search_k, allowed)]]
+                )[:rerank_candidates]
+                for question, ids in zip(questions, rankings)
+            ]
+    candidates = [
+        with_retrieval_scores(get_documents(vectorstore.docstore, ids), hits)
+        for ids, hits in zip(rankings, dense_hits)
+    ]
+
+    # 3. One cross-encoder call over every (question, document) pair that needs scoring
+    plans = [
+        plan_rerank([doc.metadata.get(RETRIEVAL_SCORE_KEY) for doc in docs], skip_gap, score_window)
+        for docs in candidates
+    ]
+    pairs = [
+        (question, docs[i].page_content)
+        for question, docs, plan in zip(questions, candidates, plans)
+        for i in (plan or [])
+    ]
+    with time_stage("batch_rerank"):
+        scores = get_cross_encoder(reranker_model).score(pairs) if pairs else []
+    RERANK_PAIRS.inc(len(pairs))
+
+    results, offset = [], 0
+    for docs, plan in zip(candidates, plans):
+        if plan is None:
+            RERANK_DECISIONS.inc(mode="skipped")
+            results.append(docs[:reranker_top_n])
+            continue
+        RERANK_DECISIONS.inc(mode="full" if len(plan) == len(docs) else "shortened")
+        doc_scores = scores[offset:offset + len(plan)]
+        offset += len(plan)
+        ranked = sorted(zip([docs[i] for i in plan], doc_scores), key=lambda pair: pair[1], reverse=True)
+        chosen = set(plan)
+        rest = [doc for i, doc in enumerate(docs) if i not in chosen]
+        results.append(([doc for doc, _ in ranked] + rest)[:reranker_top_n])
+    return results
+
+
+def answer_batch(
+    vectorstore,
+    questions: List[str],
+    max_concurrency: int = 4,
+    llm=None,
+    **retrieve_kwargs,
+) -> List[dict]:
+    """
+    Answers many questions, fanning LLM calls out with bounded concurrency.
+
+    Args:
+        vectorstore (FAISS): The FAISS vectorstore instance.
+        questions (list): Questions to answer.
+        max_concurrency (int): Maximum LLM calls in flight.
+        llm: Chat model to answer with. Defaults to create_llm().
+        **retrieve_kwargs: Passed to retrieve_batch.
+
+    Returns:
+        list[dict]: {"question", "answer" or "error", "sources"} per question, in order.
+    """
+    contexts = retrieve_batch(vectorstore, questions, **retrieve_kwargs)
+    llm = (llm or create_llm()).with_config(callbacks=[LLMMetricsCallback()])
+    chain = create_prompt() | RunnableLambda(record_prompt_tokens) | llm | StrOutputParser()
+    inputs = [
+        {"context": _format_docs(docs, question), "question": question}
+        for question, docs in zip(questions, contexts)
+    ]
+    outputs = chain.batch(inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True)
+
+    results = []
+    for question, docs, output in zip(questions, contexts, outputs):
+        result = {
+            "question": question,
+            "sources": sorted({doc.metadata.get("source", "") for doc in docs}),
+        }
+        if isinstance(output, Exception):
+            result["error"] = str(output)
+        else:
+            result["answer"] = output
+        results.append(result)
+    return results
+
+
+def _read_jsonl(path: str) -> List[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv: Optional[List[str]] = None):
+    from dotenv import load_dotenv
+    from helpers.answer_cache import answer_cache_from_env
+    from helpers.filters import make_filter
+    from helpers.index_versions import index_dir
+    from helpers.lexical import load_lexical_index
+    from helpers.vectorstore import get_index_version, load_vectorstore
+
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions in batch.")
+    parser.add_argument("input", help="JSONL file with one {\"question\": ...} object per line")
+    parser.add_argument("output", help="JSONL file to write answers to")
+    parser.add_argument("--persist-directory", default="./startup_db")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum LLM calls in flight")
+    parser.add_argument("--batch-size", type=int, default=64, help="Questions retrieved per batch")
+    parser.add_argument("--warm-cache", action="store_true", help="Store answers in the semantic answer cache")
+    parser.add_argument("--source", action="append", default=[], help="Only search this document (file name or proclamation number); repeatable")
+    parser.add_argument("--year-from", type=int)
+    parser.add_argument("--year-to", type=int)
+    parser.add_argument("--article-from", type=int)
+    parser.add_argument("--article-to", type=int)
+    args = parser.parse_args(argv)
+    search_filter = make_filter(args.source, args.year_from, args.year_to, args.article_from, args.article_to)
+
+    load_dotenv()
+    directory = index_dir(args.persist_directory)
+    vectorstore = load_vectorstore(directory)
+    if vectorstore is None:
+        sys.exit(f"No vectorstore found in {args.persist_directory}; process documents first.")
+    lexical_index = load_lexical_index(directory, vectorstore)
+    # Cached answers are shared by unfiltered questions only
+    cache = answer_cache_from_env(vectorstore.embedding_function) if args.warm_cache and search_filter is None else None
+    index_version = get_index_version(directory)
+
+    records = _read_jsonl(args.input)
+    llm = create_llm()
+    failures = 0
+    with open(args.output, "w", encoding="utf-8") as out:
+        for start in range(0, len(records), args.batch_size):
+            batch = records[start:start + args.batch_size]
+            questions = [record.get("question", "") for record in batch]
+            results = answer_batch(
+                vectorstore,
+                questions,
+                max_concurrency=args.concurrency,
+                llm=llm,
+                lexical_index=lexical_index,
+                search_filter=search_filter,
+            )
+            for record, result in zip(batch, results):
+                failures += "error" in result
+                if cache is not None and "answer" in result:
+                    cache.store(result["question"], result["answer"], index_version)
+                out.write(json.dumps({**record, **result}, ensure_ascii=False) + "\n")
+            print(f"Answered {min(start + args.batch_size, len(records))}/{len(records)} questions")
+
+    if failures:
+        print(f"{failures} question(s) failed; see the \"error\" field in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
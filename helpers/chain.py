@@ -1,40 +1,17 @@
 # helpers/chain.py
 
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
-from langchain_groq import ChatGroq
 from langchain_classic.retrievers import ContextualCompressionRetriever
 
+from helpers.context import pack_context, record_prompt_tokens
+from helpers.llm import get_llm
+from helpers.metrics import LLMMetricsCallback, time_stage
 
-def _format_docs(docs: list) -> str:
-    """
-    Formats the retrieved documents into a single string for the LLM.
-    """
-    if not docs:
-        return "No relevant context found."
-    return "\n\n".join(doc.page_content for doc in docs)
-
-
-def create_rag_chain(retriever: ContextualCompressionRetriever):
-    """
-    Creates the full RAG chain for question answering using Groq.
-
-    Args:
-        retriever (ContextualCompressionRetriever): Retriever with reranking.
-
-    Returns:
-        Runnable: A runnable RAG pipeline.
-    """
-
-    # 1. Initialize Groq LLM (Llama-3 is super fast here)
-    llm = ChatGroq(
-        temperature=0,   # deterministic answers
-        model_name="llama-3.1-8b-instant"  # Groq's current fast model
-    )
 
-    # 2. Define the enhanced system prompt
-    prompt_template = """
+# The enhanced system prompt
+PROMPT_TEMPLATE = """
     You are an expert Ethiopian business law consultant with 20+ years of experience helping entrepreneurs understand complex legal requirements. You are knowledgeable, approachable, and always prioritize clarity and accuracy.
 
     **CORE RESPONSIBILITIES:**
@@ -178,15 +155,70 @@ def create_rag_chain(retriever: ContextualCompressionRetriever):
     **Your Response:**
     """
 
-    prompt = ChatPromptTemplate.from_template(prompt_template)
+
+def _format_docs(docs: list, question: str = "") -> str:
+    """
+    Formats the retrieved documents into a single string for the LLM,
+    deduplicated and trimmed to the context token budget (see helpers/context.py).
+    """
+    with time_stage("format_docs"):
+        return pack_context(docs, question)
+
+
+def _question(inputs) -> str:
+    """The question from chain input: a string, or {"question": ..., "filter": ...}."""
+    return inputs["question"] if isinstance(inputs, dict) else inputs
+
+
+def create_llm():
+    """
+    Returns the shared LLM for the configured providers (Groq's Llama-3 by
+    default; see helpers/llm.py for local llama.cpp, fallback and hedging).
+    """
+    return get_llm()
+
+
+def create_prompt() -> ChatPromptTemplate:
+    """
+    Returns the enhanced system prompt expecting {context} and {question}.
+    """
+    return ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+
+
+def create_rag_chain(retriever: ContextualCompressionRetriever, llm=None):
+    """
+    Creates the full RAG chain for question answering.
+
+    The chain takes a question string, or {"question": ..., "filter": SearchFilter}
+    to answer from part of the index only (see helpers/filters.py).
+
+    Args:
+        retriever (ContextualCompressionRetriever): Retriever with reranking.
+        llm: Chat model to answer with. Defaults to create_llm().
+
+    Returns:
+        Runnable: A runnable RAG pipeline.
+    """
+
+    # 1. Initialize the LLM (latency and token usage go to /metrics)
+    llm = (llm or create_llm()).with_config(callbacks=[LLMMetricsCallback()])
+
+    # 2. Define the enhanced system prompt
+    prompt = create_prompt()
 
     # 3. Define the chain
+    def retrieve_context(inputs, config):
+        question = _question(inputs)
+        search_filter = inputs.get("filter") if isinstance(inputs, dict) else None
+        return _format_docs(retriever.invoke(question, config, search_filter=search_filter), question)
+
     rag_chain = (
         {
-            "context": retriever | _format_docs, 
-            "question": RunnablePassthrough()
+            "context": RunnableLambda(retrieve_context), 
+            "question": RunnableLambda(_question)
         }
         | prompt
+        | RunnableLambda(record_prompt_tokens)
         | llm
         | StrOutputParser()
     )
@@ -1,9 +1,350 @@
+"""
+Splits the parsed PDF pages into chunks for embedding.
+
+The proclamations in data/ are bilingual Federal Negarit Gazette issues: every
+page carries the Amharic text followed by the English text, under a repeated
+gazette header. The "legal" strategy (the default) follows that structure:
+
+  * header/footer lines repeated across pages and bare page numbers are dropped,
+  * Amharic and English lines are followed separately, so an article that runs
+    over a page break continues in the right language,
+  * chunks are cut at article headings ("3. Scope of Application", "፫. ...")
+    and, for long articles, at sub-articles ("1/", "፩/"); short consecutive
+    articles of the same language and part share a chunk up to chunk_size,
+  * each chunk records the proclamation, year, part, article number (and the
+    last article, for shared chunks) and title, sub-articles and the page range
+    it spans,
+  * chunks whose text repeats within a document are kept once.
+
+Documents with no recognizable articles fall back to the recursive splitter,
+which is also what CHUNKER=recursive uses everywhere.
+"""
+import os
+import re
+from collections import Counter, defaultdict
+from itertools import groupby
+
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def chunk_documents(docs, chunk_size=800, chunk_overlap=100):
+CHUNKERS = ("legal", "recursive")
+# Bumped whenever the legal chunker's output changes, so existing indexes are rebuilt
+_LEGAL_CHUNKER_VERSION = 2
+
+_ETHIOPIC_DIGITS = "፩-፼"
+_EN_ARTICLE_RE = re.compile(r"^\s*(?:Article\s+)?(\d{1,3})\s*\.\s*([A-Z][^\n]{0,120}?)\s*$")
+_AM_ARTICLE_RE = re.compile(rf"^\s*([{_ETHIOPIC_DIGITS}]+)\s*\.\s*(\S[^\n]{{0,80}}?)\s*$")
+_EN_SUB_ARTICLE_RE = re.compile(r"^\s*(\d{1,2})\s*/")
+_AM_SUB_ARTICLE_RE = re.compile(rf"^\s*([{_ETHIOPIC_DIGITS}]+)\s*/")
+_PART_RE = re.compile(r"^\s*(PART\s+[A-Z]+)\s*$")
+_PAGE_NUMBER_RE = re.compile(rf"^[\d{_ETHIOPIC_DIGITS}ሺ\s.…-]*$")
+_PROCLAMATION_RE = re.compile(r"Proclamation\s+No\.?\s*(\d{2,5})\s*/\s*(\d{4})", re.IGNORECASE)
+_FILENAME_PROCLAMATION_RE = re.compile(r"no[-_. ]*(\d{2,5})[-_/](\d{4})", re.IGNORECASE)
+
+# Lines this close to the top or bottom of a page are header/footer candidates
+_EDGE_LINES = 4
+# A header/footer line must recur on at least this share of a document's pages
+_BOILERPLATE_SHARE = 0.5
+# Chunks with fewer letters than this carry no content (stray numerals, dots)
+_MIN_CHUNK_LETTERS = 20
+# Pieces shorter than this share of chunk_size join their neighbour even if that
+# makes it longer than chunk_size by up to the same share
+_SMALL_PIECE_SHARE = 0.25
+
+
+def chunker_from_env():
+    """Returns the chunking strategy named by CHUNKER (default "legal")."""
+    strategy = os.getenv("CHUNKER", "legal").lower()
+    if strategy not in CHUNKERS:
+        raise ValueError(f"CHUNKER must be one of {', '.join(CHUNKERS)}, got {strategy!r}")
+    return strategy
+
+
+def chunker_signature(strategy=None):
+    """
+    Identifies the chunker output format; it is saved with the index so a
+    change of strategy (or of the legal parser) triggers a full rebuild.
+    """
+    strategy = strategy or chunker_from_env()
+    return f"legal-v{_LEGAL_CHUNKER_VERSION}" if strategy == "legal" else strategy
+
+
+def chunk_documents(docs, chunk_size=800, chunk_overlap=100, strategy=None):
+    """
+    Splits page Documents into chunks.
+
+    Args:
+        docs: Page Documents as returned by load_documents.
+        chunk_size (int): Maximum characters per chunk.
+        chunk_overlap (int): Overlap used when text has to be split without
+            structural boundaries.
+        strategy (str): "legal" or "recursive"; defaults to the CHUNKER env var.
+
+    Returns:
+        list[Document]: Chunks, grouped by source in input order.
+    """
+    strategy = strategy or chunker_from_env()
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         separators=["\nArticle", "\n", " "]
     )
-    return splitter.split_documents(docs)
+    if strategy == "recursive":
+        return splitter.split_documents(docs)
+
+    by_source = defaultdict(list)
+    for doc in docs:
+        by_source[doc.metadata.get("source", "")].append(doc)
+
+    chunks = []
+    for source, pages in by_source.items():
+        pages = sorted(pages, key=lambda doc: doc.metadata.get("page", 0))
+        source_chunks = _chunk_legal_document(source, pages, chunk_size, splitter)
+        if source_chunks is None:
+            print(f"No article structure found in {os.path.basename(source)}; using the recursive splitter")
+            source_chunks = splitter.split_documents(pages)
+        chunks.extend(source_chunks)
+    return chunks
+
+
+def iter_chunks(docs, chunk_size=800, chunk_overlap=100, strategy=None):
+    """
+    Chunks a stream of page Documents one source file at a time, as chunk_documents
+    would, yielding each file's chunks before reading the next file's pages.
+
+    Args:
+        docs: Page Documents grouped by source, as yielded by iter_documents.
+        chunk_size (int): Maximum characters per chunk.
+        chunk_overlap (int): Overlap used when text has to be split without
+            structural boundaries.
+        strategy (str): "legal" or "recursive"; defaults to the CHUNKER env var.
+
+    Yields:
+        Document: Chunks, grouped by source in input order.
+    """
+    strategy = strategy or chunker_from_env()
+    # Articles run across pages, so a file's pages are chunked together
+    for _, pages in groupby(docs, key=lambda doc: doc.metadata.get("source", "")):
+        yield from chunk_documents(list(pages), chunk_size, chunk_overlap, strategy)
+
+
+def ethiopic_to_int(numeral: str) -> int:
+    """Converts an Ethiopic numeral such as "፲፪" or "፪፻፲፪" to an int."""
+    total, group = 0, 0
+    for char in numeral:
+        code = ord(char)
+        if 0x1369 <= code <= 0x1371:  # ፩ .. ፱
+            group += code - 0x1368
+        elif 0x1372 <= code <= 0x137A:  # ፲ .. ፺
+            group += (code - 0x1371) * 10
+        elif code == 0x137B:  # ፻
+            total += (group or 1) * 100
+            group = 0
+        elif code == 0x137C:  # ፼
+            total = (total + group or 1) * 10000
+            group = 0
+    return total + group
+
+
+def _normalize(line: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"\d+", "#", line)).strip()
+
+
+def _line_language(line: str):
+    """"am" or "en" by the majority script of the line, or None if it has no letters."""
+    ethiopic = sum(1 for char in line if "ሀ" <= char <= "፿")
+    latin = sum(1 for char in line if char.isascii() and char.isalpha())
+    if not ethiopic and not latin:
+        return None
+    return "am" if ethiopic > latin else "en"
+
+
+def _boilerplate_lines(pages):
+    """Normalized lines that recur near the top or bottom of many pages."""
+    counts = Counter()
+    for page in pages:
+        lines = [line for line in page.page_content.splitlines() if line.strip()]
+        edges = lines[:_EDGE_LINES] + lines[-_EDGE_LINES:]
+        counts.update({_normalize(line) for line in edges})
+    threshold = max(3, _BOILERPLATE_SHARE * len(pages))
+    return {line for line, count in counts.items() if count >= threshold}
+
+
+def proclamation_from_filename(source):
+    """Returns ("1180/2020", 2020) for names like "...-No-1180_2020.pdf", or (None, None)."""
+    match = _FILENAME_PROCLAMATION_RE.search(os.path.basename(source))
+    if match:
+        return f"{match.group(1)}/{match.group(2)}", int(match.group(2))
+    return None, None
+
+
+def _find_proclamation(source, pages):
+    """Returns ("1180/2020", 2020) from the cover page or the file name, or (None, None)."""
+    for page in pages[:2]:
+        match = _PROCLAMATION_RE.search(page.page_content)
+        if match:
+            return f"{match.group(1)}/{match.group(2)}", int(match.group(2))
+    return proclamation_from_filename(source)
+
+
+class _Section:
+    """The lines of one article (or of the preamble) in one language."""
+
+    def __init__(self, language, part, article=None, title=None, heading=None):
+        self.language = language
+        self.part = part
+        self.article = article
+        self.title = title
+        self.heading = heading
+        self.lines = []  # (text, page metadata)
+
+
+def _chunk_legal_document(source, pages, chunk_size, splitter):
+    """Chunks one document by article, or returns None if it has no articles."""
+    boilerplate = _boilerplate_lines(pages)
+    proclamation, year = _find_proclamation(source, pages)
+
+    sections = []
+    current = {}  # language -> open _Section
+    last_article = {"en": 0, "am": 0}
+    part = None
+    language = "en"
+    for page in pages:
+        for line in page.page_content.splitlines():
+            if not line.strip() or _PAGE_NUMBER_RE.match(line) or _normalize(line) in boilerplate:
+                continue
+            language = _line_language(line) or language
+            part_match = _PART_RE.match(line)
+            if part_match:
+                part = re.sub(r"\s+", " ", part_match.group(1))
+            heading = (_EN_ARTICLE_RE if language == "en" else _AM_ARTICLE_RE).match(line)
+            if heading:
+                raw_number, title = heading.groups()
+                number = int(raw_number) if language == "en" else ethiopic_to_int(raw_number)
+                # Article numbers only go up; anything else is a numbered list item
+                if last_article[language] < number <= last_article[language] + 10:
+                    last_article[language] = number
+                    current[language] = _Section(language, part, number, title.strip(), line.strip())
+                    sections.append(current[language])
+            if language not in current:
+                current[language] = _Section(language, part)
+                sections.append(current[language])
+            current[language].lines.append((line.rstrip(), page.metadata))
+
+    if not any(section.article for section in sections):
+        return None
+
+    base = {
+        key: value
+        for key, value in pages[0].metadata.items()
+        if key not in ("page", "page_label")
+    }
+    if proclamation:
+        base.update(proclamation=proclamation, year=year)
+
+    chunks, seen = [], set()
+    open_chunk = {}  # language -> index of the chunk the next short article may join
+    for section in sections:
+        pieces = list(_split_section(section, chunk_size, splitter))
+        for text, first, last, sub_articles in pieces:
+            # Only whitespace is collapsed: chunks differing in an amount or a number are distinct
+            key = re.sub(r"\s+", " ", text).strip()
+            if key in seen or sum(char.isalpha() for char in text) < _MIN_CHUNK_LETTERS:
+                continue
+            seen.add(key)
+            metadata = dict(
+                base,
+                page=first.get("page"),
+                page_end=last.get("page"),
+                language=section.language,
+                chunk_type="article" if section.article else "preamble",
+            )
+            if "page_label" in first:
+                metadata["page_label"] = first["page_label"]
+            if section.part:
+                metadata["part"] = section.part
+            if section.article:
+                metadata.update(article=section.article, article_title=section.title)
+            if sub_articles:
+                metadata["sub_articles"] = sub_articles
+            # Articles shorter than a chunk join the previous one while they fit
+            joinable = section.article and len(pieces) == 1 and not sub_articles
+            previous = chunks[open_chunk[section.language]] if section.language in open_chunk else None
+            if (
+                joinable
+                and previous is not None
+                and previous.metadata.get("part") == metadata.get("part")
+                and len(previous.page_content) + 1 + len(text) <= _merge_limit(len(text), chunk_size)
+            ):
+                previous.page_content += "\n" + text
+                previous.metadata.update(page_end=metadata["page_end"], article_end=section.article)
+                continue
+            if joinable:
+                open_chunk[section.language] = len(chunks)
+            else:
+                open_chunk.pop(section.language, None)
+            chunks.append(Document(page_content=text, metadata=metadata))
+    return chunks
+
+
+def _merge_limit(length, chunk_size):
+    """How long a chunk may grow by taking in a piece of this length."""
+    return int(chunk_size * (1 + _SMALL_PIECE_SHARE)) if length < chunk_size * _SMALL_PIECE_SHARE else chunk_size
+
+
+def _split_section(section, chunk_size, splitter):
+    """
+    Yields (text, first page metadata, last page metadata, sub-article range)
+    for a section: whole if it fits, otherwise packed sub-articles that each
+    repeat the article heading, and recursive splits for oversized sub-articles.
+    """
+    lines = section.lines
+    text = "\n".join(line for line, _ in lines).strip()
+    if len(text) <= chunk_size or not section.article:
+        if len(text) <= chunk_size:
+            yield text, lines[0][1], lines[-1][1], None
+        else:
+            for piece in splitter.split_text(text):
+                yield piece, lines[0][1], lines[-1][1], None
+        return
+
+    # Group lines into the article's lead-in and its numbered sub-articles
+    sub_re = _EN_SUB_ARTICLE_RE if section.language == "en" else _AM_SUB_ARTICLE_RE
+    groups = [[None, []]]
+    for line, page in lines[1:]:
+        match = sub_re.match(line)
+        if match:
+            raw = match.group(1)
+            groups.append([int(raw) if section.language == "en" else ethiopic_to_int(raw), []])
+        groups[-1][1].append((line, page))
+    groups = [group for group in groups if group[1]]
+
+    heading = section.heading
+    budget = chunk_size - len(heading) - 1
+    packed = []  # [(sub-article numbers, lines)]
+    for number, group_lines in groups:
+        size = sum(len(line) + 1 for line, _ in group_lines)
+        if packed and sum(len(line) + 1 for line, _ in packed[-1][1]) + size <= _merge_limit(size, budget):
+            packed[-1][0].append(number)
+            packed[-1][1].extend(group_lines)
+        else:
+            packed.append(([number], list(group_lines)))
+
+    for numbers, group_lines in packed:
+        # Packs of several groups fit by construction; a single long one is split
+        fits = len(numbers) > 1
+        numbers = [number for number in numbers if number is not None]
+        sub_articles = None
+        if len(numbers) == 1:
+            sub_articles = str(numbers[0])
+        elif len(numbers) > 1 and numbers == list(range(numbers[0], numbers[-1] + 1)):
+            sub_articles = f"{numbers[0]}-{numbers[-1]}"
+        elif numbers:
+            sub_articles = ",".join(map(str, numbers))
+        body = "\n".join(line for line, _ in group_lines).strip()
+        first, last = group_lines[0][1], group_lines[-1][1]
+        if fits or len(body) <= budget:
+            yield f"{heading}\n{body}", first, last, sub_articles
+        else:
+            for piece in splitter.split_text(body):
+                yield f"{heading}\n{piece}", first, last, sub_articles
@@ -0,0 +1,293 @@
+"""
+Token-aware context packing: turns the reranked chunks into the {context} part
+of the prompt without letting it grow past a token budget.
+
+  1. Tokens are counted with a local HuggingFace tokenizer (CONTEXT_TOKENIZER;
+     by default the embedding model's, which is already in the local cache).
+     If it cannot be loaded, a character-based estimate is used instead.
+  2. Text repeated between chunks is dropped: the chunk_overlap window at the
+     start of a chunk that continues an earlier one, and any sentence that
+     was already included.
+  3. If the chunks still exceed the budget, sentences are ranked by how many
+     question terms they contain (rarer terms weigh more) and by the rank of
+     their chunk, and the best ones are kept in their original order.
+
+Prompt sizes are recorded per request in the rag_prompt_tokens histogram.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from helpers.lexical import tokenize
+from helpers.metrics import REGISTRY
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+DEFAULT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "sentence-transformers/all-MiniLM-L6-v2")
+
+NO_CONTEXT = "No relevant context found."
+
+# Sentence ends (including the Ethiopic full stop, but not "No." or "5."), and
+# line breaks before a sub-article or list item; other PDF line breaks are wraps
+_SENTENCE_RE = re.compile(
+    r"((?<=[.!?;።])(?<!No\.)(?<!Art\.)(?<![0-9]\.)\s+"
+    r"|\s*\n\s*(?=(?:[0-9]{1,3}|[፩-፼]{1,3})\s*/|\(?[a-zA-Z]\)|Article\s|PART\s))"
+)
+_ETHIOPIC_RE = re.compile(r"[ሀ-᎟]")
+# Shortest repeated prefix / sentence worth removing (headings stay)
+_MIN_OVERLAP_CHARS = 30
+# Later chunks need proportionally more matching terms to win a sentence slot
+_RANK_DECAY = 0.15
+_GAP = " … "
+
+PROMPT_TOKENS = REGISTRY.histogram(
+    "rag_prompt_tokens",
+    "Tokens in each prompt sent to the LLM (template, context and question).",
+    buckets=(256, 512, 1024, 1536, 2048, 3072, 4096, 6144, 8192, 16384),
+)
+CONTEXT_TOKENS = REGISTRY.counter(
+    "rag_context_tokens_total",
+    "Context tokens before (retrieved) and after (packed) deduplication and trimming.",
+    labels=("kind",),
+)
+
+
+class TokenCounter:
+    """
+    Counts tokens with a HuggingFace `tokenizers` tokenizer loaded from a local
+    tokenizer.json or the local model cache (it is never downloaded), falling
+    back to an estimate of one token per 4 characters (one per character for
+    Ethiopic script).
+
+    Args:
+        name (str): tokenizer.json path or model name on the HuggingFace Hub.
+    """
+
+    def __init__(self, name: str = DEFAULT_TOKENIZER):
+        self.name = name
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if not self._loaded:
+                try:
+                    from tokenizers import Tokenizer
+
+                    if os.path.isfile(self.name):
+                        path = self.name
+                    else:
+                        from huggingface_hub import hf_hub_download
+
+                        # Never downloads: a tokenizer missing from the cache means the estimate
+                        path = hf_hub_download(self.name, "tokenizer.json", local_files_only=True)
+                    tokenizer = Tokenizer.from_file(path)
+                    tokenizer.no_truncation()
+                    tokenizer.no_padding()
+                    self._tokenizer = tokenizer
+                except Exception as e:
+                    print(f"Could not load tokenizer {self.name} ({e}); estimating token counts")
+                self._loaded = True
+        return self._tokenizer
+
+    @property
+    def exact(self) -> bool:
+        """True if counts come from a real tokenizer rather than the estimate."""
+        return self._load() is not None
+
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        tokenizer = self._load()
+        if tokenizer is None:
+            return [_estimate_tokens(text) for text in texts]
+        return [len(encoding.ids) for encoding in tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+
+def _estimate_tokens(text: str) -> int:
+    ethiopic = len(_ETHIOPIC_RE.findall(text))
+    return ethiopic + math.ceil((len(text) - ethiopic) / 4)
+
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(name: str = DEFAULT_TOKENIZER) -> TokenCounter:
+    """Returns the process-wide TokenCounter for a tokenizer."""
+    with _counters_lock:
+        if name not in _counters:
+            _counters[name] = TokenCounter(name)
+        return _counters[name]
+
+
+def _strip_overlap(text: str, earlier: List[str]) -> str:
+    """Removes the longest prefix of text that also appears in an earlier chunk of the same source."""
+    if not earlier or len(text) < _MIN_OVERLAP_CHARS:
+        return text
+
+    def repeated(length):
+        prefix = text[:length]
+        return any(prefix in other for other in earlier)
+
+    if not repeated(_MIN_OVERLAP_CHARS):
+        return text
+    # A prefix that repeats means every shorter one does too, so binary search the longest
+    low, high = _MIN_OVERLAP_CHARS, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if repeated(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return text[low:].lstrip()
+
+
+def _split_sentences(text: str) -> List[Tuple[str, str]]:
+    """(separator before, sentence) pairs; the separator is "\\n" or " "."""
+    pieces = _SENTENCE_RE.split(text)
+    sentences = []
+    separator = ""
+    for i, piece in enumerate(pieces):
+        if i % 2:
+            separator = "\n" if "\n" in piece else " "
+        elif piece.strip():
+            sentences.append((separator or "\n", piece.strip()))
+            separator = ""
+    return sentences
+
+
+def _dedupe(docs: list):
+    """
+    Each chunk's sentences with cross-chunk repeats removed (chunks keep their
+    order), whether each chunk's first sentence is its article heading, and
+    the removed text (so the retrieved size is counted in the same batch).
+    """
+    by_source = {}
+    seen = set()
+    chunks, headed, dropped = [], [], []
+    for doc in docs:
+        source = doc.metadata.get("source")
+        full = doc.page_content.strip()
+        text = _strip_overlap(full, by_source.get(source, []))
+        if len(text) < len(full):
+            dropped.append(full[:len(full) - len(text)])
+        by_source.setdefault(source, []).append(doc.page_content)
+        pieces = _split_sentences(text)
+        # Legal chunks start with their article heading line (see helpers/chunker.py)
+        is_headed = doc.metadata.get("chunk_type") == "article" and text == doc.page_content.strip()
+        if is_headed:
+            heading, _, rest = text.partition("\n")
+            pieces = [("\n", heading.strip())] + _split_sentences(rest)
+        headed.append(is_headed)
+        sentences = []
+        for position, (separator, sentence) in enumerate(pieces):
+            key = " ".join(sentence.lower().split())
+            # Headings stay even when repeated: they label the text that follows
+            if len(key) >= _MIN_OVERLAP_CHARS and not (position == 0 and is_headed):
+                if key in seen:
+                    dropped.append(sentence)
+                    continue
+                seen.add(key)
+            sentences.append((separator, sentence))
+        chunks.append(sentences)
+    return chunks, headed, dropped
+
+
+def _select_sentences(question: str, chunks: list, lengths: List[List[int]], headed: List[bool], budget: int):
+    """
+    Picks sentences to keep, most relevant first, until the budget is used up.
+    Article headings (the first line of a chunk in `headed`) go first so the
+    answer can still cite them.
+    """
+    query_terms = set(tokenize(question))
+    sentence_terms = [[set(tokenize(sentence)) for _, sentence in sentences] for sentences in chunks]
+    # Rarer question terms (within this context) weigh more
+    frequency = Counter(term for terms in sentence_terms for sentence in terms for term in sentence & query_terms)
+    total = sum(len(sentences) for sentences in chunks) or 1
+    weights = {term: math.log(1 + total / count) for term, count in frequency.items()}
+
+    candidates = []
+    for rank, terms_per_sentence in enumerate(sentence_terms):
+        for position, terms in enumerate(terms_per_sentence):
+            if position == 0 and headed[rank]:
+                score = math.inf
+            else:
+                score = sum(weights.get(term, 0.0) for term in terms & query_terms) / (1 + _RANK_DECAY * rank)
+            candidates.append((-score, rank, position))
+    candidates.sort()
+
+    keep = set()
+    remaining = budget
+    for _, rank, position in candidates:
+        cost = lengths[rank][position] + 1
+        if cost <= remaining:
+            keep.add((rank, position))
+            remaining -= cost
+    return keep
+
+
+def pack_context(
+    docs: list,
+    question: str = "",
+    budget: Optional[int] = None,
+    counter: Optional[TokenCounter] = None,
+) -> str:
+    """
+    Joins reranked chunks into prompt context that fits in a token budget.
+
+    Args:
+        docs (list): Reranked documents, best first.
+        question (str): The question; used to pick sentences when trimming.
+        budget (int): Maximum context tokens. Defaults to CONTEXT_TOKEN_BUDGET;
+            0 or less only deduplicates.
+        counter (TokenCounter): Tokenizer to count with. Defaults to CONTEXT_TOKENIZER.
+
+    Returns:
+        str: The packed context.
+    """
+    if not docs:
+        return NO_CONTEXT
+    budget = DEFAULT_TOKEN_BUDGET if budget is None else budget
+    counter = counter or get_token_counter()
+
+    chunks, headed, dropped = _dedupe(docs)
+    flat = [sentence for sentences in chunks for _, sentence in sentences]
+    # One tokenizer pass: the kept sentences plus the removed repeats make up the retrieved text
+    all_lengths = counter.count_many(flat + dropped) if flat or dropped else []
+    flat_lengths = all_lengths[:len(flat)]
+    lengths, offset = [], 0
+    for sentences in chunks:
+        lengths.append(flat_lengths[offset:offset + len(sentences)])
+        offset += len(sentences)
+    CONTEXT_TOKENS.inc(sum(all_lengths), kind="retrieved")
+
+    if budget > 0 and sum(flat_lengths) + len(flat) > budget:
+        keep = _select_sentences(question, chunks, lengths, headed, budget)
+    else:
+        keep = {(rank, position) for rank, sentences in enumerate(chunks) for position in range(len(sentences))}
+
+    parts = []
+    for rank, sentences in enumerate(chunks):
+        kept = [position for position in range(len(sentences)) if (rank, position) in keep]
+        if not kept:
+            continue
+        text = sentences[kept[0]][1]
+        for previous, position in zip(kept, kept[1:]):
+            separator, sentence = sentences[position]
+            text += (separator if position == previous + 1 else _GAP) + sentence
+        parts.append(text)
+
+    context = "\n\n".join(parts) if parts else NO_CONTEXT
+    CONTEXT_TOKENS.inc(sum(lengths[rank][position] for rank, position in keep), kind="packed")
+    return context
+
+
+def record_prompt_tokens(prompt_value, counter: Optional[TokenCounter] = None):
+    """Records the size of a rendered prompt and passes it through unchanged (for use in a chain)."""
+    PROMPT_TOKENS.observe((counter or get_token_counter()).count(prompt_value.to_string()))
+    return prompt_value
@@ -0,0 +1,208 @@
+"""
+Per-session conversation history for the API.
+
+Each session keeps its last max_turns question/answer pairs in a bounded deque,
+so adding a turn drops the oldest one in O(1). Sessions are kept in order of
+last activity: idle sessions older than the TTL are evicted from the front of
+that order, and beyond max_sessions the least recently active one goes, so
+memory stays bounded however many users there are.
+
+With a SQLite path, every turn is also written to disk. Memory then only holds
+the active sessions; an evicted session is read back from SQLite when its user
+returns, and idle sessions are purged from the file on the same TTL. Several
+worker processes can share the file: a session held in memory is checked
+against its row on each access and re-read if another process added to it.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+DEFAULT_CONVERSATIONS_PATH = "./startup_db/conversations.sqlite"
+DEFAULT_SESSION = "default"
+
+# Seconds between purges of expired sessions from the SQLite file
+_PURGE_INTERVAL = 60
+
+
+class _Session:
+    __slots__ = ("turns", "last_active", "next_seq")
+
+    def __init__(self, max_turns: int, last_active: float, next_seq: int = 0):
+        self.turns = deque(maxlen=max_turns)
+        self.last_active = last_active
+        self.next_seq = next_seq
+
+
+class ConversationStore:
+    """
+    Args:
+        max_turns (int): Question/answer pairs kept per session.
+        ttl_seconds (float): Idle time after which a session is forgotten; 0 disables expiry.
+        max_sessions (int): Sessions held in memory before the least recently active is evicted.
+        path (str): SQLite file for persistence, or None for memory only.
+    """
+
+    def __init__(self, max_turns=10, ttl_seconds=86400, max_sessions=10000, path=None):
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.stats = {"expired": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        # session_id -> _Session, least recently active first
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._db = None
+        self._last_purge = 0.0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, last_active REAL, next_seq INTEGER)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "session_id TEXT, seq INTEGER, question TEXT, answer TEXT, timestamp TEXT, "
+                "PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+            )
+            self._db.commit()
+
+    def _expire(self, now: float):
+        """Drops sessions idle for longer than the TTL (oldest first, so this stops early)."""
+        if not self.ttl_seconds:
+            return
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_active <= self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.stats["expired"] += 1
+        if self._db is not None and now - self._last_purge > _PURGE_INTERVAL:
+            cutoff = now - self.ttl_seconds
+            self._db.execute(
+                "DELETE FROM turns WHERE session_id IN (SELECT session_id FROM sessions WHERE last_active < ?)",
+                (cutoff,),
+            )
+            self._db.execute("DELETE FROM sessions WHERE last_active < ?", (cutoff,))
+            self._db.commit()
+            self._last_purge = now
+
+    def _load(self, session_id: str, now: float) -> Optional[_Session]:
+        """Reads a session back from SQLite, or returns None if it is unknown or expired."""
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT last_active, next_seq FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if self.ttl_seconds and now - row[0] > self.ttl_seconds:
+            # Expired but not purged yet; start the session afresh
+            self._db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._db.commit()
+            return None
+        session = _Session(self.max_turns, row[0], row[1])
+        rows = self._db.execute(
+            "SELECT question, answer, timestamp FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, self.max_turns),
+        ).fetchall()
+        for question, answer, timestamp in reversed(rows):
+            session.turns.append({"question": question, "answer": answer, "timestamp": timestamp})
+        return session
+
+    def _is_current(self, session_id: str, session: _Session) -> bool:
+        """False if another process changed or deleted the session since it was read."""
+        if self._db is None:
+            return True
+        row = self._db.execute("SELECT next_seq FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None and row[0] == session.next_seq
+
+    def _get(self, session_id: str, now: float, create: bool) -> Optional[_Session]:
+        self._expire(now)
+        session = self._sessions.get(session_id)
+        if session is not None and self.ttl_seconds and now - session.last_active > self.ttl_seconds:
+            del self._sessions[session_id]
+            session = None
+            self.stats["expired"] += 1
+        if session is not None and session.next_seq and not self._is_current(session_id, session):
+            del self._sessions[session_id]
+            session = None
+        if session is None:
+            session = self._load(session_id, now)
+            if session is None and not create:
+                return None
+            session = session or _Session(self.max_turns, now)
+            self._sessions[session_id] = session
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats["evicted"] += 1
+        return session
+
+    def add(self, session_id: str, question: str, answer: str) -> dict:
+        """Appends a question/answer pair to a session, dropping its oldest turn beyond max_turns."""
+        now = time.time()
+        turn = {"question": question, "answer": answer, "timestamp": str(datetime.now())}
+        with self._lock:
+            session = self._get(session_id, now, create=True)
+            session.turns.append(turn)
+            session.last_active = now
+            self._sessions.move_to_end(session_id)
+            seq = session.next_seq
+            session.next_seq += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session_id, now, session.next_seq)
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO turns VALUES (?, ?, ?, ?, ?)",
+                    (session_id, seq, question, answer, turn["timestamp"]),
+                )
+                self._db.execute(
+                    "DELETE FROM turns WHERE session_id = ? AND seq <= ?", (session_id, seq - self.max_turns)
+                )
+                self._db.commit()
+        return turn
+
+    def history(self, session_id: str, offset: int = 0, limit: int = 20) -> Tuple[List[dict], int]:
+        """
+        Returns one page of a session's turns, oldest first, and the session's total turn count.
+
+        Args:
+            session_id (str): The session.
+            offset (int): Turns to skip from the oldest one kept.
+            limit (int): Maximum turns returned.
+        """
+        with self._lock:
+            session = self._get(session_id, time.time(), create=False)
+            if session is None:
+                return [], 0
+            turns = list(session.turns)
+        return turns[offset:offset + limit], len(turns)
+
+    def clear(self, session_id: str):
+        """Forgets one session."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+                self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self._db.commit()
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def conversation_store_from_env(path=DEFAULT_CONVERSATIONS_PATH) -> ConversationStore:
+    """Creates a ConversationStore tuned by CONVERSATION_* environment variables."""
+    return ConversationStore(
+        max_turns=int(os.getenv("CONVERSATION_TURNS", "10")),
+        ttl_seconds=float(os.getenv("CONVERSATION_TTL", "86400")),
+        max_sessions=int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000")),
+        path=os.getenv("CONVERSATION_PATH", path) or None,
+    )
@@ -0,0 +1,262 @@
+"""
+SQLite-backed docstore for the FAISS vectorstore.
+
+Chunk texts and metadata live in an indexed SQLite file and are fetched lazily
+by ID, so loading an index no longer unpickles every chunk into memory and
+several processes share the file through the OS page cache. The table of FAISS
+positions -> chunk IDs is stored alongside, replacing the pickled mapping.
+
+Every chunk written also gets a row of the fields BM25 and the metadata filters
+need (term count, source, proclamation, year, article range) and its BM25 postings,
+so neither the lexical index nor the filters read chunk texts when an index is
+loaded.
+
+Writes made through add()/delete() are buffered and applied in one transaction
+by commit(), together with the position table, when the index is saved.
+"""
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+# SQLite limits the number of bound parameters per statement
+_FETCH_BATCH = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS positions (position INTEGER PRIMARY KEY, id TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS fields (id TEXT PRIMARY KEY, length INTEGER NOT NULL, source TEXT NOT NULL, "
+    "proclamation TEXT, year INTEGER, article INTEGER, article_end INTEGER)",
+    # Clustered by term, so a query term's postings are one range read
+    "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL, "
+    "PRIMARY KEY (term, id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS postings_id ON postings (id)",
+)
+
+# (source, proclamation, year, article, last article) of a chunk without metadata
+NO_FIELDS = ("", None, None, None, None)
+
+
+def _to_document(id_: str, text: str, metadata: str) -> Document:
+    return Document(id=id_, page_content=text, metadata=json.loads(metadata))
+
+
+def _chunk_rows(docs: Dict[str, Document]):
+    return [
+        (id_, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False, default=str))
+        for id_, doc in docs.items()
+    ]
+
+
+def filter_fields(metadata: dict) -> Tuple:
+    """The (source, proclamation, year, article, last article) of a chunk that metadata filters use."""
+    article = metadata.get("article")
+    return (
+        metadata.get("source", ""),
+        metadata.get("proclamation"),
+        metadata.get("year"),
+        article,
+        metadata.get("article_end", article),
+    )
+
+
+def _insert_chunks(conn: sqlite3.Connection, docs: Dict[str, Document]):
+    """Writes chunks with their fields and BM25 postings."""
+    from helpers.lexical import tokenize  # helpers.lexical imports this module
+
+    fields, postings = [], []
+    for id_, doc in docs.items():
+        terms = Counter(tokenize(doc.page_content))
+        fields.append((id_, sum(terms.values())) + filter_fields(doc.metadata))
+        postings.extend((term, id_, tf) for term, tf in terms.items())
+    conn.executemany("INSERT INTO chunks VALUES (?, ?, ?)", _chunk_rows(docs))
+    conn.executemany("INSERT INTO fields VALUES (?, ?, ?, ?, ?, ?, ?)", fields)
+    conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", postings)
+
+
+def _delete_chunks(conn: sqlite3.Connection, ids: Iterable[str]):
+    ids = [(id_,) for id_ in ids]
+    for table in ("chunks", "fields", "postings"):
+        conn.executemany(f"DELETE FROM {table} WHERE id = ?", ids)
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Args:
+        path (str): SQLite file holding the chunks (see SQLiteDocstore.create).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._pending_add: Dict[str, Document] = {}
+        self._pending_delete = set()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread: readers never wait on each other. A worker
+        # forked after the index was loaded opens its own instead of the parent's.
+        # Read-only, so a version directory deleted under a worker raises instead
+        # of silently becoming an empty docstore.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            uri = Path(self.path).absolute().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @classmethod
+    def create(cls, path: str, docs: Dict[str, Document], positions: Dict[int, str]) -> "SQLiteDocstore":
+        """Writes a fresh docstore file (atomically replacing any old one) and opens it."""
+        writer = DocstoreWriter(path)
+        try:
+            writer.add(docs)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close(positions)
+
+    def search(self, search: str):
+        """Returns the Document for an ID, or a "not found" string like InMemoryDocstore."""
+        doc = self.mget([search])[0]
+        return doc if doc is not None else f"ID {search} not found."
+
+    def mget(self, ids: Iterable[str]) -> List[Optional[Document]]:
+        """Fetches many chunks in a few queries; missing IDs come back as None."""
+        ids = list(ids)
+        found: Dict[str, Document] = {}
+        stored = []
+        for id_ in ids:
+            if id_ in self._pending_add:
+                found[id_] = self._pending_add[id_]
+            elif id_ not in self._pending_delete:
+                stored.append(id_)
+        conn = self._conn()
+        for start in range(0, len(stored), _FETCH_BATCH):
+            batch = stored[start:start + _FETCH_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})", batch
+            ).fetchall()
+            for row in rows:
+                found[row[0]] = _to_document(*row)
+        return [found.get(id_) for id_ in ids]
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Buffers new chunks until the next commit()."""
+        for id_, doc in texts.items():
+            self._pending_delete.discard(id_)
+            self._pending_add[id_] = doc
+
+    def delete(self, ids: List) -> None:
+        """Buffers chunk removals until the next commit()."""
+        for id_ in ids:
+            self._pending_add.pop(id_, None)
+            self._pending_delete.add(id_)
+
+    def commit(self, positions: Dict[int, str]):
+        """Applies buffered changes and the new position table in one transaction."""
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                # Replaced chunks lose their old postings too
+                _delete_chunks(conn, self._pending_delete | self._pending_add.keys())
+                _insert_chunks(conn, self._pending_add)
+                conn.execute("DELETE FROM positions")
+                conn.executemany("INSERT INTO positions VALUES (?, ?)", positions.items())
+        finally:
+            conn.close()
+        self._pending_add.clear()
+        self._pending_delete.clear()
+
+    def positions(self) -> Dict[int, str]:
+        """Returns the saved FAISS position -> chunk ID mapping."""
+        return dict(self._conn().execute("SELECT position, id FROM positions ORDER BY position"))
+
+    def fields(self) -> Dict[str, Tuple]:
+        """{chunk ID: (source, proclamation, year, article, last article)} for every chunk, pending changes included."""
+        fields = {
+            row[0]: row[1:]
+            for row in self._conn().execute("SELECT id, source, proclamation, year, article, article_end FROM fields")
+        }
+        for id_ in self._pending_delete:
+            fields.pop(id_, None)
+        for id_, doc in self._pending_add.items():
+            fields[id_] = filter_fields(doc.metadata)
+        return fields
+
+    def postings(self, term: str) -> List[Tuple[str, int, int]]:
+        """(chunk ID, term frequency, chunk length in terms) of the committed chunks containing a term."""
+        return self._conn().execute(
+            "SELECT p.id, p.tf, f.length FROM postings p JOIN fields f ON f.id = p.id WHERE p.term = ?", (term,)
+        ).fetchall()
+
+    def term_stats(self) -> Tuple[int, int]:
+        """(chunk count, total chunk length in terms) of the committed chunks."""
+        count, total = self._conn().execute("SELECT count(*), total(length) FROM fields").fetchone()
+        return count, int(total)
+
+    def copy(self) -> "SQLiteDocstore":
+        """A docstore over the same file with its own copy of the pending changes."""
+        clone = SQLiteDocstore(self.path)
+        clone._pending_add = dict(self._pending_add)
+        clone._pending_delete = set(self._pending_delete)
+        return clone
+
+
+class DocstoreWriter:
+    """
+    Writes a fresh docstore file batch by batch, so a build that streams its
+    chunks never holds them all. The file replaces any old one on close().
+
+    Args:
+        path (str): Docstore file to create.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp_path = path + ".tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._conn = sqlite3.connect(self._tmp_path)
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    def add(self, docs: Dict[str, Document]):
+        """Writes a batch of chunks."""
+        _insert_chunks(self._conn, docs)
+        self._conn.commit()
+
+    def close(self, positions: Optional[Dict[int, str]] = None) -> SQLiteDocstore:
+        """Writes the position table (unless it is committed later), moves the file into place and opens it."""
+        try:
+            if positions:
+                self._conn.executemany("INSERT INTO positions VALUES (?, ?)", positions.items())
+            self._conn.commit()
+        finally:
+            self._conn.close()
+        os.replace(self._tmp_path, self.path)
+        return SQLiteDocstore(self.path)
+
+    def abort(self):
+        """Discards the partly written file."""
+        self._conn.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def get_documents(docstore, ids: Iterable[str]) -> List[Document]:
+    """Fetches the Documents for chunk IDs in order, skipping IDs that are gone."""
+    ids = list(ids)
+    if hasattr(docstore, "mget"):
+        docs = docstore.mget(ids)
+    else:
+        docs = [docstore.search(id_) for id_ in ids]
+    return [doc for doc in docs if isinstance(doc, Document)]
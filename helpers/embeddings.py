@@ -0,0 +1,236 @@
+"""
+Shared, batched and cached embedding service used by both indexing and querying.
+
+Chunk embeddings are persisted in an append-only float32 matrix that is read back
+through a memory map, keyed by the SHA-1 of the model name and text, and shared
+by all worker processes. Query embeddings go through an in-process LRU cache.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from helpers.filelock import file_lock
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_CACHE_DIR = "./startup_db/embedding_cache"
+DEFAULT_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+DEFAULT_NUM_THREADS = int(os.getenv("EMBEDDING_THREADS", "0")) or None
+DEFAULT_QUERY_CACHE_SIZE = 1024
+
+
+class _VectorCache:
+    """
+    Append-only on-disk store: vectors.f32 holds rows of float32, keys.txt holds
+    one text hash per row. Reads go through np.memmap, so the matrix is shared
+    via the page cache rather than loaded into each process.
+
+    Several processes can share one cache: appends are serialized with a file
+    lock, and rows appended by other processes are picked up when a key misses.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self._keys_path = os.path.join(cache_dir, "keys.txt")
+        self._meta_path = os.path.join(cache_dir, "meta.json")
+        self._lock_path = os.path.join(cache_dir, "lock")
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._n_rows = 0
+        self._keys_size = 0  # bytes of keys.txt read so far
+        self._dim: Optional[int] = None
+        self._matrix: Optional[np.memmap] = None
+        self._refresh()
+
+    def _refresh(self):
+        """Reads keys appended since the last call (by this or another process)."""
+        if self._dim is None:
+            if not os.path.exists(self._meta_path):
+                return
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                self._dim = json.load(f)["dim"]
+        if not os.path.exists(self._keys_path) or os.path.getsize(self._keys_path) == self._keys_size:
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._keys_size)
+            data = f.read()
+        # Only whole lines; rows are written before keys, so every whole key has its row
+        n_rows = os.path.getsize(self._vectors_path) // (4 * self._dim)
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n") or self._n_rows >= n_rows:
+                break
+            self._rows.setdefault(line.decode("utf-8").strip(), self._n_rows)
+            self._n_rows += 1
+            self._keys_size += len(line)
+        self._remap()
+
+    def _remap(self):
+        self._matrix = (
+            np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._n_rows, self._dim))
+            if self._n_rows else None
+        )
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Returns {key: vector} for the keys present in the cache."""
+        with self._lock:
+            if any(key not in self._rows for key in keys):
+                self._refresh()
+            hits = {key: self._rows[key] for key in keys if key in self._rows}
+            matrix = self._matrix
+        if not hits:
+            return {}
+        return {key: np.array(matrix[row]) for key, row in hits.items()}
+
+    def put(self, keys: List[str], vectors: np.ndarray):
+        """Appends new vectors to the cache; keys already present are skipped."""
+        with self._lock, file_lock(self._lock_path):
+            self._refresh()
+            fresh = [(k, v) for k, v in zip(keys, vectors) if k not in self._rows]
+            if not fresh:
+                return
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if self._dim is None:
+                self._dim = int(vectors.shape[1])
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self._dim}, f)
+            block = np.asarray([v for _, v in fresh], dtype=np.float32)
+            # Drop whatever an interrupted append left after the last complete row and key
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(self._n_rows * 4 * self._dim)
+                f.write(block.tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.truncate(self._keys_size)
+            with open(self._keys_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{k}\n" for k, _ in fresh))
+            self._refresh()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper around HuggingFaceEmbeddings that batches
+    encoding, caps torch threads and caches both chunk and query vectors.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        num_threads: Optional[int] = DEFAULT_NUM_THREADS,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        query_cache_size: int = DEFAULT_QUERY_CACHE_SIZE,
+        device: str = "cpu",
+    ):
+        if num_threads:
+            try:
+                import torch
+                torch.set_num_threads(num_threads)
+            except ImportError:
+                pass
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={'device': device},
+            encode_kwargs={'batch_size': batch_size},
+        )
+        self._cache = _VectorCache(os.path.join(cache_dir, _slug(model_name))) if cache_dir else None
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_cache_size = query_cache_size
+        self._query_lock = threading.Lock()
+        self.stats = {"doc_hits": 0, "doc_misses": 0, "query_hits": 0, "query_misses": 0}
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\x1f{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeds texts, computing only those missing from the on-disk cache."""
+        if not texts:
+            return []
+        keys = [self._key(text) for text in texts]
+        cached = self._cache.get(keys) if self._cache is not None else {}
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        self.stats["doc_hits"] += len(texts) - len(missing)
+        self.stats["doc_misses"] += len(missing)
+
+        if missing:
+            missing_keys = list(missing)
+            vectors = np.asarray(self._model.embed_documents(list(missing.values())), dtype=np.float32)
+            if self._cache is not None:
+                self._cache.put(missing_keys, vectors)
+            cached.update(zip(missing_keys, vectors))
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embeds many queries in one batch, filling and reusing the query LRU cache."""
+        with self._query_lock:
+            known = {text: self._query_cache[text] for text in texts if text in self._query_cache}
+        missing = list(dict.fromkeys(text for text in texts if text not in known))
+        if missing:
+            vectors = self._model.embed_documents(missing)
+            with self._query_lock:
+                for text, vector in zip(missing, vectors):
+                    self._query_cache[text] = vector
+                    known[text] = vector
+                while len(self._query_cache) > self._query_cache_size:
+                    self._query_cache.popitem(last=False)
+        with self._query_lock:
+            self.stats["query_hits"] += len(texts) - len(missing)
+            self.stats["query_misses"] += len(missing)
+        return [list(known[text]) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embeds a query through an LRU cache."""
+        with self._query_lock:
+            vector = self._query_cache.get(text)
+            if vector is not None:
+                self._query_cache.move_to_end(text)
+                self.stats["query_hits"] += 1
+                return list(vector)
+        vector = self._model.embed_query(text)
+        with self._query_lock:
+            self.stats["query_misses"] += 1
+            self._query_cache[text] = vector
+            if len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return list(vector)
+
+
+def _slug(model_name: str) -> str:
+    return model_name.replace("/", "__")
+
+
+_instances: Dict[tuple, CachedEmbeddings] = {}
+_instances_lock = threading.Lock()
+
+
+def get_embeddings(model_name: str = DEFAULT_MODEL, **kwargs) -> CachedEmbeddings:
+    """
+    Returns the process-wide CachedEmbeddings for a model, creating it on first use.
+
+    Args:
+        model_name (str): Sentence-transformers model name.
+        **kwargs: batch_size, num_threads, cache_dir, query_cache_size, device.
+
+    Returns:
+        CachedEmbeddings: Shared embedding service.
+    """
+    key = (model_name, tuple(sorted(kwargs.items())))
+    with _instances_lock:
+        if key not in _instances:
+            _instances[key] = CachedEmbeddings(model_name=model_name, **kwargs)
+        return _instances[key]
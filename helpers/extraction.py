@@ -0,0 +1,283 @@
+"""
+Page text extraction for PDFs: a native text-layer backend, an optional local
+OCR fallback for pages that come back (nearly) empty, and a per-page cache.
+
+    PDF_TEXT_BACKEND   "pypdf" (default) or "pymupdf" (faster; `pip install pymupdf`)
+    OCR_BACKEND        "none" (default) or "tesseract" (`pip install pymupdf pytesseract`
+                       plus the tesseract binary with the OCR_LANGUAGES data)
+
+Only pages whose native text has fewer than OCR_MIN_CHARS letters are OCRed
+(scanned pages, pages with broken font encodings), and the OCR text replaces
+the native text only if it has more letters.
+
+Extracted pages are cached in a SQLite file keyed by (file SHA-256, page), so a
+page is extracted once. A cached page with too little text is extracted again
+only if OCR has been enabled since. Pages and seconds per backend are counted
+in rag_pdf_pages_total and rag_pdf_extraction_seconds_total.
+
+throughput() reports pages per wall-clock second for a whole run, which is what
+the parser pool achieves; per backend it only reports pages and the seconds
+spent, summed over the parser processes.
+"""
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from helpers.metrics import REGISTRY
+
+TEXT_BACKENDS = ("pypdf", "pymupdf")
+OCR_BACKENDS = ("none", "tesseract")
+
+DEFAULT_TEXT_BACKEND = os.getenv("PDF_TEXT_BACKEND", "pypdf").lower()
+DEFAULT_OCR_BACKEND = os.getenv("OCR_BACKEND", "none").lower()
+DEFAULT_OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "50"))
+# The proclamations are bilingual
+DEFAULT_OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "amh+eng")
+DEFAULT_OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+
+# Served from the page cache rather than extracted
+CACHE_BACKEND = "cache"
+
+PAGES_EXTRACTED = REGISTRY.counter(
+    "rag_pdf_pages_total",
+    "PDF pages extracted, by the backend whose text was kept (pypdf, pymupdf, tesseract, or cache).",
+    labels=("backend",),
+)
+EXTRACTION_SECONDS = REGISTRY.counter(
+    "rag_pdf_extraction_seconds_total",
+    "Seconds spent extracting PDF pages, by backend, summed over parser processes.",
+    labels=("backend",),
+)
+
+
+def letter_count(text: str) -> int:
+    """Letters (any script) in a text; replacement and control characters do not count."""
+    return sum(char.isalpha() for char in text)
+
+
+def _import_pymupdf():
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf  # releases before 1.24
+    return pymupdf
+
+
+class ExtractedPage(NamedTuple):
+    page: int
+    text: str
+    backend: str  # backend whose text was kept
+    ocr: str  # OCR backend that was tried on the page, "" if none
+    seconds: Dict[str, float]  # time spent per backend
+
+
+class PageExtractor:
+    """
+    Extracts page text with a native backend and, optionally, OCR. Instances are
+    sent to the parser processes, so they only hold settings.
+
+    Args:
+        text_backend (str): "pypdf" or "pymupdf".
+        ocr_backend (str): "none" or "tesseract".
+        min_chars (int): Pages with fewer letters than this are OCRed.
+        languages (str): Tesseract language codes, e.g. "amh+eng".
+        dpi (int): Resolution pages are rendered at for OCR.
+    """
+
+    def __init__(
+        self,
+        text_backend: str = "pypdf",
+        ocr_backend: str = "none",
+        min_chars: int = DEFAULT_OCR_MIN_CHARS,
+        languages: str = DEFAULT_OCR_LANGUAGES,
+        dpi: int = DEFAULT_OCR_DPI,
+    ):
+        self.text_backend = text_backend
+        self.ocr_backend = ocr_backend
+        self.min_chars = min_chars
+        self.languages = languages
+        self.dpi = dpi
+
+    def needs_ocr(self, letters: int) -> bool:
+        return self.ocr_backend != "none" and letters < self.min_chars
+
+    def is_final(self, ocr: str, letters: int) -> bool:
+        """Whether a cached page can be reused as is under the current settings."""
+        return not self.needs_ocr(letters) or ocr == self.ocr_backend
+
+    def page_count(self, source: str) -> int:
+        if self.text_backend == "pymupdf":
+            with _import_pymupdf().open(source) as doc:
+                return doc.page_count
+        from pypdf import PdfReader
+
+        return len(PdfReader(source).pages)
+
+    def extract(self, source: str, pages: List[int]) -> List[ExtractedPage]:
+        """Extracts the given pages of one PDF, OCRing those with too little text."""
+        pymupdf_doc = None
+        if self.text_backend == "pymupdf" or self.ocr_backend != "none":
+            pymupdf_doc = _import_pymupdf().open(source)
+        reader = None
+        if self.text_backend == "pypdf":
+            from pypdf import PdfReader
+
+            reader = PdfReader(source)
+        try:
+            results = []
+            for page in pages:
+                start = time.perf_counter()
+                if reader is not None:
+                    text = reader.pages[page].extract_text() or ""
+                else:
+                    text = pymupdf_doc[page].get_text()
+                seconds = {self.text_backend: time.perf_counter() - start}
+                backend, ocr = self.text_backend, ""
+                if self.needs_ocr(letter_count(text)):
+                    start = time.perf_counter()
+                    ocr_text = self._ocr(pymupdf_doc[page])
+                    seconds[self.ocr_backend] = time.perf_counter() - start
+                    ocr = self.ocr_backend
+                    if letter_count(ocr_text) > letter_count(text):
+                        text, backend = ocr_text, self.ocr_backend
+                results.append(ExtractedPage(page, text, backend, ocr, seconds))
+            return results
+        finally:
+            if pymupdf_doc is not None:
+                pymupdf_doc.close()
+
+    def _ocr(self, pdf_page) -> str:
+        import pytesseract
+        from PIL import Image
+
+        pixmap = pdf_page.get_pixmap(dpi=self.dpi)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+        return pytesseract.image_to_string(image, lang=self.languages)
+
+
+def _ocr_unavailable() -> Optional[str]:
+    """Why OCR cannot run here, or None if it can."""
+    try:
+        _import_pymupdf()
+        import pytesseract
+    except ImportError as e:
+        return str(e)
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def extractor_from_env() -> PageExtractor:
+    """
+    Builds the PageExtractor configured by PDF_TEXT_BACKEND and OCR_BACKEND,
+    falling back to pypdf / no OCR when an optional dependency is missing.
+    """
+    text_backend, ocr_backend = DEFAULT_TEXT_BACKEND, DEFAULT_OCR_BACKEND
+    if text_backend not in TEXT_BACKENDS:
+        raise ValueError(f"PDF_TEXT_BACKEND must be one of {', '.join(TEXT_BACKENDS)}, got {text_backend!r}")
+    if ocr_backend not in OCR_BACKENDS:
+        raise ValueError(f"OCR_BACKEND must be one of {', '.join(OCR_BACKENDS)}, got {ocr_backend!r}")
+    if text_backend == "pymupdf":
+        try:
+            _import_pymupdf()
+        except ImportError as e:
+            print(f"PyMuPDF unavailable ({e}); extracting text with pypdf")
+            text_backend = "pypdf"
+    if ocr_backend != "none":
+        reason = _ocr_unavailable()
+        if reason:
+            print(f"OCR unavailable ({reason}); pages without a text layer stay empty")
+            ocr_backend = "none"
+    return PageExtractor(text_backend, ocr_backend)
+
+
+class PageCache:
+    """
+    Extracted page text keyed by (file SHA-256, page), in a SQLite file shared by
+    all processes using the same ingest folder.
+
+    Args:
+        path (str): SQLite file.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages (sha256 TEXT NOT NULL, page INTEGER NOT NULL, text TEXT NOT NULL, "
+            "backend TEXT NOT NULL, ocr TEXT NOT NULL, letters INTEGER NOT NULL, PRIMARY KEY (sha256, page))"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS files (sha256 TEXT PRIMARY KEY, pages INTEGER NOT NULL)")
+        self._conn.commit()
+
+    def page_count(self, sha: str) -> Optional[int]:
+        row = self._conn.execute("SELECT pages FROM files WHERE sha256 = ?", (sha,)).fetchone()
+        return row[0] if row else None
+
+    def missing(self, sha: str, page_count: int, extractor: PageExtractor) -> List[int]:
+        """Pages of a file that are not cached, or need another try with OCR."""
+        rows = self._conn.execute("SELECT page, ocr, letters FROM pages WHERE sha256 = ?", (sha,))
+        final = {page for page, ocr, letters in rows if extractor.is_final(ocr, letters)}
+        return [page for page in range(page_count) if page not in final]
+
+    def texts(self, sha: str) -> Dict[int, str]:
+        return dict(self._conn.execute("SELECT page, text FROM pages WHERE sha256 = ?", (sha,)))
+
+    def put(self, sha: str, page_count: int, pages: Iterable[ExtractedPage]):
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (sha, page_count))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                ((sha, p.page, p.text, p.backend, p.ocr, letter_count(p.text)) for p in pages),
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+def record_throughput(stats: dict, pages: Iterable[ExtractedPage] = (), cached: int = 0):
+    """
+    Adds extracted (or cached) pages to the run totals and the metrics. A page
+    counts for the backend whose text was kept; every backend tried on it adds
+    the time it spent.
+    """
+    backends = stats.setdefault("backends", {})
+    for page in pages:
+        stats["pages"] = stats.get("pages", 0) + 1
+        backends.setdefault(page.backend, {"pages": 0, "seconds": 0.0})["pages"] += 1
+        PAGES_EXTRACTED.inc(backend=page.backend)
+        for backend, seconds in page.seconds.items():
+            backends.setdefault(backend, {"pages": 0, "seconds": 0.0})["seconds"] += seconds
+            EXTRACTION_SECONDS.inc(seconds, backend=backend)
+    if cached:
+        stats["pages"] = stats.get("pages", 0) + cached
+        backends.setdefault(CACHE_BACKEND, {"pages": 0, "seconds": 0.0})["pages"] += cached
+        PAGES_EXTRACTED.inc(cached, backend=CACHE_BACKEND)
+
+
+def record_elapsed(stats: dict, seconds: float):
+    """Adds a run's wall-clock seconds, from its start to its last page, to the totals."""
+    stats["seconds"] = stats.get("seconds", 0.0) + seconds
+
+
+def throughput(stats: dict) -> dict:
+    """
+    Pages, wall-clock seconds and pages per wall-clock second of the runs, and
+    per backend the pages whose text it produced and the seconds it spent,
+    summed over parser processes (worker_seconds).
+    """
+    seconds = stats.get("seconds", 0.0)
+    return {
+        "pages": stats.get("pages", 0),
+        "seconds": round(seconds, 3),
+        "pages_per_s": round(stats.get("pages", 0) / seconds, 1) if seconds else None,
+        "backends": {
+            backend: {"pages": entry["pages"], "worker_seconds": round(entry["seconds"], 3)}
+            for backend, entry in stats.get("backends", {}).items()
+        },
+    }
@@ -0,0 +1,35 @@
+"""
+Advisory file locks for coordinating worker processes that share startup_db/
+(index builds, appends to the embedding cache).
+
+Uses fcntl.flock, so it covers processes on one machine. Where fcntl is not
+available (Windows), locking is skipped; run a single worker there.
+"""
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True):
+    """
+    Holds an exclusive lock on `path` (created if missing) for the duration of the block.
+
+    Args:
+        path (str): Lock file.
+        blocking (bool): Wait for the lock; if False, raise BlockingIOError when it is held.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
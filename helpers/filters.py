@@ -0,0 +1,243 @@
+"""
+Metadata filters for retrieval: restrict a question to some source documents,
+years and article ranges.
+
+A FilterIndex keeps, for every FAISS position, the chunk's source document,
+year and article number as numpy arrays, built on first use from the docstore's
+fields table (chunk texts are not read). A filter
+resolves to a bitmap over those arrays and then to the sorted positions it
+selects, which are cached per filter. Searches over a subset then cost what
+the subset costs:
+
+  * exact indexes (flat, and HNSW's flat storage) copy the subset's vectors
+    once into a small flat shard and scan only that,
+  * IVF indexes search with a FAISS ID selector, so vectors outside the subset
+    are never compared.
+
+BM25 candidates are restricted to the same chunk IDs.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from helpers.chunker import proclamation_from_filename
+from helpers.docstore import NO_FIELDS, filter_fields, get_documents
+
+# Subsets up to this many vectors get their own exact shard
+_EXACT_SUBSET_MAX = 10_000
+# Resolved filters kept per index (each may hold a shard)
+_SUBSET_CACHE_SIZE = 8
+_FETCH_BATCH = 2000
+
+
+class SearchFilter(NamedTuple):
+    """
+    Restricts retrieval; empty fields do not filter.
+
+    sources matches a document's file name (e.g. "Investment-Proclamation-No-1180_2020.pdf")
+    or its proclamation number ("1180/2020"). Year and article bounds are inclusive;
+    an article bound excludes chunks that are not part of a numbered article, and
+    keeps chunks of several short articles if any of them is in range.
+    """
+
+    sources: tuple = ()
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    article_from: Optional[int] = None
+    article_to: Optional[int] = None
+
+    def is_empty(self) -> bool:
+        return not self.sources and all(
+            value is None for value in (self.year_from, self.year_to, self.article_from, self.article_to)
+        )
+
+
+def make_filter(sources: Sequence[str] = (), year_from=None, year_to=None, article_from=None, article_to=None):
+    """Builds a SearchFilter, or returns None when nothing is restricted."""
+    search_filter = SearchFilter(tuple(sorted(set(sources or ()))), year_from, year_to, article_from, article_to)
+    return None if search_filter.is_empty() else search_filter
+
+
+class Subset:
+    """The FAISS positions (and chunk IDs) a filter selects, with a search over them."""
+
+    def __init__(self, vectorstore, positions: np.ndarray):
+        self.vectorstore = vectorstore
+        self.positions = positions
+        self.ids = frozenset(vectorstore.index_to_docstore_id[int(p)] for p in positions)
+        self._shard_index = None
+        self._selector_params = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _shard(self):
+        """An exact index over just the subset's vectors, or None if they cannot be read back."""
+        import faiss
+
+        with self._lock:
+            if self._shard_index is None:
+                index = self.vectorstore.index
+                try:
+                    vectors = index.reconstruct_batch(self.positions)
+                except RuntimeError:
+                    # IVF lists need a direct map to reconstruct; use an ID selector instead
+                    self._shard_index = False
+                else:
+                    self._shard_index = faiss.IndexFlat(index.d, index.metric_type)
+                    self._shard_index.add(vectors)
+            return self._shard_index if self._shard_index is not False else None
+
+    def _search_params(self):
+        import faiss
+
+        if self._selector_params is None:
+            index = self.vectorstore.index
+            selector = faiss.IDSelectorBatch(self.positions)
+            ivf = faiss.try_extract_index_ivf(index)
+            hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+            if ivf is not None:
+                params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+            elif hnsw is not None:
+                params = faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+            else:
+                params = faiss.SearchParameters(sel=selector)
+            # The params object does not own the selector; keep it alive with it
+            self._selector_params = (params, selector)
+        return self._selector_params[0]
+
+    def search(self, matrix: np.ndarray, k: int):
+        """Like index.search over the subset only: (distances, positions), -1 padded."""
+        if not len(self.positions):
+            return np.zeros((len(matrix), k), dtype=np.float32), np.full((len(matrix), k), -1, dtype=np.int64)
+        shard = self._shard() if len(self.positions) <= _EXACT_SUBSET_MAX else None
+        if shard is None:
+            return self.vectorstore.index.search(matrix, k, params=self._search_params())
+        distances, local = shard.search(matrix, k)
+        return distances, np.where(local >= 0, self.positions[np.maximum(local, 0)], -1)
+
+
+class FilterIndex:
+    """
+    Per-position metadata of one FAISS vectorstore, built lazily on the first
+    filtered search and rebuilt if the vectorstore's index is replaced.
+
+    Args:
+        vectorstore (FAISS): The vectorstore whose chunks are filtered.
+    """
+
+    def __init__(self, vectorstore):
+        self.vectorstore = vectorstore
+        self._lock = threading.Lock()
+        self._built_for = None
+        self._subsets: "OrderedDict[SearchFilter, Subset]" = OrderedDict()
+
+    def _fields(self, n: int):
+        """(source, proclamation, year, article, last article) of each position's chunk."""
+        index_to_id = self.vectorstore.index_to_docstore_id
+        docstore = self.vectorstore.docstore
+        if hasattr(docstore, "fields"):
+            fields = docstore.fields()
+            for position in range(n):
+                yield fields.get(index_to_id[position], NO_FIELDS)
+            return
+        for start in range(0, n, _FETCH_BATCH):
+            positions = range(start, min(n, start + _FETCH_BATCH))
+            docs = {doc.id: doc for doc in get_documents(docstore, (index_to_id[p] for p in positions))}
+            for position in positions:
+                doc = docs.get(index_to_id[position])
+                yield filter_fields(doc.metadata) if doc is not None else NO_FIELDS
+
+    def _build(self):
+        n = len(self.vectorstore.index_to_docstore_id)
+        sources: List[str] = []
+        source_codes: Dict[str, int] = {}
+        self._source = np.zeros(n, dtype=np.int32)
+        self._year = np.zeros(n, dtype=np.int32)
+        self._article = np.zeros(n, dtype=np.int32)
+        self._article_end = np.zeros(n, dtype=np.int32)
+        self._documents: Dict[str, dict] = {}
+        for position, (source, proclamation, year, article, article_end) in enumerate(self._fields(n)):
+            if source not in source_codes:
+                source_codes[source] = len(sources)
+                sources.append(source)
+                file_proclamation, file_year = proclamation_from_filename(source)
+                self._documents[source] = {
+                    "source": source,
+                    "proclamation": proclamation if proclamation is not None else file_proclamation,
+                    "year": year if year is not None else file_year,
+                    "chunks": 0,
+                    "articles": 0,
+                }
+            document = self._documents[source]
+            document["chunks"] += 1
+            self._source[position] = source_codes[source]
+            self._year[position] = year or document["year"] or 0
+            self._article[position] = article or 0
+            self._article_end[position] = article_end or article or 0
+            document["articles"] = max(document["articles"], int(self._article_end[position]))
+        self._sources = sources
+        self._subsets.clear()
+        self._built_for = (self.vectorstore.index, self.vectorstore.index.ntotal)
+
+    def _ensure_built(self):
+        index = self.vectorstore.index
+        if self._built_for is None or self._built_for[0] is not index or self._built_for[1] != index.ntotal:
+            self._build()
+
+    def documents(self) -> List[dict]:
+        """Source documents with their proclamation, year, chunk and article counts."""
+        with self._lock:
+            self._ensure_built()
+            return sorted((dict(doc) for doc in self._documents.values()), key=lambda doc: doc["source"])
+
+    def _source_matches(self, source: str, wanted) -> bool:
+        document = self._documents[source]
+        return source in wanted or os.path.basename(source) in wanted or document["proclamation"] in wanted
+
+    def subset(self, search_filter: SearchFilter) -> Subset:
+        """Resolves a filter to the positions it selects (cached per filter)."""
+        with self._lock:
+            self._ensure_built()
+            subset = self._subsets.get(search_filter)
+            if subset is not None:
+                self._subsets.move_to_end(search_filter)
+                return subset
+
+            mask = np.ones(len(self._source), dtype=bool)
+            if search_filter.sources:
+                wanted = set(search_filter.sources)
+                codes = [code for code, source in enumerate(self._sources) if self._source_matches(source, wanted)]
+                mask &= np.isin(self._source, codes)
+            if search_filter.year_from is not None:
+                mask &= self._year >= search_filter.year_from
+            if search_filter.year_to is not None:
+                mask &= self._year <= search_filter.year_to
+            if search_filter.article_from is not None or search_filter.article_to is not None:
+                mask &= self._article > 0
+            if search_filter.article_from is not None:
+                mask &= self._article_end >= search_filter.article_from
+            if search_filter.article_to is not None:
+                mask &= self._article <= search_filter.article_to
+
+            subset = Subset(self.vectorstore, np.flatnonzero(mask).astype(np.int64))
+            self._subsets[search_filter] = subset
+            if len(self._subsets) > _SUBSET_CACHE_SIZE:
+                self._subsets.popitem(last=False)
+            return subset
+
+
+_filter_index_lock = threading.Lock()
+
+
+def get_filter_index(vectorstore) -> FilterIndex:
+    """Returns the FilterIndex shared by everything searching this vectorstore."""
+    with _filter_index_lock:
+        filter_index = vectorstore.__dict__.get("_filter_index")
+        if filter_index is None:
+            filter_index = vectorstore._filter_index = FilterIndex(vectorstore)
+        return filter_index
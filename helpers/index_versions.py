@@ -0,0 +1,223 @@
+"""
+Versioned index directories with atomic switching.
+
+    startup_db/
+        CURRENT              name of the live version
+        versions/<version>/  index.faiss, docstore.sqlite, metadata.json,
+                             chunk_registry.json
+        ingest/, embedding_cache/, *.sqlite caches (shared by all versions)
+        pinned_versions.sqlite  which versions each live process has loaded
+
+A rebuild happens in a new, hidden version directory seeded from the live one
+(hard links for files that are only ever replaced, a copy of the SQLite
+docstore, which is updated in place). When it is complete, it is renamed into
+place and CURRENT is replaced in one os.replace, so a reader sees either the
+old version or the new one. The newest INDEX_KEEP_VERSIONS versions are kept for
+rollback.
+
+A process pins each version before it loads it, so pruning never deletes a
+version that a worker which has not picked up the new one yet still serves.
+Pins of exited processes are ignored, and a version a process has replaced
+stays pinned for a grace period while requests that started on it finish.
+
+Indexes saved before versioning (files directly in startup_db/) are still
+loaded and seed the first version.
+"""
+import os
+import shutil
+import sqlite3
+import time
+from typing import List, Optional, Set
+
+from helpers.jobs import _pid_alive
+from helpers.vectorstore import read_index_metadata
+
+DEFAULT_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+
+_VERSIONS_DIR = "versions"
+_CURRENT_FILE = "CURRENT"
+_BUILD_PREFIX = ".building-"
+# Files replaced atomically on save can be shared between versions
+_LINKED_FILES = ("index.faiss", "metadata.json", "chunk_registry.json")
+# Files updated in place must be copied
+_COPIED_FILES = ("docstore.sqlite",)
+# Build directories older than this are leftovers of an interrupted build
+_STALE_BUILD_SECONDS = 6 * 3600
+_PINS_FILE = "pinned_versions.sqlite"
+# A replaced version stays pinned this long for requests still using it
+_UNPIN_GRACE_SECONDS = 300
+
+
+def _versions_root(persist_directory: str) -> str:
+    return os.path.join(persist_directory, _VERSIONS_DIR)
+
+
+def current_version(persist_directory: str = "./startup_db") -> Optional[str]:
+    """Name of the live version, or None before the first versioned build."""
+    path = os.path.join(persist_directory, _CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        name = f.read().strip()
+    return name if name and os.path.isdir(os.path.join(_versions_root(persist_directory), name)) else None
+
+
+def index_dir(persist_directory: str = "./startup_db", version: Optional[str] = None) -> str:
+    """Directory holding a version's index files (the live one by default)."""
+    version = version or current_version(persist_directory)
+    if version is None:
+        return persist_directory
+    return os.path.join(_versions_root(persist_directory), version)
+
+
+def list_versions(persist_directory: str = "./startup_db") -> List[dict]:
+    """Kept versions, newest first, with their chunk count and whether they are live."""
+    root = _versions_root(persist_directory)
+    if not os.path.isdir(root):
+        return []
+    live = current_version(persist_directory)
+    versions = []
+    for name in sorted(os.listdir(root), reverse=True):
+        if name.startswith(_BUILD_PREFIX):
+            continue
+        metadata = read_index_metadata(os.path.join(root, name))
+        versions.append({
+            "version": name,
+            "current": name == live,
+            "document_count": metadata.get("document_count"),
+            "index_version": metadata.get("index_version"),
+            "chunker": metadata.get("chunker"),
+            "index_type": metadata.get("index_type"),
+        })
+    return versions
+
+
+def _link_or_copy(source: str, target: str):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def begin_version(persist_directory: str = "./startup_db"):
+    """
+    Creates a hidden build directory seeded with the live version's files.
+
+    Returns:
+        tuple: (version name, build directory)
+    """
+    name = f"v{time.time_ns():x}"
+    build_dir = os.path.join(_versions_root(persist_directory), _BUILD_PREFIX + name)
+    os.makedirs(build_dir)
+    source = index_dir(persist_directory)
+    for file_name in _LINKED_FILES + _COPIED_FILES:
+        path = os.path.join(source, file_name)
+        if os.path.exists(path):
+            if file_name in _COPIED_FILES:
+                shutil.copy2(path, os.path.join(build_dir, file_name))
+            else:
+                _link_or_copy(path, os.path.join(build_dir, file_name))
+    return name, build_dir
+
+
+def abort_version(build_dir: str):
+    """Deletes an unfinished build directory."""
+    shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def activate_version(persist_directory: str, version: str):
+    """Atomically makes an existing version the live one."""
+    if not os.path.isdir(os.path.join(_versions_root(persist_directory), version)):
+        raise ValueError(f"Unknown index version {version!r}")
+    path = os.path.join(persist_directory, _CURRENT_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def commit_version(persist_directory: str, version: str, build_dir: str, keep: int = DEFAULT_KEEP_VERSIONS) -> str:
+    """
+    Publishes a finished build: renames it into place, switches CURRENT to it
+    and prunes old versions.
+
+    Returns:
+        str: The version's directory.
+    """
+    final_dir = os.path.join(_versions_root(persist_directory), version)
+    os.replace(build_dir, final_dir)
+    activate_version(persist_directory, version)
+    prune_versions(persist_directory, keep)
+    return final_dir
+
+
+def _pins(persist_directory: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(os.path.join(persist_directory, _PINS_FILE), timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pins ("
+        "pid INTEGER, version TEXT, unpinned_at REAL, PRIMARY KEY (pid, version))"
+    )
+    return conn
+
+
+def pin_version(persist_directory: str, version: str):
+    """Records that this process is about to load (or has loaded) a version, so it is not pruned."""
+    conn = _pins(persist_directory)
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO pins VALUES (?, ?, NULL)", (os.getpid(), version))
+    finally:
+        conn.close()
+
+
+def unpin_other_versions(persist_directory: str, version: str):
+    """Releases this process's pins on every version but `version`, after a grace period."""
+    conn = _pins(persist_directory)
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE pins SET unpinned_at = ? WHERE pid = ? AND version != ? AND unpinned_at IS NULL",
+                (time.time(), os.getpid(), version),
+            )
+    finally:
+        conn.close()
+
+
+def pinned_versions(persist_directory: str = "./startup_db") -> Set[str]:
+    """Versions pinned by a running process. Pins of exited processes are dropped."""
+    if not os.path.exists(os.path.join(persist_directory, _PINS_FILE)):
+        return set()
+    conn = _pins(persist_directory)
+    try:
+        pinned, stale = set(), []
+        for pid, version, unpinned_at in conn.execute("SELECT pid, version, unpinned_at FROM pins"):
+            expired = unpinned_at is not None and time.time() - unpinned_at > _UNPIN_GRACE_SECONDS
+            if expired or not _pid_alive(pid):
+                stale.append((pid, version))
+            else:
+                pinned.add(version)
+        with conn:
+            conn.executemany("DELETE FROM pins WHERE pid = ? AND version = ?", stale)
+        return pinned
+    finally:
+        conn.close()
+
+
+def prune_versions(persist_directory: str = "./startup_db", keep: int = DEFAULT_KEEP_VERSIONS):
+    """
+    Deletes all but the newest `keep` versions and stale build directories.
+    The live version and versions pinned by a running process are never deleted.
+    """
+    root = _versions_root(persist_directory)
+    if not os.path.isdir(root):
+        return
+    in_use = pinned_versions(persist_directory) | {current_version(persist_directory)}
+    names = sorted(os.listdir(root), reverse=True)
+    for name in [name for name in names if not name.startswith(_BUILD_PREFIX)][max(1, keep):]:
+        if name not in in_use:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    for name in names:
+        path = os.path.join(root, name)
+        if name.startswith(_BUILD_PREFIX) and time.time() - os.path.getmtime(path) > _STALE_BUILD_SECONDS:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,136 @@
+"""
+Incremental indexing of the data folder: only added, changed or removed PDFs
+touch the FAISS index.
+"""
+import os
+
+from helpers.chunker import chunker_signature, iter_chunks
+from helpers.extraction import throughput
+from helpers.loader import fingerprint, iter_documents, list_pdfs
+from helpers.vectorstore import (
+    build_vectorstore,
+    index_config_from_env,
+    load_chunk_registry,
+    load_vectorstore,
+    read_index_metadata,
+    update_vectorstore,
+)
+
+
+def pending_changes(data_path="data", persist_directory="./startup_db"):
+    """
+    What sync_documents would change, worked out from file fingerprints and the
+    index metadata without loading the index or parsing anything.
+
+    Returns:
+        dict: {"rebuild": reason for a full rebuild or None,
+               "updated": added or changed sources, "removed": deleted sources}
+    """
+    registry = load_chunk_registry(persist_directory)
+    current = {source: fingerprint(source, registry.get(source)) for source in list_pdfs(data_path)}
+    metadata = read_index_metadata(persist_directory)
+    rebuild = None
+    if not metadata:
+        rebuild = "no index"
+    elif not registry:
+        rebuild = "no chunk registry"
+    elif metadata.get("index_type", "flat") != index_config_from_env()["index_type"]:
+        rebuild = "index type changed"
+    elif metadata.get("chunker", "recursive") != chunker_signature():
+        rebuild = "chunker changed"
+    return {
+        "rebuild": rebuild,
+        "updated": sorted(s for s, fp in current.items() if registry.get(s, {}).get("sha256") != fp["sha256"]),
+        "removed": sorted(s for s in registry if s not in current),
+    }
+
+
+def sync_documents(data_path="data", persist_directory="./startup_db", vectordb=None, workers=None, cache_dir=None, progress=None):
+    """
+    Brings the vectorstore in line with the PDFs in data_path.
+
+    Builds the index from scratch when none exists (or when it predates the chunk
+    registry, or FAISS_INDEX_TYPE or CHUNKER changed since it was built), streaming
+    pages through parsing, chunking and embedding so memory stays bounded by the
+    batch size; otherwise re-parses and re-embeds only the files whose content
+    hash changed and removes the chunks of deleted files.
+
+    Args:
+        data_path (str): Folder containing the PDFs.
+        persist_directory (str): Directory where the vectorstore is persisted.
+        vectordb (FAISS): Already-loaded vectorstore to update, if any.
+        workers (int): Parser processes passed to iter_documents.
+        cache_dir (str): Parsed-page cache. Defaults to persist_directory/ingest.
+        progress (callable): Called as progress(phase, **counts) as work advances.
+
+    Returns:
+        tuple: (FAISS vectorstore, stats dict; "extraction" holds pages and
+            pages per wall-clock second, and pages per extraction backend)
+    """
+    cache_dir = cache_dir or os.path.join(persist_directory, "ingest")
+    report = progress or (lambda phase, **counts: None)
+    extraction = {}  # pages and seconds, in total and per extraction backend
+    registry = load_chunk_registry(persist_directory)
+    current = {source: fingerprint(source, registry.get(source)) for source in list_pdfs(data_path)}
+
+    if vectordb is None:
+        vectordb = load_vectorstore(persist_directory)
+
+    pages = {"count": 0}
+
+    def counted(docs):
+        for doc in docs:
+            pages["count"] += 1
+            yield doc
+
+    index_type = index_config_from_env()["index_type"]
+    chunker = chunker_signature()
+    metadata = read_index_metadata(persist_directory)
+    built_type = metadata.get("index_type", "flat")
+    built_chunker = metadata.get("chunker", "recursive")
+
+    if vectordb is None or not registry or built_type != index_type or built_chunker != chunker:
+        if vectordb is not None and not registry:
+            print("Existing index has no chunk registry; rebuilding it")
+        elif vectordb is not None and built_type != index_type:
+            print(f"Index type changed from {built_type} to {index_type}; rebuilding it")
+        elif vectordb is not None:
+            print(f"Chunker changed from {built_chunker} to {chunker}; rebuilding it")
+        if not current:
+            raise ValueError(f"No PDF documents found in {data_path}")
+        # Pages are parsed, chunked and embedded as they stream through, in INDEX_BATCH_SIZE batches
+        report("parsing", files=len(current))
+        docs = counted(iter_documents(data_path, workers=workers, cache_dir=cache_dir, stats=extraction))
+        vectordb = build_vectorstore(
+            iter_chunks(docs),
+            persist_directory,
+            source_hashes=current,
+            chunker=chunker,
+            progress=lambda chunks, sources: report(
+                "embedding", files=len(current), pages=pages["count"], chunks=chunks
+            ),
+        )
+        stats = {"added": vectordb.index.ntotal, "removed": 0, "sources_updated": sorted(current), "sources_removed": []}
+    else:
+        stale = [s for s, fp in current.items() if registry.get(s, {}).get("sha256") != fp["sha256"]]
+        removed = [s for s in registry if s not in current]
+        stats = {"added": 0, "removed": 0, "sources_updated": stale, "sources_removed": removed}
+        if stale or removed:
+            # Streamed like a full build: only the changed files are parsed, chunked and embedded
+            report("parsing", files=len(stale), removed_files=len(removed))
+            docs = counted(iter_documents(data_path, workers=workers, cache_dir=cache_dir, sources=stale, stats=extraction)) if stale else []
+            stats.update(update_vectorstore(
+                vectordb,
+                iter_chunks(docs),
+                persist_directory,
+                removed_sources=removed,
+                source_hashes={s: current[s] for s in stale},
+                progress=lambda chunks, sources: report(
+                    "embedding", files=len(stale), removed_files=len(removed), pages=pages["count"], chunks=chunks
+                ),
+            ))
+
+    stats["document_count"] = vectordb.index.ntotal
+    if extraction:
+        stats["extraction"] = throughput(extraction)
+    return vectordb, stats
@@ -0,0 +1,204 @@
+"""
+Background job queue for long-running work such as reindexing.
+
+Jobs run one at a time on a single worker thread, in submission order, so two
+rebuilds never race. Each job has an ID and a progress dict that the running
+function updates, which clients poll (GET /jobs/{id}). Submitting a job of a
+kind that is already waiting returns the waiting job instead of queueing a
+duplicate.
+
+With a SQLite path, job states are also written there, so with several worker
+processes any of them can answer a poll for a job another one is running.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+# Finished jobs remembered for polling
+_MAX_FINISHED_JOBS = 100
+
+
+class Job:
+    def __init__(self, kind: str, fn: Callable, on_change: Optional[Callable] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.pid = os.getpid()
+        self._on_change = on_change
+        self.status = "queued"  # queued | running | succeeded | failed
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def report(self, phase: str, **details):
+        """Progress callback passed to the job's function."""
+        self.progress = dict(details, phase=phase)
+        if self._on_change is not None:
+            self._on_change(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    @classmethod
+    def from_row(cls, row) -> "Job":
+        """Rebuilds a job recorded by another process (it cannot be run or waited on here)."""
+        id_, kind, status, progress, result, error, created_at, started_at, finished_at, pid = row
+        job = cls(kind, None)
+        job.id, job.pid = id_, pid
+        job.status, job.error = status, error
+        job.progress, job.result = json.loads(progress), json.loads(result)
+        job.created_at, job.started_at, job.finished_at = created_at, started_at, finished_at
+        if status in ("queued", "running") and not _pid_alive(pid):
+            job.status, job.error = "failed", "The worker running the job exited"
+        if job.status in ("succeeded", "failed"):
+            job.done.set()
+        return job
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class JobQueue:
+    """
+    Args:
+        name (str): Worker thread name.
+        path (str): SQLite file shared with other processes, or None for memory only.
+    """
+
+    def __init__(self, name: str = "jobs", path: Optional[str] = None):
+        self.name = name
+        self.path = path
+        self._queue = queue.Queue()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._db_pid = None
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        # Opened lazily and per process, so a queue created before a fork still works
+        if self.path and self._db_pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT, status TEXT, progress TEXT, "
+                "result TEXT, error TEXT, created_at REAL, started_at REAL, finished_at REAL, pid INTEGER)"
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    def _save(self, job: Job):
+        with self._db_lock:
+            db = self._conn()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.kind, job.status, json.dumps(job.progress), json.dumps(job.result, default=str),
+                 job.error, job.created_at, job.started_at, job.finished_at, job.pid),
+            )
+            db.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (_MAX_FINISHED_JOBS,),
+            )
+            db.commit()
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._worker.start()
+
+    def submit(self, kind: str, fn: Callable) -> Job:
+        """
+        Queues fn(job) to run in the background and returns its Job. If a job of
+        the same kind is still queued, that job is returned instead.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.kind == kind and job.status == "queued":
+                    return job
+            job = Job(kind, fn, on_change=self._save)
+            self._jobs[job.id] = job
+            self._prune()
+            self._ensure_worker()
+        self._save(job)
+        self._queue.put(job)
+        return job
+
+    def _prune(self):
+        finished = [id_ for id_, job in self._jobs.items() if job.done.is_set()]
+        for id_ in finished[:max(0, len(finished) - _MAX_FINISHED_JOBS)]:
+            del self._jobs[id_]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            self._save(job)
+            try:
+                job.result = job.fn(job)
+                job.status = "succeeded"
+            except Exception as e:
+                print(f"Job {job.kind} {job.id} failed: {e}")
+                print(f"Traceback: {traceback.format_exc()}")
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                self._save(job)
+                job.done.set()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """A job submitted here, or recorded in the shared SQLite file by another process."""
+        job = self._jobs.get(job_id)
+        if job is None and self.path:
+            with self._db_lock:
+                row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            job = Job.from_row(row) if row else None
+        return job
+
+    def list(self) -> List[Job]:
+        """Known jobs (from all processes sharing the SQLite file), newest first."""
+        if self.path:
+            with self._db_lock:
+                rows = self._conn().execute("SELECT * FROM jobs ORDER BY created_at DESC").fetchall()
+            return [self._jobs.get(row[0]) or Job.from_row(row) for row in rows]
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    @property
+    def busy(self) -> bool:
+        """True while a job is queued or running."""
+        return any(not job.done.is_set() for job in self.list())
@@ -0,0 +1,207 @@
+"""
+Lexical (BM25) inverted index over the chunks in the vectorstore.
+
+Dense MiniLM vectors blur exact legal references such as "Article 12" or
+"Proclamation No. 1180/2020"; BM25 matches them literally. A saved index keeps
+its postings in the SQLite docstore, written together with the chunks and keyed
+by the same chunk IDs, and searches read only the postings of the query terms;
+loading an index costs nothing. LexicalIndex is the in-memory variant, for
+vectorstores that are not saved.
+"""
+import heapq
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import AbstractSet, Dict, Iterable, List, Optional, Tuple
+
+from helpers.docstore import SQLiteDocstore, get_documents
+
+_DOCSTORE_FILE = "docstore.sqlite"
+
+# Words, numbers and references like "1180/2020" or "3.2"
+_TOKEN_RE = re.compile(r"\w+(?:[/.]\w+)*")
+
+# Very common English words that carry no retrieval signal
+_STOPWORDS = frozenset(
+    "a an and any are as at be by for from has have in is it its may of on or shall "
+    "such that the their this to under which with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases and splits text into index terms. Compound references are kept
+    whole and also split into their parts, so "1180/2020" matches both
+    "1180/2020" and "1180".
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        if "/" in token or "." in token:
+            terms.extend(part for part in re.split(r"[/.]", token) if part)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 scoring over the postings a subclass stores."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+    def _stats(self) -> Tuple[int, int]:
+        """(chunk count, total chunk length in terms)."""
+        raise NotImplementedError
+
+    def _postings(self, term: str) -> Iterable[Tuple[str, int, int]]:
+        """(chunk ID, term frequency, chunk length) of the chunks containing a term."""
+        raise NotImplementedError
+
+    def search(self, query: str, k: int = 10, allowed_ids: Optional[AbstractSet[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Scores chunks against a query with BM25.
+
+        Args:
+            query (str): The question.
+            k (int): Number of results.
+            allowed_ids (set): Only these chunks are scored (e.g. a metadata filter's
+                subset); None scores every chunk. Statistics stay corpus-wide.
+
+        Returns:
+            list[tuple[str, float]]: Up to k (chunk ID, score) pairs, best first.
+        """
+        n_docs, total_len = self._stats()
+        if not n_docs:
+            return []
+        avg_len = total_len / n_docs
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for id_, tf, length in postings:
+                if allowed_ids is not None and id_ not in allowed_ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * length / avg_len)
+                scores[id_] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class LexicalIndex(BM25Index):
+    """
+    Okapi BM25 over an in-memory inverted index that supports per-chunk
+    additions and removals.
+
+    Args:
+        k1 (float): Term frequency saturation.
+        b (float): Document length normalization.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        super().__init__(k1, b)
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._postings_by_term: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._total_len = 0
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        """Indexes chunks; an ID that is already indexed is replaced."""
+        for id_, text in zip(ids, texts):
+            if id_ in self._doc_terms:
+                self.remove([id_])
+            terms = dict(Counter(tokenize(text)))
+            self._doc_terms[id_] = terms
+            length = sum(terms.values())
+            self._doc_len[id_] = length
+            self._total_len += length
+            for term, tf in terms.items():
+                self._postings_by_term[term][id_] = tf
+
+    def remove(self, ids: Iterable[str]):
+        """Drops chunks from the index; unknown IDs are ignored."""
+        for id_ in ids:
+            terms = self._doc_terms.pop(id_, None)
+            if terms is None:
+                continue
+            self._total_len -= self._doc_len.pop(id_)
+            for term in terms:
+                postings = self._postings_by_term[term]
+                postings.pop(id_, None)
+                if not postings:
+                    del self._postings_by_term[term]
+
+    def _stats(self):
+        return len(self._doc_terms), self._total_len
+
+    def _postings(self, term):
+        postings = self._postings_by_term.get(term, {})
+        return [(id_, tf, self._doc_len[id_]) for id_, tf in postings.items()]
+
+    @classmethod
+    def from_vectorstore(cls, vectordb) -> "LexicalIndex":
+        """Builds an index from every chunk in a FAISS vectorstore's docstore."""
+        index = cls()
+        ids = list(vectordb.index_to_docstore_id.values())
+        docs = get_documents(vectordb.docstore, ids)
+        index.add((doc.id for doc in docs), (doc.page_content for doc in docs))
+        return index
+
+
+class DocstoreLexicalIndex(BM25Index):
+    """
+    BM25 over the postings saved in a SQLite docstore. It follows the docstore's
+    committed chunks; uncommitted changes are not searched.
+
+    Args:
+        docstore (SQLiteDocstore): The docstore holding the postings.
+    """
+
+    def __init__(self, docstore: SQLiteDocstore, k1: float = 1.5, b: float = 0.75):
+        super().__init__(k1, b)
+        self.docstore = docstore
+        self._cached_stats = None
+
+    def __len__(self):
+        return self._stats()[0]
+
+    def _stats(self):
+        # A loaded version's docstore only changes when it is saved again, by its builder
+        if self._cached_stats is None:
+            self._cached_stats = self.docstore.term_stats()
+        return self._cached_stats
+
+    def _postings(self, term):
+        return self.docstore.postings(term)
+
+
+def load_lexical_index(persist_directory: str = "./startup_db", vectordb=None) -> Optional[BM25Index]:
+    """
+    Returns the lexical index of a saved vectorstore: its docstore's postings.
+    A vectorstore whose docstore has none (one that was never saved) is indexed
+    in memory instead.
+
+    Args:
+        persist_directory (str): Directory where the vectorstore is persisted;
+            used when no vectorstore is given.
+        vectordb (FAISS): Optional loaded vectorstore.
+
+    Returns:
+        The index, or None if there is no vectorstore.
+    """
+    if vectordb is None:
+        path = os.path.join(persist_directory, _DOCSTORE_FILE)
+        if not os.path.exists(path):
+            return None
+        return DocstoreLexicalIndex(SQLiteDocstore(path))
+    if isinstance(vectordb.docstore, SQLiteDocstore):
+        return DocstoreLexicalIndex(vectordb.docstore)
+    print(f"Building lexical index from {vectordb.index.ntotal} chunks")
+    return LexicalIndex.from_vectorstore(vectordb)
@@ -0,0 +1,545 @@
+"""
+LLM providers for answering questions: Groq's hosted API, any OpenAI-compatible
+server (OpenAI, vLLM, Ollama, ...) and a local llama.cpp server (`llama-server`
+speaks the same API), all sharing one pooled HTTP client with request timeouts.
+
+LLM_PROVIDERS lists the providers in order of preference, e.g. "llamacpp,groq".
+With more than one:
+
+  * a provider that fails before its first token falls back to the next one,
+  * with LLM_HEDGE_AFTER > 0, a provider that has not produced its first token
+    within that many seconds is hedged: the next provider is started as well and
+    whichever streams first answers; the other is abandoned. An abandoned
+    OpenAI-compatible or llama.cpp request has its response closed at once; a
+    Groq request is closed when its next chunk arrives (at once under astream,
+    where abandoning cancels the attempt's task).
+
+The configured model is built once per process (get_llm), so reprocessing
+documents reuses the same client and its warm connections. HTTP clients (and
+the Groq model, which binds them) are created per process ID, so a worker
+forked after the model was built opens connections of its own.
+"""
+import asyncio
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from contextlib import closing
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream, generate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from helpers.metrics import REGISTRY
+
+PROVIDERS = ("groq", "openai", "llamacpp")
+
+DEFAULT_PROVIDERS = os.getenv("LLM_PROVIDERS", "groq")
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+DEFAULT_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+DEFAULT_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+DEFAULT_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+
+LLM_ATTEMPTS = REGISTRY.counter(
+    "rag_llm_attempts_total",
+    "LLM calls per provider by outcome (answered, failed, abandoned after losing a hedge).",
+    labels=("provider", "outcome"),
+)
+LLM_HEDGES = REGISTRY.counter(
+    "rag_llm_hedges_total", "Backup LLM calls started because the first token was slow.", labels=("provider",)
+)
+
+# Reentrant: building a per-process chat model fetches the per-process HTTP clients
+_per_process_lock = threading.RLock()
+_per_process: Dict[Any, tuple] = {}  # key -> (pid, object)
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(DEFAULT_TIMEOUT, connect=DEFAULT_CONNECT_TIMEOUT)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=DEFAULT_MAX_CONNECTIONS, max_keepalive_connections=DEFAULT_MAX_CONNECTIONS)
+
+
+def _per_process_object(key, factory):
+    # One object per process: a worker forked after it was created builds its
+    # own instead of sharing the parent's connections.
+    with _per_process_lock:
+        pid, value = _per_process.get(key, (None, None))
+        if value is None or pid != os.getpid():
+            value = factory()
+            _per_process[key] = (os.getpid(), value)
+        return value
+
+
+def http_client() -> httpx.Client:
+    """The process-wide pooled HTTP client every provider sends requests through."""
+    return _per_process_object("http", lambda: httpx.Client(timeout=_timeout(), limits=_limits()))
+
+
+def async_http_client() -> httpx.AsyncClient:
+    """Async counterpart of http_client(), used by the Groq SDK and OpenAICompatibleChat's astream()."""
+    return _per_process_object("async_http", lambda: httpx.AsyncClient(timeout=_timeout(), limits=_limits()))
+
+
+def _abort(response: httpx.Response):
+    """
+    Ends a response another thread may be blocked reading. Closing the socket
+    would not wake that thread; shutting it down does, and the reader then
+    closes the response (dropping the connection) itself.
+    """
+    stream = response.extensions.get("network_stream")
+    sock = stream.get_extra_info("socket") if stream is not None else None
+    if sock is not None:
+        try:
+            # The plain socket's shutdown, also for TLS, whose shutdown() would drop the SSL state under the reader
+            socket.socket.shutdown(sock, socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class _Cancellation:
+    """Abandons a streaming attempt: set() stops its loop and aborts its open response."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._response = None
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def attach(self, response: httpx.Response) -> bool:
+        """Registers the attempt's response; False if the attempt is already cancelled."""
+        with self._lock:
+            self._response = response
+            return not self._event.is_set()
+
+    def set(self):
+        with self._lock:
+            self._event.set()
+            response = self._response
+        if response is not None:
+            _abort(response)
+
+
+class OpenAICompatibleChat(BaseChatModel):
+    """
+    Chat model for servers implementing POST /chat/completions, including
+    llama.cpp's `llama-server`. Requests go through the shared pooled client.
+    """
+
+    base_url: str
+    model_name: str
+    api_key: Optional[str] = None
+    temperature: float = 0.0
+    max_tokens: Optional[int] = None
+    provider: str = "openai"
+
+    @property
+    def _llm_type(self) -> str:
+        return "openai-compatible"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"provider": self.provider, "base_url": self.base_url, "model_name": self.model_name}
+
+    def _payload(self, messages: List[BaseMessage], stop: Optional[List[str]], stream: bool) -> dict:
+        roles = {"human": "user", "ai": "assistant", "system": "system"}
+        payload = {
+            "model": self.model_name,
+            "messages": [{"role": roles.get(m.type, "user"), "content": m.content} for m in messages],
+            "temperature": self.temperature,
+            "stream": stream,
+        }
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        if stop:
+            payload["stop"] = stop
+        if self.max_tokens:
+            payload["max_tokens"] = self.max_tokens
+        return payload
+
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    @staticmethod
+    def _usage(usage: Optional[dict]) -> Optional[dict]:
+        if not usage:
+            return None
+        return {
+            "input_tokens": usage.get("prompt_tokens", 0),
+            "output_tokens": usage.get("completion_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0),
+        }
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        response = http_client().post(
+            f"{self.base_url.rstrip('/')}/chat/completions",
+            json=self._payload(messages, stop, stream=False),
+            headers=self._headers(),
+        )
+        response.raise_for_status()
+        body = response.json()
+        message = AIMessage(
+            content=body["choices"][0]["message"].get("content") or "",
+            usage_metadata=self._usage(body.get("usage")),
+        )
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": body.get("usage") or {}, "model_name": self.model_name},
+        )
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # Passed by HedgedChat, which may abandon the request
+        cancellation: Optional[_Cancellation] = kwargs.get("cancellation")
+        with http_client().stream(
+            "POST",
+            f"{self.base_url.rstrip('/')}/chat/completions",
+            json=self._payload(messages, stop, stream=True),
+            headers=self._headers(),
+        ) as response:
+            if cancellation is not None and not cancellation.attach(response):
+                return
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if cancellation is not None and cancellation.is_set():
+                    return
+                chunks = self._parse_event(line)
+                if chunks is None:
+                    break
+                for chunk in chunks:
+                    if chunk.message.content and run_manager:
+                        run_manager.on_llm_new_token(chunk.message.content)
+                    yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        # HedgedChat abandons an async attempt by cancelling its task, which closes the response
+        async with async_http_client().stream(
+            "POST",
+            f"{self.base_url.rstrip('/')}/chat/completions",
+            json=self._payload(messages, stop, stream=True),
+            headers=self._headers(),
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                chunks = self._parse_event(line)
+                if chunks is None:
+                    break
+                for chunk in chunks:
+                    if chunk.message.content and run_manager:
+                        await run_manager.on_llm_new_token(chunk.message.content)
+                    yield chunk
+
+    def _parse_event(self, line: str) -> Optional[List[ChatGenerationChunk]]:
+        """The chunks in one server-sent event line (none for comments and keep-alives; None at the end)."""
+        if not line.startswith("data:"):
+            return []
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        event = json.loads(data)
+        chunks = []
+        for choice in event.get("choices") or []:
+            token = (choice.get("delta") or {}).get("content") or ""
+            if token:
+                chunks.append(ChatGenerationChunk(message=AIMessageChunk(content=token)))
+        usage = self._usage(event.get("usage"))
+        if usage:
+            chunks.append(ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage)))
+        return chunks
+
+
+class _Race:
+    """
+    The bookkeeping HedgedChat's sync and async streams share: which attempts
+    are running, when the next one is due, and which one won. `start(i)` and
+    `cancel(i)` launch and abandon attempt i.
+    """
+
+    def __init__(self, names: List[str], hedge_after: float, start: Callable[[int], None], cancel: Callable[[int], None]):
+        self.names = names
+        self.hedge_after = hedge_after
+        self._start = start
+        self._cancel = cancel
+        self.started = self.running = 0
+        self.winner = None
+        self._deadline = None
+        self.start_next()
+
+    def start_next(self):
+        self._start(self.started)
+        self.started += 1
+        self.running += 1
+        # Each attempt gets hedge_after seconds to its first token; later events do not extend it
+        self._deadline = time.monotonic() + self.hedge_after
+
+    def timeout(self) -> Optional[float]:
+        """Seconds until the next attempt should be started, or None to wait for the next event."""
+        if self.winner is not None or self.hedge_after <= 0 or self.started >= len(self.names):
+            return None
+        return max(0.0, self._deadline - time.monotonic())
+
+    def hedge(self):
+        LLM_HEDGES.inc(provider=self.names[self.started])
+        self.start_next()
+
+    def handle(self, i: int, kind: str, payload) -> Tuple[Optional[AIMessageChunk], bool]:
+        """
+        Processes an attempt's event. Returns the chunk to pass on (if any) and
+        whether the stream is finished; raises the winner's error, or the last
+        error if every attempt failed.
+        """
+        if self.winner is None:
+            if kind == "chunk" and not payload.content and not payload.usage_metadata:
+                return None, False
+            if kind == "error":
+                LLM_ATTEMPTS.inc(provider=self.names[i], outcome="failed")
+                print(f"LLM provider {self.names[i]} failed: {payload}")
+                self.running -= 1
+                if self.started < len(self.names):
+                    self.start_next()
+                elif not self.running:
+                    raise payload
+                return None, False
+            self.winner = i
+            for other in range(self.started):
+                if other != i:
+                    self._cancel(other)
+                    LLM_ATTEMPTS.inc(provider=self.names[other], outcome="abandoned")
+        elif i != self.winner:
+            return None, False
+
+        if kind == "chunk":
+            return payload, False
+        if kind == "done":
+            LLM_ATTEMPTS.inc(provider=self.names[i], outcome="answered")
+            return None, True
+        LLM_ATTEMPTS.inc(provider=self.names[i], outcome="failed")
+        raise payload
+
+
+class HedgedChat(BaseChatModel):
+    """
+    Streams from the first model in `models` and moves on to the next one if it
+    fails before its first token or, with hedge_after > 0, is still silent after
+    hedge_after seconds (both then run; the first to produce a token wins).
+    Once a model has streamed a token, its errors are not retried. Abandoned
+    attempts are cancelled (see _Cancellation) so they do not hold a connection.
+    """
+
+    models: List[BaseChatModel]
+    names: List[str]
+    hedge_after: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"providers": self.names, "hedge_after": self.hedge_after}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        events = queue.Queue()
+        cancelled = [_Cancellation() for _ in self.models]
+
+        def attempt(i):
+            model = self.models[i]
+            # Other providers would send an unknown keyword on to their API
+            extra = {"cancellation": cancelled[i]} if isinstance(model, OpenAICompatibleChat) else {}
+            try:
+                # Closing the stream closes the provider's response too
+                with closing(model.stream(messages, stop=stop, **kwargs, **extra)) as stream:
+                    for chunk in stream:
+                        if cancelled[i].is_set():
+                            return
+                        events.put((i, "chunk", chunk))
+                events.put((i, "done", None))
+            except Exception as e:
+                events.put((i, "error", e))
+
+        def start(i):
+            threading.Thread(target=attempt, args=(i,), daemon=True).start()
+
+        race = _Race(self.names, self.hedge_after, start, lambda i: cancelled[i].set())
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=race.timeout())
+                except queue.Empty:
+                    race.hedge()
+                    continue
+                chunk, done = race.handle(*event)
+                if chunk is not None:
+                    if chunk.content and run_manager:
+                        run_manager.on_llm_new_token(chunk.content)
+                    yield ChatGenerationChunk(message=chunk)
+                if done:
+                    return
+        finally:
+            for cancellation in cancelled:
+                cancellation.set()
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        events = asyncio.Queue()
+        tasks: Dict[int, asyncio.Task] = {}
+
+        async def attempt(i):
+            try:
+                async for chunk in self.models[i].astream(messages, stop=stop, **kwargs):
+                    events.put_nowait((i, "chunk", chunk))
+                events.put_nowait((i, "done", None))
+            except Exception as e:
+                events.put_nowait((i, "error", e))
+
+        def start(i):
+            tasks[i] = asyncio.ensure_future(attempt(i))
+
+        # Cancelling an attempt's task closes its response at the next await
+        race = _Race(self.names, self.hedge_after, start, lambda i: tasks[i].cancel())
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), race.timeout())
+                except asyncio.TimeoutError:
+                    race.hedge()
+                    continue
+                chunk, done = race.handle(*event)
+                if chunk is not None:
+                    if chunk.content and run_manager:
+                        await run_manager.on_llm_new_token(chunk.content)
+                    yield ChatGenerationChunk(message=chunk)
+                if done:
+                    return
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+
+def _create_groq(temperature: float) -> BaseChatModel:
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(
+        temperature=temperature,
+        model_name=os.getenv("GROQ_MODEL", "llama-3.1-8b-instant"),
+        max_tokens=int(os.getenv("LLM_MAX_TOKENS", "0")) or None,
+        request_timeout=_timeout(),
+        max_retries=DEFAULT_MAX_RETRIES,
+        http_client=http_client(),
+        http_async_client=async_http_client(),
+    )
+
+
+class _ProcessLocalChat(BaseChatModel):
+    """
+    Delegates to a provider model that is built once per process. The Groq SDK
+    binds its HTTP clients when it is constructed, so a model built before the
+    workers are forked (a preloaded chain) would otherwise share the parent's
+    connections.
+    """
+
+    provider: str
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return self.provider
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"provider": self.provider, "temperature": self.temperature}
+
+    def _model(self) -> BaseChatModel:
+        return _per_process_object((self.provider, self.temperature), lambda: _create_groq(self.temperature))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._model()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await self._model()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._model()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._model()._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def create_provider(name: str, temperature: float = 0.0) -> BaseChatModel:
+    """
+    Builds one provider's chat model from its environment variables.
+
+    Args:
+        name (str): "groq", "openai" (any OpenAI-compatible server) or "llamacpp".
+        temperature (float): Sampling temperature.
+
+    Returns:
+        BaseChatModel: The provider's chat model.
+    """
+    max_tokens = int(os.getenv("LLM_MAX_TOKENS", "0")) or None
+    if name == "groq":
+        return _ProcessLocalChat(provider=name, temperature=temperature)
+    if name == "openai":
+        return OpenAICompatibleChat(
+            provider=name,
+            base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+            model_name=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            api_key=os.getenv("OPENAI_API_KEY"),
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+    if name == "llamacpp":
+        return OpenAICompatibleChat(
+            provider=name,
+            base_url=os.getenv("LLAMACPP_BASE_URL", "http://127.0.0.1:8080/v1"),
+            # llama-server answers with whatever model it was started with
+            model_name=os.getenv("LLAMACPP_MODEL", "local"),
+            api_key=os.getenv("LLAMACPP_API_KEY"),
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+    raise ValueError(f"Unknown LLM provider {name!r}; expected one of {', '.join(PROVIDERS)}")
+
+
+_llms: Dict[tuple, BaseChatModel] = {}
+_llms_lock = threading.Lock()
+
+
+def get_llm(providers: Optional[str] = None, hedge_after: Optional[float] = None) -> BaseChatModel:
+    """
+    Returns the process-wide chat model for a provider list, creating it on first use.
+
+    Args:
+        providers (str): Comma-separated providers in order of preference.
+            Defaults to LLM_PROVIDERS.
+        hedge_after (float): Seconds without a first token before the next
+            provider is also started; 0 only falls back on errors. Defaults to LLM_HEDGE_AFTER.
+
+    Returns:
+        BaseChatModel: A single provider's model, or a HedgedChat over several.
+    """
+    names = [name.strip().lower() for name in (providers or DEFAULT_PROVIDERS).split(",") if name.strip()]
+    hedge_after = DEFAULT_HEDGE_AFTER if hedge_after is None else hedge_after
+    key = (tuple(names), hedge_after)
+    with _llms_lock:
+        if key not in _llms:
+            models = [create_provider(name) for name in names]
+            if len(models) == 1:
+                _llms[key] = models[0]
+            else:
+                _llms[key] = HedgedChat(models=models, names=names, hedge_after=hedge_after)
+            print(f"LLM providers: {', '.join(names)}" + (f" (hedging after {hedge_after}s)" if len(names) > 1 and hedge_after else ""))
+        return _llms[key]
@@ -1,10 +1,306 @@
+"""
+PDF loading with a process-pool parser and a content-hash manifest.
+
+Files are split into page ranges that are extracted in parallel (native text,
+with an optional OCR fallback; see helpers.extraction). Extracted pages are
+cached keyed by the file's SHA-256 and the page number, so a page of a PDF that
+has not changed since the last run is never extracted again. iter_documents
+streams the pages in order as they are extracted; load_documents collects them
+into a list.
+"""
+import hashlib
+import json
 import os
-from langchain_community.document_loaders import PyPDFLoader
-
-def load_documents(data_path="data"):
-    docs = []
-    for file in os.listdir(data_path):
-        if file.endswith(".pdf"):
-            loader = PyPDFLoader(os.path.join(data_path, file))
-            docs.extend(loader.load())
-    return docs
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from helpers.extraction import (
+    PageCache,
+    PageExtractor,
+    extractor_from_env,
+    record_elapsed,
+    record_throughput,
+    throughput,
+)
+
+DEFAULT_CACHE_DIR = "./startup_db/ingest"
+_MANIFEST_FILE = "manifest.json"
+_PAGE_CACHE_FILE = "pages.sqlite"
+_PAGES_PER_TASK = 50
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Returns the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_pdfs(data_path: str = "data") -> List[str]:
+    """Returns the sorted paths of all PDFs directly inside data_path."""
+    return sorted(
+        os.path.join(data_path, file)
+        for file in os.listdir(data_path)
+        if file.endswith(".pdf")
+    )
+
+
+def load_manifest(cache_dir: str = DEFAULT_CACHE_DIR) -> Dict[str, dict]:
+    """Loads the ingestion manifest ({source: {sha256, size, mtime_ns, pages}})."""
+    path = os.path.join(cache_dir, _MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable ingest manifest: {e}")
+        return {}
+
+
+def save_manifest(manifest: Dict[str, dict], cache_dir: str = DEFAULT_CACHE_DIR):
+    """Atomically writes the ingestion manifest."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, _MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def fingerprint(path: str, previous: Optional[dict] = None) -> dict:
+    """
+    Returns {sha256, size, mtime_ns} for a file, reusing the previous hash when
+    size and mtime are unchanged so unchanged files are not re-read.
+    """
+    stat = os.stat(path)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        sha = previous["sha256"]
+    else:
+        sha = file_sha256(path)
+    return {"sha256": sha, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def diff_manifest(data_path: str = "data", cache_dir: str = DEFAULT_CACHE_DIR) -> Dict[str, List[str]]:
+    """
+    Compares the PDFs in data_path against the manifest.
+
+    Returns:
+        dict: Source paths grouped under "added", "changed", "removed" and "unchanged".
+    """
+    manifest = load_manifest(cache_dir)
+    current = list_pdfs(data_path)
+    diff = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    for source in current:
+        previous = manifest.get(source)
+        if previous is None:
+            diff["added"].append(source)
+        elif fingerprint(source, previous)["sha256"] != previous["sha256"]:
+            diff["changed"].append(source)
+        else:
+            diff["unchanged"].append(source)
+    diff["removed"] = sorted(set(manifest) - set(current))
+    return diff
+
+
+def _iter_extracted(tasks: List[Tuple[str, List[int]]], extractor: PageExtractor, workers: Optional[int] = None):
+    """
+    Runs extraction tasks (source, [page, ...]) and yields (source, [ExtractedPage, ...])
+    in task order. At most two tasks per worker are in flight, so extracted text
+    that has not been consumed yet never piles up.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        for source, pages in tasks:
+            yield source, extractor.extract(source, pages)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        in_flight = deque()
+        for source, pages in tasks:
+            in_flight.append((source, executor.submit(extractor.extract, source, pages)))
+            if len(in_flight) >= 2 * workers:
+                source, future = in_flight.popleft()
+                yield source, future.result()
+        while in_flight:
+            source, future = in_flight.popleft()
+            yield source, future.result()
+
+
+def parse_pdfs(
+    sources: List[str],
+    workers: Optional[int] = None,
+    pages_per_task: int = _PAGES_PER_TASK,
+    extractor: Optional[PageExtractor] = None,
+    stats: Optional[Dict[str, dict]] = None,
+) -> Dict[str, List[str]]:
+    """
+    Parses PDFs into per-page text, fanning page ranges out over a process pool.
+
+    Args:
+        sources (list): PDF paths to parse.
+        workers (int): Process count. None uses all cores; 1 parses in-process.
+        pages_per_task (int): Pages handed to a worker per task.
+        extractor (PageExtractor): Text/OCR backends; defaults to extractor_from_env().
+        stats (dict): Filled with pages and seconds of the run and per extraction
+            backend; see helpers.extraction.throughput.
+
+    Returns:
+        dict: {source: [page_text, ...]}
+    """
+    extractor = extractor or extractor_from_env()
+    stats = {} if stats is None else stats
+    started = time.perf_counter()
+    pages = {source: [""] * extractor.page_count(source) for source in sources}
+    tasks = [
+        (source, list(range(start, min(start + pages_per_task, len(texts)))))
+        for source, texts in pages.items()
+        for start in range(0, len(texts), pages_per_task)
+    ]
+    for source, extracted in _iter_extracted(tasks, extractor, workers):
+        record_throughput(stats, extracted)
+        for page in extracted:
+            pages[source][page.page] = page.text
+    record_elapsed(stats, time.perf_counter() - started)
+    return pages
+
+
+def _to_document(source: str, page: int, text: str, total_pages: int) -> Document:
+    return Document(
+        page_content=text,
+        metadata={"source": source, "page": page, "page_label": str(page + 1), "total_pages": total_pages},
+    )
+
+
+def iter_documents(
+    data_path="data",
+    workers: Optional[int] = None,
+    cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+    sources: Optional[List[str]] = None,
+    stats: Optional[Dict[str, dict]] = None,
+) -> Iterator[Document]:
+    """
+    Yields every PDF in data_path as one Document per page, file by file and in
+    page order, as the pages are extracted.
+
+    Pages already in the page cache (by file content hash and page number) are
+    served from it; the rest are extracted in parallel (see helpers.extraction)
+    and written back to the cache as they arrive. Only the text of the current
+    file is held, so the corpus never has to fit in memory.
+
+    Args:
+        data_path (str): Folder containing the PDFs.
+        workers (int): Parser processes. None uses all cores; 1 disables the pool.
+        cache_dir (str): Manifest/page cache folder. None disables caching.
+        sources (list): Restrict loading to these paths (defaults to all PDFs).
+        stats (dict): Filled with the pages and wall-clock seconds of the run and
+            the pages and seconds per extraction backend; see
+            helpers.extraction.throughput.
+
+    Yields:
+        Document: Page documents with source/page metadata.
+    """
+    full_scan = sources is None
+    sources = list_pdfs(data_path) if full_scan else sources
+    manifest = load_manifest(cache_dir) if cache_dir else {}
+    extractor = extractor_from_env()
+    cache = PageCache(os.path.join(cache_dir, _PAGE_CACHE_FILE)) if cache_dir else None
+    stats = {} if stats is None else stats
+    # Wall-clock from here to the last page read, for pages per second of the whole pool
+    started = finished = time.perf_counter()
+
+    plan = []  # (source, fingerprint, page count, pages to extract)
+    for source in sources:
+        fp = fingerprint(source, manifest.get(source))
+        page_count = None
+        if cache is not None:
+            page_count = cache.page_count(fp["sha256"])
+        if page_count is None:
+            page_count = extractor.page_count(source)
+            if cache is not None:
+                cache.put(fp["sha256"], page_count, ())
+        missing = cache.missing(fp["sha256"], page_count, extractor) if cache is not None else list(range(page_count))
+        plan.append((source, fp, page_count, missing))
+
+    to_extract = sum(len(missing) for *_, missing in plan)
+    if to_extract:
+        total = sum(page_count for _, _, page_count, _ in plan)
+        print(f"Extracting {to_extract} page(s); {total - to_extract} served from cache")
+    tasks = [
+        (source, missing[start:start + _PAGES_PER_TASK])
+        for source, _, _, missing in plan
+        for start in range(0, len(missing), _PAGES_PER_TASK)
+    ]
+    extracted = _iter_extracted(tasks, extractor, workers)
+    if full_scan:
+        listed = set(sources)
+        manifest = {source: entry for source, entry in manifest.items() if source in listed}
+
+    try:
+        for source, fp, page_count, missing in plan:
+            cached = cache.texts(fp["sha256"]) if cache is not None and len(missing) < page_count else {}
+            record_throughput(stats, cached=page_count - len(missing))
+            finished = time.perf_counter()
+            missing, pending = set(missing), deque()
+            for page in range(page_count):
+                if page in missing:
+                    while not pending:
+                        _, batch = next(extracted)
+                        record_throughput(stats, batch)
+                        finished = time.perf_counter()
+                        if cache is not None:
+                            cache.put(fp["sha256"], page_count, batch)
+                        pending.extend(batch)
+                    text = pending.popleft().text
+                else:
+                    text = cached[page]
+                yield _to_document(source, page, text, page_count)
+            if cache_dir:
+                manifest[source] = dict(fp, pages=page_count)
+    finally:
+        extracted.close()
+        if cache is not None:
+            cache.close()
+        record_elapsed(stats, finished - started)
+    if cache_dir:
+        save_manifest(manifest, cache_dir)
+    if stats:
+        totals = throughput(stats)
+        print(
+            f"Page extraction: {totals['pages']} pages in {totals['seconds']}s"
+            + (f" ({totals['pages_per_s']} pages/s)" if totals["pages_per_s"] else "")
+            + "; " + ", ".join(f"{backend} {entry['pages']}" for backend, entry in totals["backends"].items())
+        )
+
+
+def load_documents(
+    data_path="data",
+    workers: Optional[int] = None,
+    cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+    sources: Optional[List[str]] = None,
+    stats: Optional[Dict[str, dict]] = None,
+):
+    """
+    Loads every PDF in data_path as one Document per page.
+
+    Cached pages (by file content hash and page number) are served from the
+    page cache; the rest are extracted in parallel and written back to it. See
+    iter_documents for a version that streams the pages.
+
+    Args:
+        data_path (str): Folder containing the PDFs.
+        workers (int): Parser processes. None uses all cores; 1 disables the pool.
+        cache_dir (str): Manifest/page cache folder. None disables caching.
+        sources (list): Restrict loading to these paths (defaults to all PDFs).
+        stats (dict): Filled with pages and seconds of the run and per extraction backend.
+
+    Returns:
+        list[Document]: Page documents with source/page metadata.
+    """
+    return list(iter_documents(data_path, workers=workers, cache_dir=cache_dir, sources=sources, stats=stats))
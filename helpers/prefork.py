@@ -0,0 +1,134 @@
+"""
+Pre-fork server: runs an ASGI app on several worker processes sharing one port.
+
+The parent binds the socket, optionally preloads the models and the index, and
+then forks the workers, so pages loaded before the fork (model weights, the
+lexical index) are shared copy-on-write instead of being loaded once per worker.
+The memory-mapped FAISS index, docstore and embedding cache are shared through
+the OS page cache in any case. The parent restarts workers that exit and passes
+SIGINT/SIGTERM on to them.
+
+Needs os.fork (Linux, macOS).
+"""
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# A worker that exits sooner than this after starting is restarted with a delay
+_MIN_WORKER_UPTIME = 5.0
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _limit_threads(workers: int):
+    """Splits the cores between workers unless EMBEDDING_THREADS says otherwise."""
+    if os.getenv("EMBEDDING_THREADS"):
+        return
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
+
+def _run_worker(app, sock: socket.socket, workers: int, log_level: str, slot: int):
+    import uvicorn
+
+    from helpers import metrics
+
+    # Workers are numbered by slot, so a restarted worker continues its predecessor's series
+    metrics.set_constant_labels(worker=slot)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _limit_threads(workers)
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def serve(
+    app,
+    host: str = "0.0.0.0",
+    port: int = 8000,
+    workers: int = 2,
+    preload: Optional[Callable[[], None]] = None,
+    log_level: str = "info",
+):
+    """
+    Serves `app` from `workers` forked processes until SIGINT or SIGTERM.
+
+    Args:
+        app: ASGI application (an object, not an import string).
+        host (str): Interface to bind.
+        port (int): Port to bind.
+        workers (int): Worker processes.
+        preload (callable): Run in the parent before forking, e.g. to load models.
+        log_level (str): uvicorn log level.
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("Multiple workers need os.fork; run a single worker on this platform")
+
+    sock = _bind(host, port)
+    if preload is not None:
+        start = time.perf_counter()
+        preload()
+        print(f"Preloaded in {time.perf_counter() - start:.1f}s; forking {workers} workers")
+
+    children: Dict[int, Tuple[float, int]] = {}  # pid -> (start time, slot)
+    stopping = False
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(app, sock, workers, log_level, slot)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (time.monotonic(), slot)
+        print(f"Started worker {pid}")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for slot in range(workers):
+        spawn(slot)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        child = children.pop(pid, None)
+        if child is None or stopping:
+            continue
+        started, slot = child
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting it")
+        if time.monotonic() - started < _MIN_WORKER_UPTIME:
+            time.sleep(1)
+        if not stopping:
+            spawn(slot)
+    sock.close()
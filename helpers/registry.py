@@ -0,0 +1,237 @@
+"""
+Process-wide registry of the heavy, read-only RAG objects (FAISS index,
+lexical index, retriever with its cross-encoder, RAG chain).
+
+Every Streamlit session and request thread reads the same published Pipeline
+instead of building its own. Rebuilds happen in a new index version directory
+(see helpers/index_versions.py) while queries keep using the old one; the new
+pipeline is then swapped in with a single reference assignment, so readers
+always see either the old or the new pipeline, never a half-updated one.
+Rebuilds can run in the background as jobs with pollable progress.
+
+Worker processes sharing one persist directory take turns to build (a file
+lock), and each picks up a version another one published via refresh(). Each
+pins the version it serves, so pruning old versions never deletes it.
+"""
+import os
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+from helpers.chain import create_rag_chain
+from helpers.filelock import file_lock
+from helpers.index_versions import (
+    abort_version,
+    activate_version,
+    begin_version,
+    commit_version,
+    current_version,
+    index_dir,
+    pin_version,
+    unpin_other_versions,
+)
+from helpers.indexer import pending_changes, sync_documents
+from helpers.jobs import Job, JobQueue
+from helpers.lexical import load_lexical_index
+from helpers.retriever import create_retriever
+from helpers.vectorstore import get_index_version, load_vectorstore, read_index_metadata
+
+
+class Pipeline(NamedTuple):
+    vector_store: object
+    retriever: object
+    rag_chain: object
+    index_version: Optional[str]
+    lexical_index: object = None
+    version: Optional[str] = None  # index version directory (None for an unversioned index)
+
+
+class PipelineRegistry:
+    """
+    Args:
+        persist_directory (str): Where the FAISS index is persisted.
+    """
+
+    def __init__(self, persist_directory: str = "./startup_db"):
+        self.persist_directory = persist_directory
+        self._pipeline: Optional[Pipeline] = None
+        # Serializes loads and rebuilds; readers never take it
+        self._build_lock = threading.Lock()
+        self._load_attempted = False
+        self._checked_at = 0.0
+        self._pinned_by = None  # process that pinned the loaded version
+        # Called with the new pipeline after this process made a version live
+        self.on_activate: Optional[Callable[[Pipeline], None]] = None
+        self.jobs = JobQueue("reindex", path=os.path.join(persist_directory, "jobs.sqlite"))
+
+    def get(self) -> Optional[Pipeline]:
+        """Returns the current pipeline (or None) without locking."""
+        return self._pipeline
+
+    def publish(self, vector_store, retriever=None, rag_chain=None, index_version=None, version=None, lexical_index=None) -> Pipeline:
+        """Atomically replaces the current pipeline, building missing parts."""
+        if lexical_index is None:
+            lexical_index = load_lexical_index(index_dir(self.persist_directory, version), vector_store)
+        retriever = retriever or create_retriever(vector_store, lexical_index=lexical_index)
+        rag_chain = rag_chain or create_rag_chain(retriever)
+        pipeline = Pipeline(vector_store, retriever, rag_chain, index_version, lexical_index, version)
+        self._pipeline = pipeline
+        return pipeline
+
+    def _publish_version(self, version: Optional[str]) -> Optional[Pipeline]:
+        if version is not None:
+            # Pinned before loading, so a concurrent prune cannot delete it meanwhile
+            pin_version(self.persist_directory, version)
+            self._pinned_by = os.getpid()
+        directory = index_dir(self.persist_directory, version)
+        vector_store = load_vectorstore(directory)
+        if vector_store is None:
+            return None
+        pipeline = self.publish(vector_store, index_version=get_index_version(directory), version=version)
+        if version is not None:
+            unpin_other_versions(self.persist_directory, version)
+        return pipeline
+
+    def load(self) -> Optional[Pipeline]:
+        """
+        Loads the persisted index once per process. Concurrent callers wait for
+        the first load instead of each loading their own copy.
+        """
+        if self._pipeline is not None or self._load_attempted:
+            return self._pipeline
+        with self._build_lock:
+            if self._pipeline is None and not self._load_attempted:
+                self._load_attempted = True
+                self._publish_version(current_version(self.persist_directory))
+        return self._pipeline
+
+    def rebuild(self, data_path: str = "data", workers=None, progress=None):
+        """
+        Applies the data folder's delta to a new index version seeded from the
+        live one, makes it the live version and swaps the result in. Sessions
+        keep answering from the old pipeline meanwhile. If no PDF changed, no
+        new version is made.
+
+        Args:
+            data_path (str): Folder containing the PDFs.
+            workers (int): Parser processes.
+            progress (callable): Called as progress(phase, **counts).
+
+        Returns:
+            tuple: (Pipeline, stats dict from sync_documents plus "version")
+        """
+        report = progress or (lambda phase, **counts: None)
+        with self._build_lock, file_lock(os.path.join(self.persist_directory, "build.lock")):
+            report("preparing")
+            live = current_version(self.persist_directory)
+            changes = pending_changes(data_path, index_dir(self.persist_directory))
+            if live is not None and not (changes["rebuild"] or changes["updated"] or changes["removed"]):
+                # Nothing to do; skip seeding a new version
+                if self._pipeline is None or self._pipeline.version != live:
+                    self._publish_version(live)
+                self._load_attempted = True
+                count = read_index_metadata(index_dir(self.persist_directory)).get("document_count", 0)
+                stats = {"added": 0, "removed": 0, "sources_updated": [], "sources_removed": [], "document_count": count}
+                return self._pipeline, dict(stats, version=live)
+
+            version, build_dir = begin_version(self.persist_directory)
+            try:
+                vector_store, stats = sync_documents(
+                    data_path,
+                    build_dir,
+                    vectordb=load_vectorstore(build_dir),
+                    workers=workers,
+                    cache_dir=os.path.join(self.persist_directory, "ingest"),
+                    progress=report,
+                )
+            except Exception:
+                abort_version(build_dir)
+                raise
+
+            report("publishing", chunks=stats["document_count"])
+            commit_version(self.persist_directory, version, build_dir)
+            # The build directory was renamed; reopen the index at its final path
+            pipeline = self._publish_version(version)
+            self._load_attempted = True
+            self._activated(pipeline)
+        return pipeline, dict(stats, version=version)
+
+    def submit_rebuild(self, data_path: str = "data", workers=None) -> Job:
+        """
+        Queues rebuild() as a background job and returns it. A rebuild that is
+        still waiting to start is reused rather than queued twice.
+        """
+        def run(job: Job):
+            _, stats = self.rebuild(data_path, workers=workers, progress=job.report)
+            job.report("done", chunks=stats["document_count"])
+            return stats
+
+        return self.jobs.submit("reindex", run)
+
+    def rollback(self, version: str) -> Pipeline:
+        """
+        Makes an earlier kept index version live again and swaps it in.
+
+        Raises:
+            ValueError: If the version does not exist or holds no index.
+        """
+        with self._build_lock, file_lock(os.path.join(self.persist_directory, "build.lock")):
+            activate_version(self.persist_directory, version)
+            pipeline = self._publish_version(version)
+            if pipeline is None:
+                raise ValueError(f"Index version {version!r} holds no index")
+            self._activated(pipeline)
+        return pipeline
+
+    def _activated(self, pipeline: Optional[Pipeline]):
+        if pipeline is None or self.on_activate is None:
+            return
+        try:
+            self.on_activate(pipeline)
+        except Exception as e:
+            print(f"Error in on_activate for index version {pipeline.version}: {e}")
+
+    def refresh(self, min_interval: float = 1.0):
+        """
+        Swaps in the live index version if another process changed it (a
+        rebuild or rollback in another worker). Checks at most once per
+        min_interval seconds; the new version loads on a background thread while
+        callers keep using the current pipeline.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < min_interval or not self._load_attempted:
+            return
+        self._checked_at = now
+        live = current_version(self.persist_directory)
+        pipeline = self._pipeline
+        if pipeline is not None and pipeline.version is not None and self._pinned_by != os.getpid():
+            # A worker forked after the parent loaded the index pins it itself
+            pin_version(self.persist_directory, pipeline.version)
+            self._pinned_by = os.getpid()
+        if live is None or (pipeline is not None and pipeline.version == live):
+            return
+        # A build or load in this process will publish the right version itself
+        if self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._reload, args=(live,), name="index-reload", daemon=True).start()
+
+    def _reload(self, live: str):
+        try:
+            if self._pipeline is None or self._pipeline.version != live:
+                print(f"Index version {live} was published by another process; loading it")
+                self._publish_version(live)
+        except Exception as e:
+            print(f"Error loading index version {live}: {e}")
+        finally:
+            self._build_lock.release()
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(persist_directory: str = "./startup_db") -> PipelineRegistry:
+    """Returns the process-wide registry for a persist directory."""
+    with _registries_lock:
+        if persist_directory not in _registries:
+            _registries[persist_directory] = PipelineRegistry(persist_directory)
+        return _registries[persist_directory]
@@ -1,35 +1,344 @@
 """
 Retriever with cross-encoder reranking. Uses langchain_classic (stable on LangChain 1.x).
+
+When a lexical index is available, first-stage candidates come from FAISS and
+BM25 fused by reciprocal rank fusion (hybrid retrieval). Both stages can be
+restricted by a SearchFilter (see helpers/filters.py) passed at query time:
+
+    retriever.invoke(question, search_filter=make_filter(sources=["1180/2020"]))
+
+The cross-encoder runs on PyTorch or, with RERANKER_BACKEND=onnx, on a
+quantized ONNX Runtime model. Reranking can be adaptive: first-stage vector
+similarities are attached to each candidate, and when they already show a
+clear winner the cross-encoder is skipped or only scores the close candidates.
 """
 from langchain_classic.retrievers import ContextualCompressionRetriever
 from langchain_classic.retrievers.document_compressors import CrossEncoderReranker
 from langchain_community.cross_encoders import HuggingFaceCrossEncoder
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables.config import run_in_executor
+from pydantic import ConfigDict
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import os
+import threading
+
+from helpers.docstore import get_documents
+from helpers.filters import FilterIndex, SearchFilter, Subset, get_filter_index
+from helpers.lexical import BM25Index
+from helpers.metrics import REGISTRY, time_stage
+
+DEFAULT_RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+DEFAULT_RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch")
+# Dynamically quantized (int8) export shipped in the model repository
+DEFAULT_ONNX_FILE = os.getenv("RERANKER_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+DEFAULT_RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "32"))
+# Adaptive reranking; 0 disables each rule
+DEFAULT_SKIP_GAP = float(os.getenv("RERANK_SKIP_GAP", "0"))
+DEFAULT_SCORE_WINDOW = float(os.getenv("RERANK_SCORE_WINDOW", "0"))
+
+# Metadata key holding a candidate's first-stage vector similarity
+RETRIEVAL_SCORE_KEY = "retrieval_score"
+
+RERANK_PAIRS = REGISTRY.counter(
+    "rag_rerank_pairs_total", "(question, chunk) pairs scored by the cross-encoder."
+)
+RERANK_DECISIONS = REGISTRY.counter(
+    "rag_rerank_decisions_total", "Reranking runs by how much of the candidate list was scored.", labels=("mode",)
+)
+
+_cross_encoders = {}
+_cross_encoders_lock = threading.Lock()
+
+
+class BatchedCrossEncoder(HuggingFaceCrossEncoder):
+    """HuggingFaceCrossEncoder that scores pairs in fixed-size batches."""
+
+    batch_size: int = DEFAULT_RERANKER_BATCH_SIZE
+
+    def score(self, text_pairs: List[Tuple[str, str]]) -> List[float]:
+        if not text_pairs:
+            return []
+        scores = self.client.predict(text_pairs, batch_size=self.batch_size)
+        # Two-label models return (not relevant, relevant) per pair
+        if len(scores.shape) > 1:
+            scores = scores[:, 1]
+        return scores.tolist()
+
+
+def get_cross_encoder(
+    model_name: str = DEFAULT_RERANKER_MODEL,
+    backend: str = DEFAULT_RERANKER_BACKEND,
+) -> HuggingFaceCrossEncoder:
+    """
+    Returns the process-wide cross-encoder for a model and backend, loading it on
+    first use, so rebuilding the retriever does not reload the weights.
+
+    Args:
+        model_name (str): HuggingFace cross-encoder model.
+        backend (str): "torch", or "onnx" for the quantized ONNX Runtime model
+            (needs `pip install sentence-transformers[onnx]`; falls back to torch).
+    """
+    with _cross_encoders_lock:
+        key = (model_name, backend)
+        if key not in _cross_encoders:
+            model_kwargs = {}
+            if backend == "onnx":
+                model_kwargs = {"backend": "onnx", "model_kwargs": {"file_name": DEFAULT_ONNX_FILE}}
+            try:
+                _cross_encoders[key] = BatchedCrossEncoder(model_name=model_name, model_kwargs=model_kwargs)
+            except ImportError as e:
+                if backend == "torch":
+                    raise
+                print(f"ONNX cross-encoder unavailable ({e}); using the PyTorch model")
+                torch_key = (model_name, "torch")
+                if torch_key not in _cross_encoders:
+                    _cross_encoders[torch_key] = BatchedCrossEncoder(model_name=model_name)
+                _cross_encoders[key] = _cross_encoders[torch_key]
+        return _cross_encoders[key]
+
+
+def _similarity(vectorstore: FAISS, distance: float) -> float:
+    """Converts a FAISS score to a similarity where higher is better."""
+    if vectorstore.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        return float(distance)
+    # Squared L2 distance between unit vectors is 2 - 2 * cosine
+    return 1.0 - float(distance) / 2.0
+
+
+def dense_search(vectorstore: FAISS, vectors, k: int, subset: Subset = None) -> List[List[Tuple[str, float]]]:
+    """
+    Runs one FAISS search for a batch of query vectors, over the whole index or
+    only over a filtered subset of it.
+
+    Returns:
+        list[list[tuple[str, float]]]: (docstore ID, similarity) of the k nearest
+            chunks per query, best first.
+    """
+    import faiss
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(matrix)
+    if subset is None:
+        distances, positions = vectorstore.index.search(matrix, k)
+    else:
+        distances, positions = subset.search(matrix, k)
+    return [
+        [
+            (vectorstore.index_to_docstore_id[int(position)], _similarity(vectorstore, distance))
+            for distance, position in zip(row_distances, row_positions)
+            if position != -1
+        ]
+        for row_distances, row_positions in zip(distances, positions)
+    ]
+
+
+def dense_search_ids(vectorstore: FAISS, vectors, k: int, subset: Subset = None) -> List[List[str]]:
+    """Like dense_search, but returns only the docstore IDs."""
+    return [[id_ for id_, _ in hits] for hits in dense_search(vectorstore, vectors, k, subset)]
+
+
+def resolve_filter(vectorstore: FAISS, search_filter: Optional[SearchFilter], filter_index: FilterIndex = None):
+    """Returns the Subset a filter selects, or None for an unfiltered search."""
+    if search_filter is None or search_filter.is_empty():
+        return None
+    return (filter_index or get_filter_index(vectorstore)).subset(search_filter)
+
+
+def with_retrieval_scores(docs, scores: Dict[str, float]):
+    """Returns copies of docs with their first-stage similarity in metadata, where known."""
+    return [
+        doc.model_copy(update={"metadata": {**doc.metadata, RETRIEVAL_SCORE_KEY: scores[doc.id]}})
+        if doc.id in scores else doc
+        for doc in docs
+    ]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """
+    Merges ranked ID lists: each ID scores sum(1 / (k + rank)) over the lists it
+    appears in. Only ranks are used, so BM25 and vector scores need no calibration.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class _FilteredRetriever(BaseRetriever):
+    """A retriever whose invoke() and ainvoke() take an optional search_filter."""
+
+    async def _aget_relevant_documents(self, query, *, run_manager, search_filter=None, **kwargs):
+        # FAISS and SQLite calls block, so the sync search runs in a thread
+        return await run_in_executor(
+            None, self._get_relevant_documents, query, run_manager=run_manager.get_sync(), search_filter=search_filter
+        )
+
+
+class _HybridRetriever(_FilteredRetriever):
+    """FAISS + BM25 candidates fused by RRF; records the "retrieve" stage."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: FAISS
+    lexical_index: BM25Index
+    filter_index: Optional[FilterIndex] = None
+    fetch_k: int = 10
+    k: int = 6
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query, *, run_manager, search_filter=None, **kwargs):
+        with time_stage("retrieve"):
+            subset = resolve_filter(self.vectorstore, search_filter, self.filter_index)
+            if subset is not None and not len(subset):
+                return []
+            vector = self.vectorstore.embedding_function.embed_query(query)
+            dense_hits = dict(dense_search(self.vectorstore, [vector], self.fetch_k, subset)[0])
+            with time_stage("lexical"):
+                allowed = subset.ids if subset is not None else None
+                lexical_ids = [id_ for id_, _ in self.lexical_index.search(query, self.fetch_k, allowed)]
+            fused = reciprocal_rank_fusion([list(dense_hits), lexical_ids], self.rrf_k)[:self.k]
+            return with_retrieval_scores(get_documents(self.vectorstore.docstore, fused), dense_hits)
+
+
+class _DenseRetriever(_FilteredRetriever):
+    """FAISS-only candidates with their similarity; records the "retrieve" stage."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: FAISS
+    filter_index: Optional[FilterIndex] = None
+    k: int = 10
+
+    def _get_relevant_documents(self, query, *, run_manager, search_filter=None, **kwargs):
+        with time_stage("retrieve"):
+            subset = resolve_filter(self.vectorstore, search_filter, self.filter_index)
+            if subset is not None and not len(subset):
+                return []
+            vector = self.vectorstore.embedding_function.embed_query(query)
+            hits = dict(dense_search(self.vectorstore, [vector], self.k, subset)[0])
+            return with_retrieval_scores(get_documents(self.vectorstore.docstore, list(hits)), hits)
+
+
+def plan_rerank(
+    scores: Sequence[Optional[float]],
+    skip_gap: float = 0.0,
+    score_window: float = 0.0,
+) -> Optional[List[int]]:
+    """
+    Decides which candidates the cross-encoder needs to score, from their
+    first-stage similarities (None where unknown, e.g. BM25-only hits).
+
+    Args:
+        scores: Similarity per candidate, in first-stage order.
+        skip_gap (float): If the best similarity beats the runner-up by at least
+            this much, the first-stage order is trusted as is.
+        score_window (float): Only candidates within this distance of the best
+            similarity (or without one) are scored; the rest rank below them.
+
+    Returns:
+        list[int] | None: Candidate positions to score, or None to skip reranking.
+    """
+    known = sorted((score for score in scores if score is not None), reverse=True)
+    if skip_gap and len(known) >= 2 and known[0] - known[1] >= skip_gap:
+        return None
+    if score_window and known:
+        return [i for i, score in enumerate(scores) if score is None or score >= known[0] - score_window]
+    return list(range(len(scores)))
+
+
+def rerank(model, query: str, documents: Sequence, top_n: int, skip_gap: float = 0.0, score_window: float = 0.0):
+    """
+    Reranks first-stage candidates with a cross-encoder, scoring only the pairs
+    plan_rerank selects. Unscored candidates keep their first-stage order below
+    the reranked ones.
+
+    Returns:
+        list[Document]: The top_n documents.
+    """
+    documents = list(documents)
+    plan = plan_rerank(
+        [doc.metadata.get(RETRIEVAL_SCORE_KEY) for doc in documents], skip_gap, score_window
+    )
+    if plan is None:
+        RERANK_DECISIONS.inc(mode="skipped")
+        return documents[:top_n]
+
+    selected = [documents[i] for i in plan]
+    scores = model.score([(query, doc.page_content) for doc in selected]) if selected else []
+    RERANK_PAIRS.inc(len(selected))
+    RERANK_DECISIONS.inc(mode="full" if len(selected) == len(documents) else "shortened")
+    ranked = [doc for doc, _ in sorted(zip(selected, scores), key=lambda pair: pair[1], reverse=True)]
+    chosen = set(plan)
+    rest = [doc for i, doc in enumerate(documents) if i not in chosen]
+    return (ranked + rest)[:top_n]
+
+
+class _AdaptiveCrossEncoderReranker(CrossEncoderReranker):
+    """Cross-encoder reranking (see rerank()) that records the "rerank" stage."""
+
+    skip_gap: float = 0.0
+    score_window: float = 0.0
+
+    def compress_documents(self, documents, query, callbacks=None):
+        with time_stage("rerank"):
+            return rerank(self.model, query, documents, self.top_n, self.skip_gap, self.score_window)
 
 
 def create_retriever(
     vectorstore: FAISS,
     search_k: int = 10,
     reranker_top_n: int = 3,
-    model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    model_name: str = DEFAULT_RERANKER_MODEL,
+    lexical_index: BM25Index = None,
+    rerank_candidates: int = 6,
+    backend: str = DEFAULT_RERANKER_BACKEND,
+    skip_gap: float = DEFAULT_SKIP_GAP,
+    score_window: float = DEFAULT_SCORE_WINDOW
 ):
     """
     Create a retriever with cross-encoder reranking for higher-quality search.
+    Pass `search_filter=` to invoke() or ainvoke() to search only part of the index.
 
     Args:
         vectorstore (FAISS): The FAISS vectorstore instance.
-        search_k (int): Number of candidates to fetch from vectorstore.
+        search_k (int): Number of candidates to fetch from vectorstore (and from
+            the lexical index, when given).
         reranker_top_n (int): Number of top documents to keep after reranking.
         model_name (str): HuggingFace cross-encoder model for reranking.
+        lexical_index (BM25Index): Enables hybrid retrieval when given.
+        rerank_candidates (int): Fused candidates sent to the cross-encoder in
+            hybrid mode. Without a lexical index all search_k candidates are.
+        backend (str): Cross-encoder runtime, "torch" or "onnx" (int8).
+        skip_gap (float): Skip reranking when the top vector similarity leads the
+            next by this much (0 = always rerank).
+        score_window (float): Only rerank candidates within this similarity of
+            the best one (0 = rerank all).
 
     Returns:
         ContextualCompressionRetriever: Enhanced retriever with reranking.
     """
-    base_retriever = vectorstore.as_retriever(search_kwargs={"k": search_k})
-    cross_encoder_model = HuggingFaceCrossEncoder(model_name=model_name)
-    reranker = CrossEncoderReranker(
+    filter_index = get_filter_index(vectorstore)
+    if lexical_index is not None and len(lexical_index):
+        base_retriever = _HybridRetriever(
+            vectorstore=vectorstore,
+            lexical_index=lexical_index,
+            filter_index=filter_index,
+            fetch_k=search_k,
+            k=rerank_candidates,
+        )
+    else:
+        base_retriever = _DenseRetriever(vectorstore=vectorstore, filter_index=filter_index, k=search_k)
+    cross_encoder_model = get_cross_encoder(model_name, backend)
+    reranker = _AdaptiveCrossEncoderReranker(
         model=cross_encoder_model,
-        top_n=reranker_top_n
+        top_n=reranker_top_n,
+        skip_gap=skip_gap,
+        score_window=score_window
     )
     compression_retriever = ContextualCompressionRetriever(
         base_compressor=reranker,
@@ -1,94 +1,644 @@
 # helpers/vectorstore.py
 
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from helpers.docstore import DocstoreWriter, SQLiteDocstore, get_documents
+from helpers.embeddings import get_embeddings
+from collections import defaultdict
+from itertools import islice
+import hashlib
+import json
+import math
 import os
-import pickle
+import time
 
+import numpy as np
 
-def create_or_load_vectorstore(chunks, persist_directory="./startup_db"):
+_REGISTRY_FILE = "chunk_registry.json"
+_INDEX_FILE = "index.faiss"
+_DOCSTORE_FILE = "docstore.sqlite"
+_METADATA_FILE = "metadata.json"
+# Formats written before the SQLite docstore; they are rebuilt rather than unpickled
+_LEGACY_FILES = ("faiss_index", "metadata.pkl")
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+# k-means wants roughly this many training points per centroid
+_MIN_POINTS_PER_CENTROID = 39
+# IVF lists are retrained once deltas have grown the index this much past its training set
+_RETRAIN_GROWTH = 4
+# A streamed build trains IVF indexes on at most this many vectors (about 50 MB at 384 dims)
+_MAX_TRAINING_VECTORS = 32768
+
+# Chunks embedded and added to the index at a time while indexing
+DEFAULT_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "256"))
+
+
+def index_config_from_env():
+    """
+    Reads the FAISS index type and its build/search parameters from environment
+    variables. Zero means "choose from the corpus size".
+
+    Returns:
+        dict: Keyword arguments for build_faiss_index.
+    """
+    index_type = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"FAISS_INDEX_TYPE must be one of {', '.join(INDEX_TYPES)}, got {index_type!r}")
+    return {
+        "index_type": index_type,
+        "nlist": int(os.getenv("FAISS_NLIST", "0")),
+        "nprobe": int(os.getenv("FAISS_NPROBE", "8")),
+        "hnsw_m": int(os.getenv("FAISS_HNSW_M", "32")),
+        "ef_construction": int(os.getenv("FAISS_EF_CONSTRUCTION", "80")),
+        "ef_search": int(os.getenv("FAISS_EF_SEARCH", "64")),
+        "pq_m": int(os.getenv("FAISS_PQ_M", "0")),
+        "pq_bits": int(os.getenv("FAISS_PQ_BITS", "8")),
+    }
+
+
+def _pq_subquantizers(dim, requested=0):
+    """Largest sub-quantizer count <= requested (default dim / 8) that divides dim."""
+    m = min(requested or max(1, dim // 8), dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_faiss_index(
+    vectors,
+    index_type="flat",
+    nlist=0,
+    nprobe=8,
+    hnsw_m=32,
+    ef_construction=80,
+    ef_search=64,
+    pq_m=0,
+    pq_bits=8,
+):
+    """
+    Creates and trains an empty FAISS index (L2 distance, like the default flat index).
+
+    Args:
+        vectors: float32 matrix the index is trained on (usually the corpus itself).
+        index_type (str): "flat" (exact), "ivf" (IVF-Flat), "hnsw" or "ivfpq"
+            (IVF with product quantization).
+        nlist (int): IVF lists; 0 picks 4 * sqrt(n), capped by the training set.
+        nprobe (int): IVF lists visited per query.
+        hnsw_m (int): HNSW neighbours per node.
+        ef_construction (int): HNSW candidate list size while building.
+        ef_search (int): HNSW candidate list size while searching.
+        pq_m (int): PQ sub-quantizers; 0 picks dim / 8 (rounded to a divisor of dim).
+        pq_bits (int): Bits per PQ code; lowered for small corpora.
+
+    Returns:
+        faiss.Index: A trained index, ready for add().
+    """
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        set_search_params(index, ef_search=ef_search)
+        return index
+    if index_type not in ("ivf", "ivfpq"):
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+
+    nlist = max(1, min(nlist or int(4 * math.sqrt(n)), n // _MIN_POINTS_PER_CENTROID))
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivfpq":
+        # Each PQ codebook has 2**bits centroids and needs enough points to train them
+        bits = min(pq_bits, int(math.log2(max(1, n // _MIN_POINTS_PER_CENTROID))))
+        if bits < 4:
+            print(f"Only {n} vectors; too few to train product quantization, using IVF-Flat")
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim, pq_m), bits)
+    else:
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+
+    start = time.perf_counter()
+    index.train(vectors)
+    print(f"Trained {type(index).__name__} ({nlist} lists) on {n} vectors in {time.perf_counter() - start:.2f}s")
+    set_search_params(index, nprobe=nprobe)
+    return index
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """
+    Applies query-time accuracy/speed knobs: nprobe for IVF indexes, efSearch for
+    HNSW. Parameters that do not apply to the index are ignored.
+    """
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None and ef_search:
+        hnsw.efSearch = ef_search
+
+
+def _remove_positions(index, positions):
+    """
+    Removes the vectors at `positions` and renumbers the rest 0..n-1, the way
+    the index_to_docstore_id mapping expects. Flat indexes renumber on their
+    own; IVF keeps each vector's ID, so the IDs in its lists are shifted down
+    past the removed ones. Returns False for HNSW, which cannot remove at all.
+    """
+    import faiss
+
+    index = faiss.downcast_index(index)
+    if not isinstance(index, (faiss.IndexFlat, faiss.IndexIVF)):
+        return False
+    total = index.ntotal
+    index.remove_ids(np.asarray(positions, dtype=np.int64))
+    if isinstance(index, faiss.IndexIVF):
+        removed = np.zeros(total, dtype=bool)
+        removed[positions] = True
+        shift = np.cumsum(removed)
+        invlists = index.invlists
+        for list_no in range(index.nlist):
+            size = invlists.list_size(list_no)
+            if size:
+                # A view of the list's IDs (the index is in memory; see _own_index)
+                ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+                ids -= shift[ids]
+    return True
+
+
+def _rebuild_index(vectordb, config):
+    """
+    Re-creates vectordb.index (retraining it) from the chunks in its docstore.
+    Vectors come from the embedding disk cache, so nothing is re-embedded.
+    """
+    ids = [vectordb.index_to_docstore_id[i] for i in range(len(vectordb.index_to_docstore_id))]
+    texts = [doc.page_content for doc in get_documents(vectordb.docstore, ids)]
+    vectors = np.asarray(vectordb.embedding_function.embed_documents(texts), dtype=np.float32)
+    index = build_faiss_index(vectors, **config)
+    if len(vectors):
+        index.add(vectors)
+    vectordb.index = index
+
+
+def _own_index(vectordb):
+    """
+    Replaces a memory-mapped (read-only) index with an in-memory copy before it
+    is modified. Other holders of the mapped index are unaffected.
+    """
+    import faiss
+
+    vectordb.index = faiss.deserialize_index(faiss.serialize_index(vectordb.index))
+
+
+def _delete_chunks(vectordb, ids, config):
+    """Removes chunks from the vectorstore; HNSW indexes are rebuilt without them."""
+    removed = set(ids)
+    positions, kept = [], []
+    for position, id_ in sorted(vectordb.index_to_docstore_id.items()):
+        if id_ in removed:
+            positions.append(position)
+        else:
+            kept.append(id_)
+    vectordb.docstore.delete(list(removed))
+    vectordb.index_to_docstore_id = dict(enumerate(kept))
+    if not _remove_positions(vectordb.index, positions):
+        _rebuild_index(vectordb, config)
+
+
+def chunk_id(chunk) -> str:
+    """
+    Returns a deterministic ID for a chunk, derived from its source, page and text.
+    Unchanged chunks keep their ID across re-chunking, so they are never re-embedded.
+    """
+    key = "\x1f".join([
+        str(chunk.metadata.get("source", "")),
+        str(chunk.metadata.get("page", "")),
+        chunk.page_content,
+    ])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _unique_chunks(chunks):
+    """Yields (id, chunk) for a stream of chunks, skipping repeated chunk IDs."""
+    seen = set()
+    for chunk in chunks:
+        id_ = chunk_id(chunk)
+        if id_ not in seen:
+            seen.add(id_)
+            yield id_, chunk
+
+
+def load_chunk_registry(persist_directory="./startup_db"):
+    """
+    Loads the per-source chunk registry: {source: {"sha256": ..., "ids": [...]}}.
+    """
+    path = os.path.join(persist_directory, _REGISTRY_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_chunk_registry(registry, persist_directory):
+    path = os.path.join(persist_directory, _REGISTRY_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(registry, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _save_vectorstore(vectordb, persist_directory, index_type=None, trained_count=None, chunker=None):
+    """
+    Saves the FAISS index file, the SQLite docstore and the index metadata
+    (document count, index version, index type, the size of the set it was
+    trained on and the chunker that produced the chunks). Type, training size
+    and chunker carry over from the previous save unless given.
+
+    The index file and metadata are replaced atomically, so processes that have
+    the old index mapped keep reading a consistent copy. The docstore is not: a
+    saved-to docstore is updated in place (in one transaction), so an index that
+    is being served must be saved to another directory, as helpers.index_versions
+    does with each new version.
+    """
+    import faiss
+
+    os.makedirs(persist_directory, exist_ok=True)
+    index_path = os.path.join(persist_directory, _INDEX_FILE)
+    faiss.write_index(vectordb.index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+
+    # An update only writes the changed chunks; a fresh build writes a new file
+    docstore_path = os.path.join(persist_directory, _DOCSTORE_FILE)
+    docstore = vectordb.docstore
+    if isinstance(docstore, SQLiteDocstore) and os.path.abspath(docstore.path) == os.path.abspath(docstore_path):
+        docstore.commit(vectordb.index_to_docstore_id)
+    else:
+        ids = list(vectordb.index_to_docstore_id.values())
+        docs = dict(zip(ids, get_documents(docstore, ids)))
+        vectordb.docstore = SQLiteDocstore.create(docstore_path, docs, vectordb.index_to_docstore_id)
+
+    previous = read_index_metadata(persist_directory)
+    _write_json_atomic(os.path.join(persist_directory, _METADATA_FILE), {
+        'document_count': vectordb.index.ntotal,
+        'index_version': f"{time.time_ns():x}",
+        'index_type': index_type or previous.get('index_type', 'flat'),
+        'trained_count': trained_count or previous.get('trained_count', vectordb.index.ntotal),
+        'chunker': chunker or previous.get('chunker', 'recursive'),
+    })
+    return index_path
+
+
+def read_index_metadata(persist_directory="./startup_db"):
+    """Returns the metadata saved with the index, or {} if there is none."""
+    metadata_path = os.path.join(persist_directory, _METADATA_FILE)
+    if not os.path.exists(metadata_path):
+        return {}
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def get_index_version(persist_directory="./startup_db"):
+    """
+    Returns the version tag written with the last saved index, or None.
+    It changes every time the index is rebuilt or updated.
+    """
+    return read_index_metadata(persist_directory).get('index_version')
+
+
+def create_or_load_vectorstore(chunks, persist_directory="./startup_db", source_hashes=None, rebuild=False, chunker=None):
     """
     Creates a new vectorstore or loads existing one using FAISS.
-    
+
     Args:
         chunks: Document chunks to embed
         persist_directory (str): Directory to persist vectorstore
-        
+        source_hashes (dict): Optional {source: file fingerprint} recorded in the
+            chunk registry so later runs can detect changed files.
+        rebuild (bool): Ignore any persisted index and embed the chunks afresh.
+        chunker (str): Signature of the chunker that produced `chunks`, saved
+            in the index metadata (see helpers.chunker.chunker_signature).
+
     Returns:
         FAISS: Vectorstore instance
     """
-    import os
-    
     # First try to load existing vectorstore
-    existing = load_vectorstore(persist_directory)
+    existing = None if rebuild else load_vectorstore(persist_directory)
     if existing:
         print(f"Loaded existing vectorstore from {persist_directory}")
         return existing
-    
+
     # Create new vectorstore if none exists
+    return build_vectorstore(chunks, persist_directory, source_hashes=source_hashes, chunker=chunker)
+
+
+class _Reservoir:
+    """
+    A uniform random sample of at most `size` vectors from a stream of batches
+    (reservoir sampling), so IVF training sees the whole corpus rather than
+    its first sources. Seeded, so rebuilding the same corpus trains the same index.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.seen = 0
+        self._filling = []  # batches kept whole until the sample is full
+        self._vectors = None
+        self._rng = np.random.default_rng(0)
+
+    def add(self, vectors):
+        fill = max(0, min(len(vectors), self.size - self.seen))
+        if fill:
+            self._filling.append(vectors[:fill])
+            if self.seen + fill == self.size:
+                self._vectors = np.concatenate(self._filling)
+                self._filling = []
+        if fill < len(vectors):
+            # Vector number t (0-based) replaces a random slot with probability size / (t + 1)
+            slots = self._rng.integers(0, np.arange(self.seen + fill, self.seen + len(vectors)) + 1)
+            chosen = slots < self.size
+            self._vectors[slots[chosen]] = vectors[fill:][chosen]
+        self.seen += len(vectors)
+
+    @property
+    def complete(self):
+        """True if every vector seen is in the sample."""
+        return self.seen <= self.size
+
+    def vectors(self):
+        return self._vectors if self._vectors is not None else np.concatenate(self._filling)
+
+
+def _batched(items, size):
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def build_vectorstore(chunks, persist_directory="./startup_db", source_hashes=None, chunker=None, batch_size=None, progress=None):
+    """
+    Creates a new vectorstore from a stream of chunks, one batch at a time.
+
+    Each batch is embedded, added to the FAISS index and written to the docstore
+    (with its BM25 postings) before the next one is read, so memory holds one batch of
+    chunks and vectors (plus the index itself) instead of the whole corpus. IVF
+    indexes are trained on a random sample of _MAX_TRAINING_VECTORS vectors
+    drawn from the whole stream (or on all of them for smaller corpora); the
+    vectors are then added in a second pass from the embedding cache.
+
+    Args:
+        chunks: Iterable of Document chunks (a list or a generator such as iter_chunks).
+        persist_directory (str): Directory to persist vectorstore
+        source_hashes (dict): Optional {source: file fingerprint} recorded in the
+            chunk registry so later runs can detect changed files.
+        chunker (str): Signature of the chunker that produced `chunks`, saved
+            in the index metadata (see helpers.chunker.chunker_signature).
+        batch_size (int): Chunks per batch; defaults to INDEX_BATCH_SIZE.
+        progress (callable): Called as progress(chunks=..., sources=...) after each batch.
+
+    Returns:
+        FAISS: Vectorstore instance
+    """
     print(f"Creating new vectorstore in {persist_directory}")
-    embeddings = HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'} # Use CPU. You can change to 'cuda' if you have a GPU.
-    )
-    
-    vectordb = FAISS.from_documents(
-        documents=chunks,
-        embedding=embeddings
+    embeddings = get_embeddings()  # shared, batched and cached; see helpers/embeddings.py
+    # Flat (exact) by default; IVF / HNSW / IVF-PQ are trained before vectors are added
+    config = index_config_from_env()
+    needs_training = config["index_type"] in ("ivf", "ivfpq")
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+
+    writer = DocstoreWriter(os.path.join(persist_directory, _DOCSTORE_FILE))
+    registry = defaultdict(lambda: {"ids": []})
+    positions = {}
+    index, sample, trained_count = None, _Reservoir(_MAX_TRAINING_VECTORS), None
+
+    try:
+        for batch in _batched(_unique_chunks(chunks), batch_size):
+            texts = [chunk.page_content for _, chunk in batch]
+            vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+            writer.add(dict(batch))
+            for id_, chunk in batch:
+                positions[len(positions)] = id_
+                registry[chunk.metadata.get("source", "")]["ids"].append(id_)
+            if needs_training:
+                sample.add(vectors)
+            else:
+                if index is None:
+                    index = build_faiss_index(vectors, **config)
+                index.add(vectors)
+            if progress is not None:
+                progress(chunks=len(positions), sources=len(registry))
+        if not positions:
+            raise ValueError("No chunks to index")
+        docstore = writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+    if needs_training:
+        training = sample.vectors()
+        index = build_faiss_index(training, **config)
+        trained_count = len(training)
+        if sample.complete:
+            # The sample is the whole corpus, in order
+            index.add(training)
+        else:
+            # Second pass: the vectors come back from the embedding disk cache
+            for ids in _batched([positions[i] for i in range(len(positions))], batch_size):
+                texts = [doc.page_content for doc in get_documents(docstore, ids)]
+                index.add(np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+
+    vectordb = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=positions,
     )
-    
-    # Ensure the directory exists
-    os.makedirs(persist_directory, exist_ok=True)
-    
-    # Save the vectorstore
-    save_path = os.path.join(persist_directory, "faiss_index")
-    vectordb.save_local(save_path)
-    
-    # Save metadata about the documents
-    metadata_path = os.path.join(persist_directory, "metadata.pkl")
-    with open(metadata_path, 'wb') as f:
-        pickle.dump({
-            'document_count': len(chunks),
-            'chunk_size': len(chunks[0].page_content) if chunks else 0
-        }, f)
-    
-    print(f"Vectorstore saved to {save_path}")
-    
+    # Commits the position table along with the index file and metadata
+    save_path = _save_vectorstore(vectordb, persist_directory, config["index_type"], trained_count or len(positions), chunker)
+
+    # Record which chunk IDs belong to which source file
+    for source, entry in registry.items():
+        entry.update((source_hashes or {}).get(source, {}))
+    _save_chunk_registry(dict(registry), persist_directory)
+
+    print(f"Vectorstore saved to {save_path} ({len(positions)} chunks)")
+
     return vectordb
 
 
+def update_vectorstore(vectordb, chunks, persist_directory="./startup_db", removed_sources=(), source_hashes=None, batch_size=None, progress=None):
+    """
+    Applies a per-document delta to an existing vectorstore.
+
+    Every source present in `chunks` is treated as replaced: chunks whose IDs are
+    already indexed are kept, new ones are embedded and added, and IDs that no
+    longer occur are removed from the FAISS index. Sources in `removed_sources`
+    are dropped entirely.
+
+    New chunks are embedded and added one batch at a time as the stream is read,
+    so only a batch of chunks and vectors is held besides the docstore's buffer
+    of added chunks, which is written with the index in one transaction.
+
+    Args:
+        vectordb (FAISS): Vectorstore to update in place.
+        chunks: Iterable of chunks of the added/changed source files only (a list
+            or a generator such as iter_chunks). Sources listed in `source_hashes`
+            but absent from `chunks` end up with no chunks.
+        persist_directory (str): Directory where the vectorstore is persisted.
+        removed_sources (iterable): Source paths that were deleted.
+        source_hashes (dict): {source: file fingerprint} for the changed sources.
+        batch_size (int): Chunks per batch; defaults to INDEX_BATCH_SIZE.
+        progress (callable): Called as progress(chunks=..., sources=...) after each batch.
+
+    Returns:
+        dict: Counts of added/removed chunks.
+    """
+    registry = load_chunk_registry(persist_directory)
+    old_ids = {source: set(entry.get("ids", [])) for source, entry in registry.items()}
+    indexed = set(vectordb.index_to_docstore_id.values())
+    config = index_config_from_env()
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+
+    ids_by_source = defaultdict(dict)  # source -> {chunk ID: None}, in chunk order
+    seen = 0
+    added = []
+    owned = False
+
+    def new_chunks():
+        nonlocal seen
+        for chunk in chunks:
+            seen += 1
+            id_ = chunk_id(chunk)
+            source = chunk.metadata.get("source", "")
+            if id_ in ids_by_source[source]:
+                continue
+            ids_by_source[source][id_] = None
+            if id_ not in old_ids.get(source, ()) and id_ not in indexed:
+                indexed.add(id_)
+                yield id_, chunk
+
+    for batch in _batched(new_chunks(), batch_size):
+        if not owned:
+            _own_index(vectordb)
+            owned = True
+        ids = [id_ for id_, _ in batch]
+        vectordb.add_documents([chunk for _, chunk in batch], ids=ids)
+        added.extend(ids)
+        if progress is not None:
+            progress(chunks=seen, sources=len(ids_by_source))
+
+    to_delete = []
+    for source in removed_sources:
+        to_delete.extend(registry.pop(source, {}).get("ids", []))
+    for source in set(ids_by_source) | set(source_hashes or {}):
+        ids = list(ids_by_source.get(source, {}))
+        to_delete.extend(old_ids.get(source, set()) - set(ids))
+        registry[source] = dict((source_hashes or {}).get(source, {}), ids=ids)
+
+    to_delete = [id_ for id_ in to_delete if id_ in indexed]
+    if to_delete:
+        if not owned:
+            _own_index(vectordb)
+        _delete_chunks(vectordb, to_delete, config)
+
+    # IVF centroids were fit to the original corpus; refit them once it has outgrown them
+    trained_count = None
+    if config["index_type"] in ("ivf", "ivfpq"):
+        previous_count = read_index_metadata(persist_directory).get("trained_count") or 1
+        if vectordb.index.ntotal > _RETRAIN_GROWTH * previous_count:
+            print(f"Index grew from {previous_count} to {vectordb.index.ntotal} vectors; retraining")
+            _rebuild_index(vectordb, config)
+            trained_count = vectordb.index.ntotal
+
+    if to_delete or added or removed_sources:
+        _save_vectorstore(vectordb, persist_directory, trained_count=trained_count)
+    _save_chunk_registry(registry, persist_directory)
+
+    print(f"Vectorstore delta: +{len(added)} / -{len(to_delete)} chunks ({vectordb.index.ntotal} total)")
+    return {"added": len(added), "removed": len(to_delete)}
+
+
+def clone_vectorstore(vectordb):
+    """
+    Returns an independent copy of a FAISS vectorstore (index, docstore and ID
+    map) that can be updated while the original keeps serving queries.
+    Documents are shared, since they are never mutated; a SQLite docstore
+    copy reads the same file and only buffers its own changes.
+    """
+    import faiss
+
+    docstore = vectordb.docstore
+    return FAISS(
+        embedding_function=vectordb.embedding_function,
+        # serialize/deserialize (unlike clone_index) also copies memory-mapped data
+        index=faiss.deserialize_index(faiss.serialize_index(vectordb.index)),
+        docstore=docstore.copy() if hasattr(docstore, "copy") else InMemoryDocstore(dict(docstore._dict)),
+        index_to_docstore_id=dict(vectordb.index_to_docstore_id),
+        normalize_L2=vectordb._normalize_L2,
+        distance_strategy=vectordb.distance_strategy,
+    )
+
+
 def load_vectorstore(persist_directory="./startup_db"):
     """
     Loads an existing vectorstore from disk.
-    
+
     Args:
         persist_directory (str): Directory where vectorstore is stored
-        
+
     Returns:
         FAISS: Vectorstore instance or None if not found
     """
-    import os
-    
     # Check if the directory exists
     if not os.path.exists(persist_directory):
         return None
-    
+
     # Check if there are actual vectorstore files
-    faiss_index_path = os.path.join(persist_directory, "faiss_index")
-    metadata_path = os.path.join(persist_directory, "metadata.pkl")
-    
-    if not os.path.exists(faiss_index_path) or not os.path.exists(metadata_path):
+    index_path = os.path.join(persist_directory, _INDEX_FILE)
+    docstore_path = os.path.join(persist_directory, _DOCSTORE_FILE)
+
+    if not os.path.exists(index_path) or not os.path.exists(docstore_path):
+        if any(os.path.exists(os.path.join(persist_directory, name)) for name in _LEGACY_FILES):
+            print(f"Found a pickled index in {persist_directory}; it will be rebuilt in the new format")
         return None
-    
+
     try:
-        embeddings = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'}
+        import faiss
+
+        embeddings = get_embeddings()
+
+        # Map the vectors instead of reading them, so processes share one copy in the page cache
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        index = faiss.read_index(index_path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+
+        # Chunk texts stay on disk and are fetched by ID; only the ID map is read now
+        docstore = SQLiteDocstore(docstore_path)
+        vectorstore = FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=docstore.positions(),
         )
-        
-        # Try to load the existing vectorstore
-        vectorstore = FAISS.load_local(faiss_index_path, embeddings, allow_dangerous_deserialization=True)
-        
+
+        # nprobe / efSearch are query-time settings, so they follow the environment
+        config = index_config_from_env()
+        set_search_params(vectorstore.index, nprobe=config["nprobe"], ef_search=config["ef_search"])
+
         # Verify it has documents
         if vectorstore and hasattr(vectorstore, 'index') and vectorstore.index.ntotal > 0:
             print(f"Loaded FAISS vectorstore with {vectorstore.index.ntotal} vectors")
@@ -96,7 +646,7 @@ def load_vectorstore(persist_directory="./startup_db"):
         else:
             print("Vectorstore has no documents")
             return None
-            
+
     except Exception as e:
         print(f"Error loading vectorstore: {e}")
         return None
@@ -0,0 +1,55 @@
+"""
+Model loading and warm-up, so the first real question does not pay for
+loading weights, allocating buffers or faulting in the FAISS index.
+"""
+import time
+
+from helpers.embeddings import get_embeddings
+from helpers.retriever import get_cross_encoder
+
+WARMUP_QUESTION = "What is the minimum capital for a private limited company?"
+
+
+def load_models(run_inference: bool = True):
+    """
+    Loads the shared embedding model and cross-encoder and runs one tiny inference on each.
+
+    Args:
+        run_inference (bool): False only loads the weights, e.g. before forking
+            workers (torch thread pools started before a fork can hang the children).
+    """
+    embeddings = get_embeddings()
+    cross_encoder = get_cross_encoder()
+    if run_inference:
+        embeddings.embed_query(WARMUP_QUESTION)
+        cross_encoder.score([(WARMUP_QUESTION, WARMUP_QUESTION)])
+
+
+def warm_up(retriever=None, rag_chain=None) -> dict:
+    """
+    Loads models and runs warm-up inferences through the pipeline.
+
+    Args:
+        retriever: If given, one full retrieval + rerank is run.
+        rag_chain: If given, one full answer is generated (includes an LLM call).
+
+    Returns:
+        dict: Seconds spent per warm-up step.
+    """
+    timings = {}
+    start = time.perf_counter()
+    load_models()
+    timings["models"] = time.perf_counter() - start
+
+    if retriever is not None:
+        start = time.perf_counter()
+        retriever.invoke(WARMUP_QUESTION)
+        timings["retrieval"] = time.perf_counter() - start
+
+    if rag_chain is not None:
+        start = time.perf_counter()
+        rag_chain.invoke(WARMUP_QUESTION)
+        timings["chain"] = time.perf_counter() - start
+
+    print("Warm-up finished: " + ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items()))
+    return timings
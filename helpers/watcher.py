@@ -0,0 +1,208 @@
+"""
+Watches the data folder and reindexes when PDFs are added, changed or removed.
+
+The folder is scanned every DATA_WATCH_INTERVAL seconds (file names, sizes and
+modification times only); if the optional `watchdog` package is installed, file
+system events trigger a scan right away. Once the folder has been quiet for
+DATA_WATCH_DEBOUNCE seconds, a burst of changes (such as copying in a batch of
+PDFs) becomes one reindex job, which parses, chunks and embeds only the
+affected files (see PipelineRegistry.rebuild).
+
+Ingestion lag, from the first change being seen to the index that includes it
+going live, is recorded in rag_ingestion_lag_seconds; rag_ingestion_pending_seconds
+shows how long the oldest change has been waiting.
+
+With several worker processes sharing startup_db/, one of them watches (a file
+lock); another takes over if it exits.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from helpers.filelock import file_lock
+from helpers.index_versions import index_dir
+from helpers.indexer import pending_changes
+from helpers.metrics import REGISTRY
+
+DEFAULT_DEBOUNCE = float(os.getenv("DATA_WATCH_DEBOUNCE", "5"))
+DEFAULT_INTERVAL = float(os.getenv("DATA_WATCH_INTERVAL", "2"))
+
+INGESTION_LAG = REGISTRY.histogram(
+    "rag_ingestion_lag_seconds",
+    "Seconds from a change in the data folder being seen to the index including it going live.",
+    buckets=(5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+INGESTION_PENDING = REGISTRY.gauge(
+    "rag_ingestion_pending_seconds",
+    "Seconds the oldest data folder change not yet in the live index has been waiting (0 when up to date).",
+)
+INGESTION_RUNS = REGISTRY.counter(
+    "rag_ingestion_runs_total",
+    "Reindex jobs started by the data folder watcher, by outcome.",
+    labels=("outcome",),
+)
+
+
+class DataWatcher:
+    """
+    Args:
+        registry (PipelineRegistry): Registry whose index is kept in sync.
+        data_path (str): Folder containing the PDFs.
+        debounce (float): Quiet seconds required before reindexing.
+        interval (float): Seconds between folder scans.
+        workers (int): Parser processes for the reindex jobs.
+    """
+
+    def __init__(self, registry, data_path: str = "data", debounce=DEFAULT_DEBOUNCE, interval=DEFAULT_INTERVAL, workers=None):
+        self.registry = registry
+        self.data_path = data_path
+        self.debounce = debounce
+        self.interval = interval
+        self.workers = workers
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pending_since: Optional[float] = None  # wall time the oldest unindexed change was seen
+        self._last_change = 0.0  # monotonic time of the latest change
+        self._job = None
+        self._job_since: Optional[float] = None  # _pending_since of the changes the job covers
+        self._job_started = 0.0
+        self._failed = False  # a failed job is retried after the next change
+
+    def start(self) -> "DataWatcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="data-watcher", daemon=True)
+            self._thread.start()
+            INGESTION_PENDING.set_function(self.pending_seconds)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def pending_seconds(self) -> float:
+        since = self._pending_since
+        return time.time() - since if since is not None else 0.0
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        if not os.path.isdir(self.data_path):
+            return {}
+        snapshot = {}
+        for entry in os.scandir(self.data_path):
+            if entry.name.endswith(".pdf") and entry.is_file():
+                stat = entry.stat()
+                snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def _start_observer(self):
+        """Wakes the scan loop on file system events, if watchdog is installed."""
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+        wake = self._wake
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+
+        observer = Observer()
+        observer.schedule(_Handler(), self.data_path, recursive=False)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def _run(self):
+        lock_path = os.path.join(self.registry.persist_directory, "watch.lock")
+        while not self._stop.is_set():
+            try:
+                with file_lock(lock_path, blocking=False):
+                    self._watch()
+                return
+            except BlockingIOError:
+                # Another process is watching; take over if it goes away
+                self._stop.wait(self.interval * 5)
+            except Exception as e:
+                print(f"Data watcher error: {e}")
+                self._stop.wait(self.interval * 5)
+
+    def _has_changes(self) -> bool:
+        # A CHUNKER or FAISS_INDEX_TYPE change alone waits for a manual reprocess
+        changes = pending_changes(self.data_path, index_dir(self.registry.persist_directory))
+        return bool(changes["updated"] or changes["removed"])
+
+    def _watch(self):
+        while not os.path.isdir(self.data_path) and not self._stop.is_set():
+            self._stop.wait(self.interval)
+        observer = self._start_observer() if os.path.isdir(self.data_path) else None
+        print(f"Watching {self.data_path} for PDF changes" + (" (file system events)" if observer else ""))
+        try:
+            snapshot = self._snapshot()
+            # Changes made while nothing was watching
+            if self._has_changes():
+                self._pending_since = time.time()
+                self._last_change = time.monotonic() - self.debounce
+            while not self._stop.is_set():
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                current = self._snapshot()
+                if current != snapshot:
+                    snapshot = current
+                    self._last_change = time.monotonic()
+                    self._failed = False
+                    if self._pending_since is None:
+                        self._pending_since = time.time()
+                self._check_job()
+                if (
+                    self._pending_since is not None
+                    and self._job is None
+                    and not self._failed
+                    and time.monotonic() - self._last_change >= self.debounce
+                ):
+                    self._submit()
+        finally:
+            if observer is not None:
+                observer.stop()
+
+    def _submit(self):
+        if not self._has_changes():
+            # Touched or renamed back without a content change
+            self._pending_since = None
+            return
+        print(f"PDF changes in {self.data_path}; reindexing")
+        self._job_since = self._pending_since
+        self._job_started = time.monotonic()
+        self._job = self.registry.submit_rebuild(self.data_path, workers=self.workers)
+
+    def _check_job(self):
+        job = self._job
+        if job is None or not job.done.is_set():
+            return
+        self._job = None
+        INGESTION_RUNS.inc(outcome=job.status)
+        if job.status != "succeeded":
+            # Left pending: the next change retries, and the pending gauge keeps growing
+            print(f"Reindex after PDF changes failed: {job.error}")
+            self._failed = self._last_change <= self._job_started
+            return
+        INGESTION_LAG.observe(time.time() - self._job_since)
+        if self._last_change <= self._job_started:
+            self._pending_since = None
+        else:
+            # Changes that arrived during the job are covered by the next one
+            self._pending_since = time.time() - (time.monotonic() - self._last_change)
+
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def start_data_watcher(registry, data_path: str = "data", **kwargs) -> DataWatcher:
+    """Starts the process-wide watcher for a data folder (once; later calls return it)."""
+    key = (registry.persist_directory, os.path.abspath(data_path))
+    with _watchers_lock:
+        if key not in _watchers or _watchers[key]._stop.is_set():
+            _watchers[key] = DataWatcher(registry, data_path, **kwargs).start()
+        return _watchers[key]
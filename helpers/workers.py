@@ -0,0 +1,89 @@
+"""
+Bounded worker pools for running blocking RAG work off the asyncio event loop.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+
+class PoolSaturated(Exception):
+    """Raised when a pool already holds as many tasks as it admits."""
+
+
+class WorkerPool:
+    """
+    A thread pool with admission control.
+
+    At most `max_workers` tasks run at once and at most `max_queue` more wait;
+    anything beyond that is rejected immediately with PoolSaturated instead of
+    piling up behind slow calls.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = 0):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Tasks currently running or queued."""
+        return self._in_flight
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def saturated(self) -> bool:
+        return self._in_flight >= self.capacity
+
+    def _admit(self):
+        # Only touched from the event loop thread, so no lock is needed
+        if self.saturated:
+            raise PoolSaturated(f"{self.name} pool is at capacity ({self.capacity})")
+        self._in_flight += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) on the pool and awaits its result.
+
+        Raises:
+            PoolSaturated: If the pool is already at capacity.
+        """
+        self._admit()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+        finally:
+            self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Reserves capacity for natively async work (e.g. a streamed answer) that
+        does not run on the pool's threads but should count against its limit.
+
+        Raises:
+            PoolSaturated: If the pool is already at capacity.
+        """
+        self._admit()
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+def pool_from_env(name: str, workers_var: str, queue_var: str, default_workers: int, default_queue: int) -> WorkerPool:
+    """Creates a WorkerPool sized from environment variables, falling back to defaults."""
+    return WorkerPool(
+        name,
+        max_workers=int(os.getenv(workers_var, default_workers)),
+        max_queue=int(os.getenv(queue_var, default_queue)),
+    )
@@ -0,0 +1,23 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# helpers/ is imported as a top-level package, as app.py and backend/main.py do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def make_pdf():
+    """Writes a PDF with the given number of blank pages and returns its path."""
+    from pypdf import PdfWriter
+
+    def make(path, pages=1):
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(width=200, height=200)
+        with open(path, "wb") as f:
+            writer.write(f)
+        return str(path)
+
+    return make
@@ -0,0 +1,87 @@
+import numpy as np
+
+from helpers.answer_cache import SemanticAnswerCache
+
+
+class FakeEmbeddings:
+    """Maps known questions to fixed vectors."""
+
+    VECTORS = {
+        "capital?": [1.0, 0.0, 0.0],
+        "minimum capital?": [0.99, 0.14, 0.0],
+        "tax?": [0.0, 1.0, 0.0],
+        "licence?": [0.0, 0.0, 1.0],
+    }
+
+    def embed_query(self, text):
+        return self.VECTORS[text]
+
+
+def make_cache(**kwargs):
+    kwargs.setdefault("path", None)
+    return SemanticAnswerCache(FakeEmbeddings(), **kwargs)
+
+
+def test_similar_question_hits_and_dissimilar_misses():
+    cache = make_cache(threshold=0.95)
+    cache.store("capital?", "50,000 ETB", "v1")
+    assert cache.lookup("minimum capital?", "v1") == "50,000 ETB"
+    assert cache.lookup("tax?", "v1") is None
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_threshold_is_inclusive_of_cosine_similarity():
+    cosine = float(np.dot([1.0, 0.0, 0.0], [0.99, 0.14, 0.0]) / np.linalg.norm([0.99, 0.14, 0.0]))
+    cache = make_cache(threshold=cosine + 0.001)
+    cache.store("capital?", "50,000 ETB", "v1")
+    assert cache.lookup("minimum capital?", "v1") is None
+
+
+def test_answers_from_another_index_version_are_not_returned():
+    cache = make_cache()
+    cache.store("capital?", "old answer", "v1")
+    assert cache.lookup("capital?", "v2") is None
+    # Workers on either version keep their answers until the old version is purged
+    cache.store("capital?", "new answer", "v2")
+    assert cache.lookup("capital?", "v1") == "old answer"
+    assert cache.lookup("capital?", "v2") == "new answer"
+    cache.purge_other_versions("v2")
+    assert len(cache) == 1 and cache.stats["invalidations"] == 1
+    assert cache.lookup("capital?", "v1") is None
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    import helpers.answer_cache as module
+
+    now = [1000.0]
+    monkeypatch.setattr(module.time, "time", lambda: now[0])
+    cache = make_cache(ttl_seconds=60)
+    cache.store("capital?", "50,000 ETB", "v1")
+    now[0] += 59
+    assert cache.lookup("capital?", "v1") == "50,000 ETB"
+    now[0] += 2
+    assert cache.lookup("capital?", "v1") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = make_cache(max_entries=2)
+    cache.store("capital?", "capital answer", "v1")
+    cache.store("tax?", "tax answer", "v1")
+    assert cache.lookup("capital?", "v1") == "capital answer"  # tax? is now least recently used
+    cache.store("licence?", "licence answer", "v1")
+    assert cache.lookup("tax?", "v1") is None
+    assert cache.lookup("capital?", "v1") == "capital answer"
+    assert cache.stats["evictions"] == 1
+
+
+def test_sqlite_cache_persists_and_is_shared(tmp_path):
+    path = str(tmp_path / "answers.sqlite")
+    first = make_cache(path=path)
+    second = make_cache(path=path)
+    first.store("capital?", "50,000 ETB", "v1")
+    # Another process (connection) sees the answer without restarting
+    assert second.lookup("capital?", "v1") == "50,000 ETB"
+    assert make_cache(path=path).lookup("capital?", "v1") == "50,000 ETB"
+    first.clear()
+    assert second.lookup("capital?", "v1") is None
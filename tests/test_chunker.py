@@ -0,0 +1,78 @@
+from langchain_core.documents import Document
+
+from helpers.chunker import chunk_documents, ethiopic_to_int
+
+SOURCE = "data/Investment-Proclamation-No-1180_2020.pdf"
+
+
+def page(number, text):
+    return Document(page_content=text, metadata={"source": SOURCE, "page": number})
+
+
+def sub_article(number):
+    words = ["capital", "licence", "premises", "auditor"][number - 1]
+    return f"{number}/ " + f"The investor shall register the {words} of the enterprise. " * 6
+
+
+PAGES = [
+    page(0, "\n".join([
+        "FEDERAL NEGARIT GAZETTE",
+        "Investment Proclamation No. 1180/2020",
+        "፩. አጭር ርዕስ",
+        "ይህ አዋጅ የኢንቨስትመንት አዋጅ ተብሎ ሊጠቀስ ይችላል።",
+        "1. Short Title",
+        "This Proclamation may be cited as the Investment Proclamation.",
+        "2. Definitions",
+        "In this Proclamation an investor means any person making an investment.",
+    ])),
+    page(1, "\n".join(["3. Registration"] + [sub_article(n) for n in range(1, 5)])),
+]
+
+
+def test_ethiopic_numerals():
+    assert ethiopic_to_int("፩") == 1
+    assert ethiopic_to_int("፲፪") == 12
+    assert ethiopic_to_int("፻") == 100
+    assert ethiopic_to_int("፪፻፲፪") == 212
+    assert ethiopic_to_int("፱፻፹") == 980
+
+
+def test_short_articles_share_a_chunk_per_language():
+    chunks = chunk_documents(PAGES, strategy="legal")
+    amharic = [chunk for chunk in chunks if chunk.metadata["language"] == "am"]
+    assert len(amharic) == 1 and amharic[0].metadata["article"] == 1
+    english = [chunk for chunk in chunks if chunk.metadata["language"] == "en" and chunk.metadata.get("article") == 1]
+    assert len(english) == 1
+    english = english[0]
+    assert english.page_content.startswith("1. Short Title")
+    assert "2. Definitions" in english.page_content
+    assert english.metadata["article"] == 1
+    assert english.metadata["article_end"] == 2
+    assert english.metadata["article_title"] == "Short Title"
+    assert english.metadata["proclamation"] == "1180/2020"
+    assert english.metadata["year"] == 2020
+
+
+def test_long_article_is_cut_at_sub_articles_under_its_heading():
+    chunks = [chunk for chunk in chunk_documents(PAGES, strategy="legal") if chunk.metadata.get("article") == 3]
+    assert [chunk.metadata["sub_articles"] for chunk in chunks] == ["1-2", "3-4"]
+    for chunk in chunks:
+        assert chunk.page_content.startswith("3. Registration\n")
+        assert len(chunk.page_content) <= 800
+        assert chunk.metadata["page"] == chunk.metadata["page_end"] == 1
+        assert "article_end" not in chunk.metadata
+
+
+def test_documents_without_articles_use_the_recursive_splitter():
+    pages = [page(0, "Business licensing guide. " * 60)]
+    chunks = chunk_documents(pages, strategy="legal")
+    assert chunks == chunk_documents(pages, strategy="recursive")
+    assert len(chunks) > 1
+
+
+def test_articles_differing_only_in_a_number_are_both_kept():
+    text = "The minimum capital required of a foreign investor is {} United States Dollars. "
+    pages = [page(0, "\n".join(["4. Minimum Capital", text.format(200000) * 6, "5. Minimum Capital", text.format(150000) * 6]))]
+    chunks = [chunk for chunk in chunk_documents(pages, strategy="legal") if chunk.metadata.get("article") in (4, 5)]
+    assert [chunk.metadata["article"] for chunk in chunks] == [4, 5]
+    assert "200000" in chunks[0].page_content and "150000" in chunks[1].page_content
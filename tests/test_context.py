@@ -0,0 +1,70 @@
+from langchain_core.documents import Document
+
+from helpers.context import CONTEXT_TOKENS, NO_CONTEXT, pack_context
+
+
+class WordCounter:
+    """One token per word."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def count_many(self, texts):
+        self.calls += 1
+        return [len(text.split()) for text in texts]
+
+
+def doc(text, source="a.pdf", **metadata):
+    return Document(page_content=text, metadata={"source": source, **metadata})
+
+
+def pack(docs, question="", budget=0):
+    return pack_context(docs, question, budget=budget, counter=WordCounter())
+
+
+def test_no_documents():
+    assert pack([]) == NO_CONTEXT
+
+
+def test_overlap_with_an_earlier_chunk_of_the_same_source_is_dropped():
+    first = "The minimum capital for a foreign investor is 200,000 USD. It may be paid in cash or in kind within one year."
+    # The splitter's overlap window starts mid-sentence
+    second = "in cash or in kind within one year. The investment permit is issued within ten days."
+    assert pack([doc(first), doc(second)]) == f"{first}\n\nThe investment permit is issued within ten days."
+    # Another document's text is not an overlap
+    assert pack([doc(first), doc(second, source="b.pdf")]) == f"{first}\n\n{second}"
+
+
+def test_sentences_repeated_across_chunks_are_kept_once():
+    repeated = "Every business person shall renew the licence every year."
+    context = pack([doc(f"Licences are issued by the Ministry. {repeated}"), doc(f"{repeated} Fees apply.", source="b.pdf")])
+    assert context.count(repeated) == 1
+    assert context.endswith("Fees apply.")
+
+
+def test_trimming_keeps_headings_and_relevant_sentences_in_order():
+    article = doc(
+        "5. Minimum Capital\n"
+        "The Ministry publishes guidance on investment areas. "
+        "A foreign investor shall allocate a minimum capital of 200,000 USD. "
+        "Reports are submitted every quarter.",
+        chunk_type="article",
+    )
+    context = pack([article], question="What minimum capital does a foreign investor need?", budget=20)
+    assert context == "5. Minimum Capital … A foreign investor shall allocate a minimum capital of 200,000 USD."
+
+
+def test_budget_of_zero_only_deduplicates():
+    text = " ".join(f"Sentence number {n} about trade." for n in range(50))
+    assert pack([doc(text)], budget=0) == text
+
+
+def test_retrieved_and_packed_tokens_are_counted_in_one_pass():
+    repeated = "Every business person shall renew the licence every year."
+    docs = [doc(f"Licences are issued by the Ministry. {repeated}"), doc(f"{repeated} Fees apply.", source="b.pdf")]
+    counter = WordCounter()
+    retrieved, packed = CONTEXT_TOKENS.value(kind="retrieved"), CONTEXT_TOKENS.value(kind="packed")
+    pack_context(docs, budget=0, counter=counter)
+    assert counter.calls == 1
+    assert CONTEXT_TOKENS.value(kind="retrieved") - retrieved == 26
+    assert CONTEXT_TOKENS.value(kind="packed") - packed == 17
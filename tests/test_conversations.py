@@ -0,0 +1,70 @@
+from helpers import conversations
+from helpers.conversations import ConversationStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def questions(store, session_id):
+    turns, _ = store.history(session_id)
+    return [turn["question"] for turn in turns]
+
+
+def test_turns_are_capped_and_paged():
+    store = ConversationStore(max_turns=3)
+    for n in range(5):
+        store.add("s", f"q{n}", f"a{n}")
+    assert questions(store, "s") == ["q2", "q3", "q4"]
+    turns, total = store.history("s", offset=1, limit=1)
+    assert [turn["question"] for turn in turns] == ["q3"] and total == 3
+    assert store.history("unknown") == ([], 0)
+
+
+def test_idle_sessions_expire(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(conversations.time, "time", clock)
+    store = ConversationStore(ttl_seconds=60)
+    store.add("old", "q", "a")
+    clock.now += 30
+    store.add("new", "q", "a")
+    clock.now += 40
+    assert questions(store, "old") == []
+    assert questions(store, "new") == ["q"]
+    assert store.stats["expired"] == 1
+
+
+def test_least_recently_active_session_is_evicted():
+    store = ConversationStore(max_sessions=2)
+    store.add("a", "q", "a")
+    store.add("b", "q", "a")
+    store.add("a", "q2", "a")
+    store.add("c", "q", "a")
+    assert len(store) == 2 and store.stats["evicted"] == 1
+    assert questions(store, "b") == []
+    assert questions(store, "a") == ["q", "q2"]
+
+
+def test_sessions_persist_and_are_shared_between_stores(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(conversations.time, "time", clock)
+    path = str(tmp_path / "conversations.sqlite")
+    first = ConversationStore(max_turns=2, ttl_seconds=60, max_sessions=1, path=path)
+    second = ConversationStore(max_turns=2, ttl_seconds=60, path=path)
+    first.add("a", "q1", "a1")
+    first.add("b", "q", "a")  # evicts "a" from memory only
+    assert questions(first, "a") == ["q1"]
+    assert questions(second, "a") == ["q1"]
+    second.add("a", "q2", "a2")
+    second.add("a", "q3", "a3")
+    # first re-reads the session another store changed
+    assert questions(first, "a") == ["q2", "q3"]
+    first.clear("a")
+    assert questions(second, "a") == []
+    second.add("b", "q", "a")
+    clock.now += 61
+    assert questions(ConversationStore(ttl_seconds=60, path=path), "b") == []
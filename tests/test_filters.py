@@ -0,0 +1,67 @@
+import asyncio
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from helpers.docstore import SQLiteDocstore
+from helpers.filters import FilterIndex, make_filter
+from helpers.lexical import LexicalIndex
+from helpers.retriever import _DenseRetriever, _HybridRetriever
+
+INVESTMENT = "data/Investment-Proclamation-No-1180_2020.pdf"
+TRADE = "data/trade-reg-proclamation-no-980_2016.pdf"
+
+CHUNKS = [
+    ("Investment capital requirements", {"source": INVESTMENT, "year": 2020, "article": 5}),
+    ("Investment incentives and articles 6 to 8", {"source": INVESTMENT, "year": 2020, "article": 6, "article_end": 8}),
+    ("Commercial registration", {"source": TRADE, "year": 2016, "article": 5}),
+    ("Preamble of the trade proclamation", {"source": TRADE}),
+]
+
+
+def make_vectorstore(tmp_path=None):
+    texts, metadatas = zip(*CHUNKS)
+    vectorstore = FAISS.from_texts(list(texts), DeterministicFakeEmbedding(size=16), metadatas=list(metadatas))
+    if tmp_path is not None:
+        docs = {id_: vectorstore.docstore.search(id_) for id_ in vectorstore.index_to_docstore_id.values()}
+        vectorstore.docstore = SQLiteDocstore.create(str(tmp_path / "docstore.sqlite"), docs, vectorstore.index_to_docstore_id)
+    return vectorstore
+
+
+def selected(filter_index, **kwargs):
+    return sorted(filter_index.subset(make_filter(**kwargs)).positions.tolist())
+
+
+def test_make_filter_is_none_when_nothing_restricts():
+    assert make_filter() is None
+    assert make_filter(sources=["b", "a", "a"]).sources == ("a", "b")
+
+
+def test_filters_by_source_year_and_article_range(tmp_path):
+    # The docstore's fields table and the chunks themselves must agree
+    for vectorstore in (make_vectorstore(), make_vectorstore(tmp_path)):
+        filter_index = FilterIndex(vectorstore)
+        assert selected(filter_index, sources=["1180/2020"]) == [0, 1]
+        assert selected(filter_index, sources=["trade-reg-proclamation-no-980_2016.pdf"]) == [2, 3]
+        # The preamble has no year of its own; it takes its document's
+        assert selected(filter_index, year_to=2016) == [2, 3]
+        # Articles 6-8 share a chunk, which any of them selects
+        assert selected(filter_index, article_from=7, article_to=7) == [1]
+        assert selected(filter_index, article_from=5, article_to=5) == [0, 2]
+        assert selected(filter_index, sources=["1180/2020"], article_to=5) == [0]
+        assert filter_index.documents()[0] == {
+            "source": INVESTMENT, "proclamation": "1180/2020", "year": 2020, "chunks": 2, "articles": 8,
+        }
+
+
+def test_async_retrieval_honours_the_filter():
+    vectorstore = make_vectorstore()
+    search_filter = make_filter(sources=["980/2016"])
+    lexical_index = LexicalIndex.from_vectorstore(vectorstore)
+    for retriever in (
+        _DenseRetriever(vectorstore=vectorstore, k=4),
+        _HybridRetriever(vectorstore=vectorstore, lexical_index=lexical_index, fetch_k=4, k=4),
+    ):
+        docs = asyncio.run(retriever.ainvoke("investment capital", search_filter=search_filter))
+        assert docs and {doc.metadata["source"] for doc in docs} == {TRADE}
+        assert len(asyncio.run(retriever.ainvoke("investment capital"))) == 4
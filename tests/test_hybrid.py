@@ -0,0 +1,99 @@
+from langchain_core.documents import Document
+
+from helpers.docstore import SQLiteDocstore
+from helpers.lexical import DocstoreLexicalIndex, LexicalIndex, load_lexical_index, tokenize
+from helpers.retriever import reciprocal_rank_fusion
+
+
+def test_tokenize_keeps_references_whole_and_split():
+    assert tokenize("The Proclamation No. 1180/2020 of Article 3.2") == [
+        "proclamation", "no", "1180/2020", "1180", "2020", "article", "3.2", "3", "2",
+    ]
+
+
+def test_rrf_rewards_ids_ranked_high_in_both_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "a"]], k=60)
+    # b: 1/62 + 1/61 beats a: 1/61 + 1/63; c and d appear once
+    assert fused[:2] == ["b", "a"]
+    assert set(fused[2:]) == {"c", "d"}
+
+
+def test_rrf_single_list_keeps_order():
+    assert reciprocal_rank_fusion([["x", "y", "z"]]) == ["x", "y", "z"]
+
+
+def make_index():
+    index = LexicalIndex()
+    index.add(
+        ["capital", "tax", "register"],
+        [
+            "Minimum capital of a private limited company",
+            "Income tax is payable on business profits",
+            "Register the company with the trade registration office",
+        ],
+    )
+    return index
+
+
+def test_search_ranks_matching_chunk_first():
+    index = make_index()
+    assert [id_ for id_, _ in index.search("company capital")][0] == "capital"
+    assert index.search("tax")[0][0] == "tax"
+    assert index.search("nothing matches") == []
+
+
+def test_search_respects_allowed_ids_and_k():
+    index = make_index()
+    assert [id_ for id_, _ in index.search("company", allowed_ids={"register"})] == ["register"]
+    assert len(index.search("company", k=1)) == 1
+
+
+def test_remove_and_replace_keep_statistics_consistent():
+    index = make_index()
+    index.remove(["capital", "unknown"])
+    assert len(index) == 2
+    assert "capital" not in [id_ for id_, _ in index.search("capital")]
+    index.add(["tax"], ["Value added tax"])
+    assert len(index) == 2
+    assert index.search("profits") == []
+    assert index.search("value")[0][0] == "tax"
+    fresh = LexicalIndex()
+    fresh.add(["register", "tax"], [
+        "Register the company with the trade registration office",
+        "Value added tax",
+    ])
+    assert index.search("company tax") == fresh.search("company tax")
+
+
+TEXTS = {
+    "capital": "Minimum capital of a private limited company",
+    "tax": "Income tax is payable on business profits",
+    "register": "Register the company with the trade registration office",
+}
+
+
+def make_docstore(path):
+    docs = {id_: Document(id=id_, page_content=text, metadata={"source": f"{id_}.pdf"}) for id_, text in TEXTS.items()}
+    return SQLiteDocstore.create(str(path), docs, dict(enumerate(docs)))
+
+
+def test_docstore_postings_score_like_the_in_memory_index(tmp_path):
+    index = DocstoreLexicalIndex(make_docstore(tmp_path / "docstore.sqlite"))
+    assert len(index) == 3
+    for query in ("company capital", "tax", "registration office", "nothing matches"):
+        assert index.search(query) == make_index().search(query)
+    assert index.search("company", allowed_ids={"register"}) == make_index().search("company", allowed_ids={"register"})
+
+
+def test_docstore_commit_updates_postings(tmp_path):
+    docstore = make_docstore(tmp_path / "docstore.sqlite")
+    docstore.delete(["capital"])
+    docstore.add({"tax": Document(id="tax", page_content="Value added tax", metadata={})})
+    docstore.commit({0: "tax", 1: "register"})
+    index = DocstoreLexicalIndex(SQLiteDocstore(docstore.path))
+    expected = make_index()
+    expected.remove(["capital"])
+    expected.add(["tax"], ["Value added tax"])
+    assert len(index) == 2
+    assert index.search("profits") == []
+    assert index.search("company tax value") == expected.search("company tax value")
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+from langchain_core.documents import Document
+
+from helpers import index_versions
+from helpers.docstore import SQLiteDocstore
+from helpers.index_versions import (
+    activate_version,
+    begin_version,
+    commit_version,
+    current_version,
+    index_dir,
+    list_versions,
+    pin_version,
+    pinned_versions,
+    prune_versions,
+    unpin_other_versions,
+)
+
+
+def build(persist_directory, text="index", keep=10):
+    """Commits a version whose files hold `text`."""
+    version, build_dir = begin_version(persist_directory)
+    for name in ("index.faiss", "docstore.sqlite"):
+        with open(os.path.join(build_dir, name), "w") as f:
+            f.write(text)
+    commit_version(persist_directory, version, build_dir, keep=keep)
+    return version
+
+
+def kept(persist_directory):
+    return [version["version"] for version in list_versions(persist_directory)]
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_new_version_links_replaced_files_and_copies_the_docstore(tmp_path):
+    persist_directory = str(tmp_path)
+    first = build(persist_directory, "first")
+    assert current_version(persist_directory) == first
+    _, build_dir = begin_version(persist_directory)
+    live = index_dir(persist_directory)
+    assert os.path.samefile(os.path.join(build_dir, "index.faiss"), os.path.join(live, "index.faiss"))
+    assert not os.path.samefile(os.path.join(build_dir, "docstore.sqlite"), os.path.join(live, "docstore.sqlite"))
+    # Unfinished builds are not listed
+    assert kept(persist_directory) == [first]
+
+
+def test_activate_version(tmp_path):
+    persist_directory = str(tmp_path)
+    first = build(persist_directory)
+    second = build(persist_directory)
+    assert current_version(persist_directory) == second
+    activate_version(persist_directory, first)
+    assert current_version(persist_directory) == first
+    with pytest.raises(ValueError):
+        activate_version(persist_directory, "v0")
+    assert current_version(persist_directory) == first
+
+
+def test_prune_keeps_newest_live_and_pinned_versions(tmp_path):
+    persist_directory = str(tmp_path)
+    versions = [build(persist_directory) for _ in range(5)]
+    activate_version(persist_directory, versions[0])
+    pin_version(persist_directory, versions[1])
+    prune_versions(persist_directory, keep=2)
+    assert kept(persist_directory) == [versions[4], versions[3], versions[1], versions[0]]
+
+    # A version this process replaced stays pinned during the grace period
+    unpin_other_versions(persist_directory, versions[4])
+    assert pinned_versions(persist_directory) == {versions[1]}
+    conn = sqlite3.connect(os.path.join(persist_directory, index_versions._PINS_FILE))
+    with conn:
+        conn.execute("UPDATE pins SET unpinned_at = unpinned_at - ?", (index_versions._UNPIN_GRACE_SECONDS + 1,))
+        # Pins of exited processes do not count
+        conn.execute("INSERT INTO pins VALUES (?, ?, NULL)", (dead_pid(), versions[3]))
+    conn.close()
+    assert pinned_versions(persist_directory) == set()
+    prune_versions(persist_directory, keep=1)
+    assert kept(persist_directory) == [versions[4], versions[0]]
+
+
+def test_docstore_of_a_deleted_version_is_not_recreated(tmp_path):
+    path = str(tmp_path / "docstore.sqlite")
+    docstore = SQLiteDocstore.create(path, {"a": Document(page_content="text")}, {0: "a"})
+    assert docstore.search("a").page_content == "text"
+    os.remove(path)
+    with pytest.raises(sqlite3.OperationalError):
+        SQLiteDocstore(path).search("a")
+    assert not os.path.exists(path)
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import select
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+from helpers.llm import HedgedChat, OpenAICompatibleChat, http_client
+
+
+@pytest.fixture
+def server():
+    """A chat server: /fast streams an answer, /slow never sends a token and records when the client hangs up."""
+    hung_up = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            self.wfile.flush()
+            if self.path.startswith("/slow"):
+                select.select([self.connection], [], [], 10)
+                hung_up.append(time.monotonic())
+                return
+            for token in ("Register", " online"):
+                event = {"choices": [{"delta": {"content": token}}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}", hung_up
+    httpd.shutdown()
+
+
+def test_hedge_answers_from_the_fast_provider_and_closes_the_slow_request(server):
+    url, hung_up = server
+    llm = HedgedChat(
+        models=[
+            OpenAICompatibleChat(base_url=f"{url}/slow", model_name="local"),
+            OpenAICompatibleChat(base_url=f"{url}/fast", model_name="local"),
+        ],
+        names=["slow", "fast"],
+        hedge_after=0.2,
+    )
+    assert llm.invoke("How do I register?").content == "Register online"
+    answered = time.monotonic()
+    deadline = answered + 2
+    while not hung_up and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert hung_up and hung_up[0] - answered < 1
+
+
+def test_async_hedge_answers_from_the_fast_provider_and_closes_the_slow_request(server):
+    url, hung_up = server
+    llm = HedgedChat(
+        models=[
+            OpenAICompatibleChat(base_url=f"{url}/slow", model_name="local"),
+            OpenAICompatibleChat(base_url=f"{url}/fast", model_name="local"),
+        ],
+        names=["slow", "fast"],
+        hedge_after=0.2,
+    )
+
+    async def ask():
+        answer = "".join([chunk.content async for chunk in llm.astream("How do I register?")])
+        answered = time.monotonic()
+        # The abandoned attempt's task is cancelled on the same event loop
+        deadline = answered + 2
+        while not hung_up and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        return answer, answered
+
+    answer, answered = asyncio.run(ask())
+    assert answer == "Register online"
+    assert hung_up and hung_up[0] - answered < 1
+
+
+class IdleChat(BaseChatModel):
+    """Streams only empty chunks (like a role-only first delta), one every 0.1s for 10s."""
+
+    @property
+    def _llm_type(self):
+        return "idle"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for _ in range(100):
+            time.sleep(0.1)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=""))
+
+
+def test_hedge_timer_counts_from_the_start_not_the_last_empty_chunk(server):
+    url, _ = server
+    llm = HedgedChat(
+        models=[
+            IdleChat(),
+            OpenAICompatibleChat(base_url=f"{url}/fast", model_name="local"),
+        ],
+        names=["idle", "fast"],
+        hedge_after=0.3,
+    )
+    started = time.monotonic()
+    assert llm.invoke("How do I register?").content == "Register online"
+    assert time.monotonic() - started < 2
+
+
+def test_forked_worker_does_not_reuse_the_parents_connections():
+    ports = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            ports.append(self.client_address[1])
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_port}/"
+    try:
+        client = http_client()
+        client.get(url)
+        pid = os.fork()
+        if pid == 0:
+            # A client of its own, created on first use in the child
+            os._exit(0 if http_client() is not client and http_client().get(url).text == "ok" else 1)
+        assert os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) == 0
+        assert http_client() is client
+        client.get(url)
+    finally:
+        httpd.shutdown()
+    # The child opened its own connection; the parent kept its keep-alive one
+    assert len(ports) == 3 and ports[0] == ports[2] != ports[1]
@@ -0,0 +1,89 @@
+import os
+
+from helpers.loader import diff_manifest, file_sha256, fingerprint, list_pdfs, load_manifest, save_manifest
+
+
+def test_list_pdfs_is_sorted_and_skips_other_files(tmp_path, make_pdf):
+    make_pdf(tmp_path / "b.pdf")
+    make_pdf(tmp_path / "a.pdf")
+    (tmp_path / "notes.txt").write_text("x")
+    assert list_pdfs(str(tmp_path)) == [str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")]
+
+
+def test_fingerprint_reuses_hash_when_size_and_mtime_match(tmp_path, make_pdf):
+    path = make_pdf(tmp_path / "a.pdf")
+    first = fingerprint(path)
+    assert first["sha256"] == file_sha256(path)
+
+    # A stale hash is trusted as long as size and mtime are unchanged
+    assert fingerprint(path, dict(first, sha256="stale"))["sha256"] == "stale"
+    assert fingerprint(path, dict(first, sha256="stale", mtime_ns=0))["sha256"] == first["sha256"]
+
+
+def test_manifest_round_trip_and_unreadable_manifest(tmp_path):
+    save_manifest({"a.pdf": {"sha256": "x"}}, str(tmp_path))
+    assert load_manifest(str(tmp_path)) == {"a.pdf": {"sha256": "x"}}
+    (tmp_path / "manifest.json").write_text("{not json")
+    assert load_manifest(str(tmp_path)) == {}
+
+
+def test_diff_manifest_groups_sources(tmp_path, make_pdf):
+    data, cache = tmp_path / "data", str(tmp_path / "cache")
+    data.mkdir()
+    kept = make_pdf(data / "kept.pdf")
+    changed = make_pdf(data / "changed.pdf")
+    save_manifest({
+        kept: fingerprint(kept),
+        changed: dict(fingerprint(changed), sha256="old", mtime_ns=0),
+        str(data / "gone.pdf"): {"sha256": "x"},
+    }, cache)
+    added = make_pdf(data / "added.pdf", pages=2)
+
+    diff = diff_manifest(str(data), cache)
+    assert diff == {
+        "added": [added],
+        "changed": [changed],
+        "removed": [str(data / "gone.pdf")],
+        "unchanged": [kept],
+    }
+    assert os.path.exists(os.path.join(cache, "manifest.json"))
+
+
+def test_load_documents_one_document_per_page_and_records_manifest(tmp_path, make_pdf):
+    from helpers.loader import load_documents
+
+    data, cache = tmp_path / "data", str(tmp_path / "cache")
+    data.mkdir()
+    source = make_pdf(data / "a.pdf", pages=3)
+
+    stats = {}
+    docs = load_documents(str(data), workers=1, cache_dir=cache, stats=stats)
+    assert [doc.metadata["page"] for doc in docs] == [0, 1, 2]
+    assert stats["pages"] == stats["backends"]["pypdf"]["pages"] == 3 and stats["seconds"] > 0
+    assert {doc.metadata["total_pages"] for doc in docs} == {3}
+    assert load_manifest(cache)[source]["pages"] == 3
+    # Served from the cache the second time, with identical output
+    assert load_documents(str(data), workers=1, cache_dir=cache) == docs
+
+
+def test_throughput_is_per_wall_clock_second_and_pages_count_once():
+    from helpers.extraction import ExtractedPage, record_elapsed, record_throughput, throughput
+
+    stats = {}
+    # Four parser processes, side by side within 1 s of wall-clock; one page needed OCR
+    pages = [ExtractedPage(n, "text", "pypdf", "", {"pypdf": 0.5}) for n in range(3)]
+    pages.append(ExtractedPage(3, "scanned text", "tesseract", "tesseract", {"pypdf": 0.5, "tesseract": 0.9}))
+    record_throughput(stats, pages, cached=2)
+    record_elapsed(stats, 1.0)
+    record_throughput(stats, cached=2)
+    record_elapsed(stats, 0.5)
+    assert throughput(stats) == {
+        "pages": 8,
+        "seconds": 1.5,
+        "pages_per_s": 5.3,
+        "backends": {
+            "pypdf": {"pages": 3, "worker_seconds": 2.0},
+            "tesseract": {"pages": 1, "worker_seconds": 0.9},
+            "cache": {"pages": 4, "worker_seconds": 0.0},
+        },
+    }
@@ -0,0 +1,17 @@
+from helpers import metrics
+
+
+def test_constant_labels_are_added_to_every_series(monkeypatch):
+    monkeypatch.setattr(metrics, "_constant_labels", {})
+    registry = metrics.Registry()
+    registry.counter("requests_total", "Requests.", labels=("path",)).inc(path="/ask")
+    registry.histogram("latency_seconds", "Latency.", buckets=(1.0,)).observe(0.5)
+    metrics.set_constant_labels(worker=0)
+    lines = [line for line in registry.render().splitlines() if not line.startswith("#")]
+    assert lines == [
+        'requests_total{worker="0",path="/ask"} 1.0',
+        'latency_seconds_bucket{worker="0",le="1.0"} 1',
+        'latency_seconds_bucket{worker="0",le="+Inf"} 1',
+        'latency_seconds_sum{worker="0"} 0.5',
+        'latency_seconds_count{worker="0"} 1',
+    ]
@@ -0,0 +1,50 @@
+from langchain_core.documents import Document
+
+from helpers.retriever import RETRIEVAL_SCORE_KEY, plan_rerank, rerank
+
+
+class FakeCrossEncoder:
+    """Scores a pair by the number of query words in the text; records the pairs."""
+
+    def __init__(self):
+        self.pairs = []
+
+    def score(self, pairs):
+        self.pairs.extend(pairs)
+        return [sum(word in text for word in query.split()) for query, text in pairs]
+
+
+def doc(text, score=None):
+    metadata = {} if score is None else {RETRIEVAL_SCORE_KEY: score}
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_plan_scores_everything_by_default():
+    assert plan_rerank([0.9, 0.5, None]) == [0, 1, 2]
+
+
+def test_plan_skips_when_the_best_candidate_stands_out():
+    assert plan_rerank([0.9, 0.5, 0.4], skip_gap=0.3) is None
+    assert plan_rerank([0.9, 0.7, 0.4], skip_gap=0.3) == [0, 1, 2]
+    # One known score is no evidence of a gap
+    assert plan_rerank([0.9, None], skip_gap=0.3) == [0, 1]
+
+
+def test_plan_window_keeps_close_and_unknown_candidates():
+    assert plan_rerank([0.9, 0.85, 0.5, None], score_window=0.1) == [0, 1, 3]
+    assert plan_rerank([None, None], score_window=0.1) == [0, 1]
+
+
+def test_rerank_orders_scored_candidates_and_appends_the_rest():
+    model = FakeCrossEncoder()
+    docs = [doc("capital", 0.9), doc("minimum capital company", 0.88), doc("tax", 0.2)]
+    ranked = rerank(model, "minimum capital", docs, top_n=3, score_window=0.1)
+    assert [d.page_content for d in ranked] == ["minimum capital company", "capital", "tax"]
+    assert len(model.pairs) == 2
+
+
+def test_rerank_skip_keeps_first_stage_order_without_scoring():
+    model = FakeCrossEncoder()
+    docs = [doc("tax", 0.9), doc("minimum capital", 0.3)]
+    assert [d.page_content for d in rerank(model, "minimum capital", docs, top_n=1, skip_gap=0.5)] == ["tax"]
+    assert model.pairs == []
@@ -0,0 +1,78 @@
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from helpers import vectorstore
+from helpers.vectorstore import build_vectorstore, chunk_id, load_chunk_registry, read_index_metadata, update_vectorstore
+
+
+def chunk(source, text):
+    return Document(page_content=text, metadata={"source": source, "page": 0})
+
+
+def test_update_streams_a_delta_into_the_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(vectorstore, "get_embeddings", lambda: DeterministicFakeEmbedding(size=8))
+    persist_directory = str(tmp_path)
+    kept, changed = chunk("a.pdf", "Registration fees"), chunk("a.pdf", "Old licence rules")
+    vectordb = build_vectorstore([kept, changed, chunk("b.pdf", "Tax")], persist_directory)
+
+    read = []
+
+    def stream():
+        for doc in (kept, chunk("a.pdf", "New licence rules"), chunk("a.pdf", "Renewal"), chunk("c.pdf", "Import")):
+            read.append(doc)
+            yield doc
+
+    batches = []
+    stats = update_vectorstore(
+        vectordb,
+        stream(),
+        persist_directory,
+        removed_sources=["b.pdf"],
+        source_hashes={"a.pdf": {"sha256": "new"}},
+        batch_size=2,
+        progress=lambda chunks, sources: batches.append(len(read)),
+    )
+    assert stats == {"added": 3, "removed": 2}
+    # Each batch was embedded before the rest of the stream was read
+    assert batches == [3, 4]
+    assert sorted(doc.page_content for doc in vectordb.docstore.mget(vectordb.index_to_docstore_id.values())) == [
+        "Import", "New licence rules", "Registration fees", "Renewal",
+    ]
+    registry = load_chunk_registry(persist_directory)
+    assert set(registry) == {"a.pdf", "c.pdf"}
+    assert registry["a.pdf"]["sha256"] == "new" and registry["a.pdf"]["ids"][0] == chunk_id(kept)
+
+
+def test_ivf_is_trained_on_a_sample_of_the_whole_stream_and_removes_in_place(tmp_path, monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    monkeypatch.setattr(vectorstore, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(vectorstore, "_MAX_TRAINING_VECTORS", 80)
+    monkeypatch.setenv("FAISS_INDEX_TYPE", "ivf")
+    monkeypatch.setenv("FAISS_NPROBE", "64")
+    trained_on = []
+    build = vectorstore.build_faiss_index
+
+    def spy(vectors, **config):
+        trained_on.append(vectors.copy())
+        return build(vectors, **config)
+
+    monkeypatch.setattr(vectorstore, "build_faiss_index", spy)
+    persist_directory = str(tmp_path)
+    docs = [chunk(f"{n // 50}.pdf", f"Article {n}") for n in range(200)]
+    vectordb = build_vectorstore(docs, persist_directory, batch_size=16)
+
+    assert vectordb.index.ntotal == 200 and read_index_metadata(persist_directory)["trained_count"] == 80
+    # The last source's vectors take part in training, not only the first ones read
+    late = {tuple(vector) for vector in np.float32(embeddings.embed_documents([doc.page_content for doc in docs[150:]]))}
+    assert any(tuple(vector) in late for vector in trained_on[0])
+
+    def found(text):
+        return vectordb.similarity_search_by_vector(embeddings.embed_query(text), k=1)[0].page_content
+
+    update_vectorstore(vectordb, [chunk("4.pdf", "Article 200")], persist_directory, removed_sources=["1.pdf"])
+    # Removed from the trained IVF lists rather than rebuilt, with later vectors renumbered
+    assert len(trained_on) == 1 and vectordb.index.ntotal == 151
+    assert all(found(text) == text for text in ("Article 0", "Article 49", "Article 100", "Article 199", "Article 200"))
+    update_vectorstore(vectordb, [chunk("5.pdf", "Article 201")], persist_directory)
+    assert all(found(text) == text for text in ("Article 0", "Article 200", "Article 201"))